@@ -6,9 +6,26 @@ from sqlalchemy import create_engine, text
 import streamlit_authenticator as stauth
 import yaml
 from yaml.loader import SafeLoader
-import io
 import holidays
 from fpdf import FPDF
+from tabela_pdf import coluna, desenhar_tabela
+from grade_paginada import ORDEM_DATA, grade_paginada
+from busca_lancamentos import buscar_lancamentos, rotulo_lancamento
+from exportacao import MIME_EXCEL, colunas_dataframe, exportar_dataframes
+from fragmentos import fragmento
+from graficos import grafico_pizza
+from kpis import calcular_kpis, periodos_comparacao, variacao
+from ordem_servico import acompanhar_sequencia, definir_os, normalizar_os, os_repetidas, travar_numeracao
+from schema import exigir_esquema
+from tecnicos import (
+    carregar_tecnicos, entradas_dos_tecnicos, produtividade_tecnicos, sincronizar_tecnicos, vincular_entradas_sem_tecnicos
+)
+
+# Colunas de valores (R$) de entradas e saídas, formatadas como moeda no Excel
+COLUNAS_MOEDA_EXCEL = (
+    'valor_atendimento', 'horas_tecnicas', 'horas_tecnicas_50', 'horas_tecnicas_100', 'km', 'refeicao',
+    'pecas', 'pedagio', 'valor_deslocamento', 'valor_laboratorio', 'valor_repasse_laboratorio', 'valor'
+)
 
 # --- CONFIGURAÇÃO DA PÁGINA ---
 st.set_page_config(page_title="Dashboard Financeiro", page_icon="💰", layout="wide")
@@ -30,6 +47,32 @@ def safe_int(value, default=1):
     """Converte valor para int seguro. Retorna default se a conversão falhar."""
     return int(safe_number(value, default))
 
+COLUNAS_PDF_ENTRADAS = [
+    coluna("Data", 20, 'C'), coluna("Cliente", 60, 'L', quebra=True), coluna("O.S.", 25, 'L'),
+    coluna("Valor", 30, 'R'), coluna("Status", 25, 'C'),
+]
+COLUNAS_PDF_SAIDAS = [
+    coluna("Data", 20, 'C'), coluna("Descrição", 85, 'L', quebra=True),
+    coluna("Valor", 30, 'R'), coluna("Tipo", 25, 'C'),
+]
+
+def _coluna_data(df):
+    """Coluna 'data' já formatada (dd/mm/aaaa) como lista."""
+    return pd.to_datetime(df['data']).dt.strftime('%d/%m/%Y').fillna("").tolist()
+
+def _coluna_texto(df, nome, limite=None):
+    """Coluna convertida em texto (opcionalmente truncada em `limite` caracteres), como lista."""
+    if nome not in df.columns:
+        return [""] * len(df)
+    textos = df[nome].astype(str)
+    return (textos.str[:limite] if limite else textos).tolist()
+
+def _coluna_valor(df, nome):
+    """Coluna monetária formatada (R$ 1,234.56) como lista."""
+    if nome not in df.columns:
+        return ["R$ 0.00"] * len(df)
+    return [f"R$ {v:,.2f}" for v in df[nome].tolist()]
+
 def gerar_pdf_financeiro(entradas, saidas, inicio, fim):
     """Gera um PDF com o resumo financeiro e listagem de lançamentos."""
     class PDF(FPDF):
@@ -91,37 +134,26 @@ def gerar_pdf_financeiro(entradas, saidas, inicio, fim):
     # Tabela Entradas
     pdf.set_font(font_family, 'B', 12)
     pdf.cell(0, 8, "Entradas (Receitas)", 0, 1)
-    pdf.set_font(font_family, 'B', 8)
-    pdf.set_fill_color(220, 230, 241)
-    pdf.cell(20, 6, "Data", 1, 0, 'C', True); pdf.cell(60, 6, "Cliente", 1, 0, 'C', True); pdf.cell(25, 6, "O.S.", 1, 0, 'C', True); pdf.cell(30, 6, "Valor", 1, 0, 'C', True); pdf.cell(25, 6, "Status", 1, 1, 'C', True)
-    
     pdf.set_font(font_family, '', 8)
-    if not entradas.empty:
-        for _, row in entradas.iterrows():
-            pdf.cell(20, 6, row['data'].strftime('%d/%m/%Y') if pd.notnull(row['data']) else "", 1)
-            pdf.cell(60, 6, str(row.get('cliente', ''))[:30], 1)
-            pdf.cell(25, 6, str(row.get('ordem_servico', ''))[:12], 1)
-            pdf.cell(30, 6, f"R$ {row.get('valor_atendimento', 0):,.2f}", 1, 0, 'R')
-            pdf.cell(25, 6, str(row.get('status', ''))[:12], 1, 1, 'C')
-    else:
+    valores_entradas = [
+        _coluna_data(entradas), _coluna_texto(entradas, 'cliente'), _coluna_texto(entradas, 'ordem_servico', 12),
+        _coluna_valor(entradas, 'valor_atendimento'), _coluna_texto(entradas, 'status', 12)
+    ]
+    desenhar_tabela(pdf, COLUNAS_PDF_ENTRADAS, valores_entradas, altura_linha=6, tamanho_fonte=8, cor_cabecalho=(220, 230, 241))
+    if entradas.empty:
         pdf.cell(160, 6, "Nenhum registro.", 1, 1, 'C')
     pdf.ln(5)
     
     # Tabela Saídas
     pdf.set_font(font_family, 'B', 12)
     pdf.cell(0, 8, "Saídas (Despesas)", 0, 1)
-    pdf.set_font(font_family, 'B', 8)
-    pdf.set_fill_color(241, 220, 220)
-    pdf.cell(20, 6, "Data", 1, 0, 'C', True); pdf.cell(85, 6, "Descrição", 1, 0, 'C', True); pdf.cell(30, 6, "Valor", 1, 0, 'C', True); pdf.cell(25, 6, "Tipo", 1, 1, 'C', True)
-    
     pdf.set_font(font_family, '', 8)
-    if not saidas.empty:
-        for _, row in saidas.iterrows():
-            pdf.cell(20, 6, row['data'].strftime('%d/%m/%Y') if pd.notnull(row['data']) else "", 1)
-            pdf.cell(85, 6, str(row.get('descricao', ''))[:45], 1)
-            pdf.cell(30, 6, f"R$ {row.get('valor', 0):,.2f}", 1, 0, 'R')
-            pdf.cell(25, 6, str(row.get('tipo_conta', ''))[:12], 1, 1, 'C')
-    else:
+    valores_saidas = [
+        _coluna_data(saidas), _coluna_texto(saidas, 'descricao'),
+        _coluna_valor(saidas, 'valor'), _coluna_texto(saidas, 'tipo_conta', 12)
+    ]
+    desenhar_tabela(pdf, COLUNAS_PDF_SAIDAS, valores_saidas, altura_linha=6, tamanho_fonte=8, cor_cabecalho=(241, 220, 220))
+    if saidas.empty:
         pdf.cell(160, 6, "Nenhum registro.", 1, 1, 'C')
         
     return bytes(pdf.output())
@@ -173,13 +205,13 @@ else:
     from datetime import datetime, time, timedelta
 
     from sqlalchemy import create_engine, text
-    import io
     import holidays
 
     # --- APLICAÇÃO PRINCIPAL ---
     # Conexão com o banco de dados da nuvem a partir dos "Secrets"
     connection_url = st.secrets["database"]["connection_url"]
     engine = create_engine(connection_url)
+    exigir_esquema(connection_url)
 
     name = st.session_state["name"]
     username = st.session_state["username"]
@@ -197,6 +229,19 @@ else:
             saidas_df = pd.DataFrame()
         return entradas_df, saidas_df
 
+    # --- EXPORTAÇÕES (geradas só no clique, memorizadas por assinatura de filtros) ---
+    # Os DataFrames entram com "_" (não são hasheados): a chave é a assinatura dos filtros.
+    @st.cache_data(ttl=300, max_entries=20)
+    def gerar_excel_exportacao(assinatura, _entradas, _saidas):
+        return exportar_dataframes([
+            {'nome': 'Entradas', 'colunas': colunas_dataframe(_entradas, moeda=COLUNAS_MOEDA_EXCEL), 'df': _entradas},
+            {'nome': 'Saídas', 'colunas': colunas_dataframe(_saidas, moeda=COLUNAS_MOEDA_EXCEL), 'df': _saidas},
+        ])
+
+    @st.cache_data(ttl=300, max_entries=20)
+    def gerar_pdf_exportacao(assinatura, _entradas, _saidas, inicio, fim):
+        return gerar_pdf_financeiro(_entradas, _saidas, inicio, fim)
+
     def carregar_clientes():
         with engine.connect() as con:
             try:
@@ -219,8 +264,24 @@ else:
             set_clause = ", ".join([f"\"{key}\" = :{key}" for key in dados.keys()])
             dados['id'] = id
             con.execute(text(f"UPDATE {tabela} SET {set_clause} WHERE id = :id"), dados)
+            if tabela == 'entradas' and 'nome_tecnicos' in dados:
+                sincronizar_tecnicos(con, id, dados['nome_tecnicos'])
             con.commit()
 
+    def inserir_entrada(dados):
+        """Insere a entrada e vincula os técnicos na mesma transação. Retorna o id criado.
+        Sem Nº de O.S. informado, o número é alocado da sequence e gravado em dados['ordem_servico']."""
+        colunas_existentes = pd.read_sql("SELECT * FROM entradas LIMIT 1", engine).columns
+        with engine.connect() as con:
+            dados['ordem_servico'] = definir_os(con, dados.get('ordem_servico'))
+            dados = {k: v for k, v in dados.items() if k in colunas_existentes}
+            colunas = ", ".join(f"\"{key}\"" for key in dados)
+            valores = ", ".join(f":{key}" for key in dados)
+            entrada_id = con.execute(text(f"INSERT INTO entradas ({colunas}) VALUES ({valores}) RETURNING id"), dados).scalar()
+            sincronizar_tecnicos(con, entrada_id, dados.get('nome_tecnicos'))
+            con.commit()
+        return entrada_id
+
     # --- CARREGANDO DADOS E CLIENTES ---
     entradas_df, saidas_df = carregar_dados()
     clientes_cadastrados = carregar_clientes()
@@ -248,7 +309,152 @@ VALOR_HORA_TECNICA = 100.00
 
 # --- ABA DE LANÇAMENTOS ---
 if "authentication_status" in st.session_state and st.session_state["authentication_status"]:
-    with tab2:
+    # Cada bloco da aba é um fragmento: interagir com ele reexecuta só ele, não os gráficos da outra aba.
+    # Gravações limpam o cache e chamam st.rerun() (página inteira), pois mudam os dados de todos.
+    def definir_edicao(id=None, tabela=None):
+        # Callback de Editar/Cancelar: o próprio clique já reexecuta o fragmento dos lançamentos
+        st.session_state.edit_id, st.session_state.edit_table = id, tabela
+
+    @fragmento("importar_csv_entradas")
+    def importar_csv_entradas():
+        st.info("Colunas sugeridas: data, cliente, valor_atendimento, ordem_servico, descricao_servico, status.")
+        uploaded_file_ent = st.file_uploader("Selecionar CSV de Entradas", type="csv", key="csv_entradas")
+        if uploaded_file_ent:
+            try:
+                try:
+                    df_ent_csv = pd.read_csv(uploaded_file_ent, sep=None, engine='python')
+                except UnicodeDecodeError:
+                    uploaded_file_ent.seek(0)
+                    df_ent_csv = pd.read_csv(uploaded_file_ent, sep=None, engine='python', encoding='latin-1')
+
+                df_ent_csv.columns = df_ent_csv.columns.str.lower().str.strip()
+
+                # Renomeia colunas comuns para o padrão do banco de dados
+                rename_map = {
+                    'descricao': 'descricao_servico',
+                    'descrição': 'descricao_servico',
+                    'descriçao': 'descricao_servico',
+                    'description': 'descricao_servico',
+                    'valor': 'valor_atendimento',
+                    'os': 'ordem_servico'
+                }
+                df_ent_csv.rename(columns=rename_map, inplace=True)
+                if 'ordem_servico' in df_ent_csv.columns:
+                    df_ent_csv['ordem_servico'] = df_ent_csv['ordem_servico'].map(normalizar_os)
+
+                if 'data' in df_ent_csv.columns:
+                    df_ent_csv['data'] = pd.to_datetime(df_ent_csv['data'], dayfirst=True, errors='coerce')
+                    df_ent_csv.dropna(subset=['data'], inplace=True)
+
+                    # Limpeza e conversão da coluna 'valor_atendimento'
+                    if 'valor_atendimento' in df_ent_csv.columns:
+                        def clean_valor(v):
+                            v_str = str(v).strip()
+                            if ',' in v_str:
+                                return v_str.replace('.', '').replace(',', '.')
+                            return v_str
+                        df_ent_csv['valor_atendimento'] = df_ent_csv['valor_atendimento'].apply(clean_valor)
+                        df_ent_csv['valor_atendimento'] = pd.to_numeric(df_ent_csv['valor_atendimento'], errors='coerce').fillna(0.0)
+
+                    st.dataframe(df_ent_csv.head(), use_container_width=True)
+                    if st.button("Confirmar Importação (Entradas)", type="primary"):
+                        df_ent_csv['usuario_lancamento'] = username
+                        cols_validas = pd.read_sql("SELECT * FROM entradas LIMIT 0", engine).columns
+                        df_final = df_ent_csv[[c for c in df_ent_csv.columns if c in cols_validas]]
+                        # Numa transação só: confere as O.S. repetidas (no arquivo ou já no banco),
+                        # insere e avança a sequence até a maior O.S. importada
+                        with engine.connect() as con:
+                            travar_numeracao(con)
+                            repetidas = os_repetidas(con, df_final.get('ordem_servico', pd.Series(dtype=object)).tolist())
+                            if repetidas:
+                                con.rollback()
+                                st.error(f"Importação cancelada: O.S. repetidas no arquivo ou já lançadas: {', '.join(repetidas)}")
+                                return
+                            df_final.to_sql('entradas', con, if_exists='append', index=False)
+                            acompanhar_sequencia(con)
+                            if 'nome_tecnicos' in df_final.columns:
+                                vincular_entradas_sem_tecnicos(con)
+                            con.commit()
+                        st.success(f"{len(df_final)} entradas importadas com sucesso!")
+                        st.cache_data.clear()
+                        st.rerun()
+                else:
+                    st.error("O arquivo CSV precisa ter uma coluna chamada 'data'.")
+            except Exception as e:
+                st.error(f"Erro ao ler CSV: {e}")
+
+    @fragmento("importar_csv_saidas")
+    def importar_csv_saidas():
+        st.info("Colunas sugeridas: data, descricao, valor, tipo_conta.")
+        uploaded_file_sai = st.file_uploader("Selecionar CSV de Saídas", type="csv", key="csv_saidas")
+        if uploaded_file_sai:
+            try:
+                try:
+                    df_sai_csv = pd.read_csv(uploaded_file_sai, sep=None, engine='python')
+                except UnicodeDecodeError:
+                    uploaded_file_sai.seek(0)
+                    df_sai_csv = pd.read_csv(uploaded_file_sai, sep=None, engine='python', encoding='latin-1')
+
+                df_sai_csv.columns = df_sai_csv.columns.str.lower().str.strip()
+
+                # Renomeia colunas comuns para o padrão do banco de dados
+                rename_map_sai = {
+                    'descrição': 'descricao',
+                    'descriçao': 'descricao',
+                    'historico': 'descricao',
+                    'description': 'descricao'
+                }
+                df_sai_csv.rename(columns=rename_map_sai, inplace=True)
+
+                if 'data' in df_sai_csv.columns:
+                    df_sai_csv['data'] = pd.to_datetime(df_sai_csv['data'], dayfirst=True, errors='coerce')
+                    df_sai_csv.dropna(subset=['data'], inplace=True)
+
+                    # Limpeza e conversão da coluna 'valor'
+                    if 'valor' in df_sai_csv.columns:
+                        def clean_valor(v):
+                            v_str = str(v).strip()
+                            if ',' in v_str:
+                                return v_str.replace('.', '').replace(',', '.')
+                            return v_str
+                        df_sai_csv['valor'] = df_sai_csv['valor'].apply(clean_valor)
+                        df_sai_csv['valor'] = pd.to_numeric(df_sai_csv['valor'], errors='coerce').fillna(0.0)
+
+                    st.dataframe(df_sai_csv.head(), use_container_width=True)
+
+                    agrupar_saidas = st.checkbox("Agrupar saídas por mês e descrição?", value=False, key="agrupar_saidas_csv", help="Marque para somar valores com a mesma descrição dentro do mesmo mês em um único lançamento.")
+
+                    if st.button("Confirmar Importação (Saídas)", type="primary"):
+                        df_para_processar = df_sai_csv.copy()
+
+                        if agrupar_saidas:
+                            # Adiciona uma coluna para agrupar por mês/ano
+                            df_para_processar['mes_ano'] = df_para_processar['data'].dt.to_period('M')
+
+                            # Agrupa, soma os valores e pega o primeiro tipo de conta
+                            df_agrupado = df_para_processar.groupby(['mes_ano', 'descricao']).agg(
+                                valor=('valor', 'sum'),
+                                tipo_conta=('tipo_conta', 'first')
+                            ).reset_index()
+
+                            # Recria a coluna 'data' como o primeiro dia do mês
+                            df_agrupado['data'] = df_agrupado['mes_ano'].dt.to_timestamp()
+                            df_para_processar = df_agrupado
+
+                        df_para_processar['usuario_lancamento'] = username
+                        cols_validas = pd.read_sql("SELECT * FROM saidas LIMIT 0", engine).columns
+                        df_final = df_para_processar[[c for c in df_para_processar.columns if c in cols_validas]]
+                        df_final.to_sql('saidas', engine, if_exists='append', index=False)
+                        st.success(f"{len(df_final)} saídas importadas com sucesso!")
+                        st.cache_data.clear()
+                        st.rerun()
+                else:
+                    st.error("O arquivo CSV precisa ter uma coluna chamada 'data'.")
+            except Exception as e:
+                st.error(f"Erro ao ler CSV: {e}")
+
+    @fragmento("lancamentos")
+    def aba_lancamentos(entradas_df, saidas_df, clientes_cadastrados):
         st.header("✍️ Lançamentos e Edição")
 
         edit_data = None
@@ -259,10 +465,7 @@ if "authentication_status" in st.session_state and st.session_state["authenticat
 
         if st.session_state.edit_id:
             st.info(f"Você está editando o lançamento ID: {st.session_state.edit_id} ({st.session_state.edit_table[:-1]})")
-            if st.button("Cancelar Edição"):
-                st.session_state.edit_id = None
-                st.session_state.edit_table = None
-                st.rerun()
+            st.button("Cancelar Edição", on_click=definir_edicao)
 
         # Layout: Coluna maior para Entradas (mais campos), Coluna menor para Saídas
         col_form1, col_form2 = st.columns([1.8, 1], gap="medium")
@@ -276,56 +479,7 @@ if "authentication_status" in st.session_state and st.session_state["authenticat
                 st.markdown("### 🛠️ Nova Ordem de Serviço (Entrada)" if not is_editing_entrada else "### 📝 Editando Ordem de Serviço")
                 
                 with st.expander("📤 Importar Entradas via CSV"):
-                    st.info("Colunas sugeridas: data, cliente, valor_atendimento, ordem_servico, descricao_servico, status.")
-                    uploaded_file_ent = st.file_uploader("Selecionar CSV de Entradas", type="csv", key="csv_entradas")
-                    if uploaded_file_ent:
-                        try:
-                            try:
-                                df_ent_csv = pd.read_csv(uploaded_file_ent, sep=None, engine='python')
-                            except UnicodeDecodeError:
-                                uploaded_file_ent.seek(0)
-                                df_ent_csv = pd.read_csv(uploaded_file_ent, sep=None, engine='python', encoding='latin-1')
-
-                            df_ent_csv.columns = df_ent_csv.columns.str.lower().str.strip()
-
-                            # Renomeia colunas comuns para o padrão do banco de dados
-                            rename_map = {
-                                'descricao': 'descricao_servico',
-                                'descrição': 'descricao_servico',
-                                'descriçao': 'descricao_servico',
-                                'description': 'descricao_servico',
-                                'valor': 'valor_atendimento',
-                                'os': 'ordem_servico'
-                            }
-                            df_ent_csv.rename(columns=rename_map, inplace=True)
-
-                            if 'data' in df_ent_csv.columns:
-                                df_ent_csv['data'] = pd.to_datetime(df_ent_csv['data'], dayfirst=True, errors='coerce')
-                                df_ent_csv.dropna(subset=['data'], inplace=True)
-
-                                # Limpeza e conversão da coluna 'valor_atendimento'
-                                if 'valor_atendimento' in df_ent_csv.columns:
-                                    def clean_valor(v):
-                                        v_str = str(v).strip()
-                                        if ',' in v_str:
-                                            return v_str.replace('.', '').replace(',', '.')
-                                        return v_str
-                                    df_ent_csv['valor_atendimento'] = df_ent_csv['valor_atendimento'].apply(clean_valor)
-                                    df_ent_csv['valor_atendimento'] = pd.to_numeric(df_ent_csv['valor_atendimento'], errors='coerce').fillna(0.0)
-
-                                st.dataframe(df_ent_csv.head(), use_container_width=True)
-                                if st.button("Confirmar Importação (Entradas)", type="primary"):
-                                    df_ent_csv['usuario_lancamento'] = username
-                                    cols_validas = pd.read_sql("SELECT * FROM entradas LIMIT 0", engine).columns
-                                    df_final = df_ent_csv[[c for c in df_ent_csv.columns if c in cols_validas]]
-                                    df_final.to_sql('entradas', engine, if_exists='append', index=False)
-                                    st.success(f"{len(df_final)} entradas importadas com sucesso!")
-                                    st.cache_data.clear()
-                                    st.rerun()
-                            else:
-                                st.error("O arquivo CSV precisa ter uma coluna chamada 'data'.")
-                        except Exception as e:
-                            st.error(f"Erro ao ler CSV: {e}")
+                    importar_csv_entradas()
 
                 with st.form("form_entradas", clear_on_submit=True):
                     # --- LÓGICA DE VALORES PADRÃO ---
@@ -373,7 +527,7 @@ if "authentication_status" in st.session_state and st.session_state["authenticat
                         cliente_index = clientes_cadastrados.index(cliente_default) if cliente_default in clientes_cadastrados else 0
                         cliente = st.selectbox("Cliente", options=clientes_cadastrados, index=cliente_index)
                     with c_gen2:
-                        os_id = st.text_input("Nº da O.S.", value=os_id_default)
+                        os_id = st.text_input("Nº da O.S.", value=os_id_default, placeholder="Automático", help="Deixe em branco para usar o próximo número da sequência.")
                     with c_gen3:
                         status_options = ["Pendente", "Pago", "Cancelado"]
                         status = st.selectbox("Status", options=status_options, index=status_options.index(status_default))
@@ -493,10 +647,12 @@ if "authentication_status" in st.session_state and st.session_state["authenticat
                     atualizar_lancamento('entradas', st.session_state.edit_id, dados_lancamento)
                     st.success("Entrada atualizada!")
                 else:
-                    colunas_existentes = pd.read_sql("SELECT * FROM entradas LIMIT 1", engine).columns
-                    dados_lancamento_filtrado = {k: v for k, v in dados_lancamento.items() if k in colunas_existentes}
-                    pd.DataFrame([dados_lancamento_filtrado]).to_sql('entradas', engine, if_exists='append', index=False)
-                    st.success("Entrada lançada!")
+                    try:
+                        inserir_entrada(dados_lancamento)
+                    except Exception as e:
+                        st.error(f"Erro ao lançar entrada: {e}")
+                        st.stop()
+                    st.success(f"Entrada lançada! O.S. {dados_lancamento['ordem_servico']}")
 
                 st.session_state.edit_id, st.session_state.edit_table = None, None
                 st.cache_data.clear()
@@ -511,73 +667,7 @@ if "authentication_status" in st.session_state and st.session_state["authenticat
                 st.markdown("### 💸 Nova Despesa (Saída)" if not is_editing_saida else "### 📝 Editando Despesa")
                 
                 with st.expander("📤 Importar Saídas via CSV"):
-                    st.info("Colunas sugeridas: data, descricao, valor, tipo_conta.")
-                    uploaded_file_sai = st.file_uploader("Selecionar CSV de Saídas", type="csv", key="csv_saidas")
-                    if uploaded_file_sai:
-                        try:
-                            try:
-                                df_sai_csv = pd.read_csv(uploaded_file_sai, sep=None, engine='python')
-                            except UnicodeDecodeError:
-                                uploaded_file_sai.seek(0)
-                                df_sai_csv = pd.read_csv(uploaded_file_sai, sep=None, engine='python', encoding='latin-1')
-
-                            df_sai_csv.columns = df_sai_csv.columns.str.lower().str.strip()
-
-                            # Renomeia colunas comuns para o padrão do banco de dados
-                            rename_map_sai = {
-                                'descrição': 'descricao',
-                                'descriçao': 'descricao',
-                                'historico': 'descricao',
-                                'description': 'descricao'
-                            }
-                            df_sai_csv.rename(columns=rename_map_sai, inplace=True)
-
-                            if 'data' in df_sai_csv.columns:
-                                df_sai_csv['data'] = pd.to_datetime(df_sai_csv['data'], dayfirst=True, errors='coerce')
-                                df_sai_csv.dropna(subset=['data'], inplace=True)
-
-                                # Limpeza e conversão da coluna 'valor'
-                                if 'valor' in df_sai_csv.columns:
-                                    def clean_valor(v):
-                                        v_str = str(v).strip()
-                                        if ',' in v_str:
-                                            return v_str.replace('.', '').replace(',', '.')
-                                        return v_str
-                                    df_sai_csv['valor'] = df_sai_csv['valor'].apply(clean_valor)
-                                    df_sai_csv['valor'] = pd.to_numeric(df_sai_csv['valor'], errors='coerce').fillna(0.0)
-
-                                st.dataframe(df_sai_csv.head(), use_container_width=True)
-
-                                agrupar_saidas = st.checkbox("Agrupar saídas por mês e descrição?", value=False, key="agrupar_saidas_csv", help="Marque para somar valores com a mesma descrição dentro do mesmo mês em um único lançamento.")
-
-                                if st.button("Confirmar Importação (Saídas)", type="primary"):
-                                    df_para_processar = df_sai_csv.copy()
-
-                                    if agrupar_saidas:
-                                        # Adiciona uma coluna para agrupar por mês/ano
-                                        df_para_processar['mes_ano'] = df_para_processar['data'].dt.to_period('M')
-                                        
-                                        # Agrupa, soma os valores e pega o primeiro tipo de conta
-                                        df_agrupado = df_para_processar.groupby(['mes_ano', 'descricao']).agg(
-                                            valor=('valor', 'sum'),
-                                            tipo_conta=('tipo_conta', 'first')
-                                        ).reset_index()
-                                        
-                                        # Recria a coluna 'data' como o primeiro dia do mês
-                                        df_agrupado['data'] = df_agrupado['mes_ano'].dt.to_timestamp()
-                                        df_para_processar = df_agrupado
-
-                                    df_para_processar['usuario_lancamento'] = username
-                                    cols_validas = pd.read_sql("SELECT * FROM saidas LIMIT 0", engine).columns
-                                    df_final = df_para_processar[[c for c in df_para_processar.columns if c in cols_validas]]
-                                    df_final.to_sql('saidas', engine, if_exists='append', index=False)
-                                    st.success(f"{len(df_final)} saídas importadas com sucesso!")
-                                    st.cache_data.clear()
-                                    st.rerun()
-                            else:
-                                st.error("O arquivo CSV precisa ter uma coluna chamada 'data'.")
-                        except Exception as e:
-                            st.error(f"Erro ao ler CSV: {e}")
+                    importar_csv_saidas()
 
                 with st.form("form_saidas", clear_on_submit=True):
                     if is_editing_saida and edit_data and pd.notnull(edit_data.get('data')):
@@ -622,25 +712,38 @@ if "authentication_status" in st.session_state and st.session_state["authenticat
             tipo_lancamento = st.radio("Selecione o tipo para gerenciar:", ["Entrada", "Saída"], horizontal=True)
             df_gerenciar = entradas_df if tipo_lancamento == "Entrada" else saidas_df
 
-            if not df_gerenciar.empty:
-                df_gerenciar_sorted = df_gerenciar.sort_values(by='data', ascending=False)
-                if tipo_lancamento == "Entrada":
-                    df_gerenciar_sorted['display'] = df_gerenciar_sorted.apply(lambda row: f"ID {row['id']}: {(row['data'].strftime('%d/%m/%y %H:%M') if pd.notnull(row['data']) else 'Data N/A')} - O.S. {row.get('ordem_servico', 'N/A')} - {row.get('cliente', 'N/A')}", axis=1)
-                else:
-                    df_gerenciar_sorted['display'] = df_gerenciar_sorted.apply(lambda row: f"ID {row['id']}: {(row['data'].strftime('%d/%m/%y %H:%M') if pd.notnull(row['data']) else 'Data N/A')} - {row.get('descricao', 'N/A')} - R$ {row.get('valor', 0):.2f}", axis=1)
-
-                lancamento_selecionado = st.selectbox("Selecione o lançamento para editar ou excluir", options=df_gerenciar_sorted['display'], key=f"select_lancamento_{tipo_lancamento}")
-                if lancamento_selecionado:
-                    id_selecionado = int(lancamento_selecionado.split(':')[0].replace('ID', '').strip())
+            tabela_gerenciar = 'entradas' if tipo_lancamento == "Entrada" else 'saidas'
 
+            if not df_gerenciar.empty:
+                termo_busca = st.text_input(
+                    "🔎 Buscar lançamento",
+                    placeholder="ID, Nº O.S., início do nome do cliente ou trecho da descrição" if tipo_lancamento == "Entrada" else "ID, tipo de conta ou trecho da descrição",
+                    key=f"busca_lancamento_{tipo_lancamento}"
+                )
+                try:
+                    encontrados = buscar_lancamentos(engine, tabela_gerenciar, termo_busca)
+                except Exception as e:
+                    st.error(f"Erro ao buscar lançamentos: {e}")
+                    encontrados = pd.DataFrame()
+
+                # O valor do seletor é o próprio id; o texto vem só do format_func
+                rotulos = {int(lanc['id']): rotulo_lancamento(tabela_gerenciar, lanc) for lanc in encontrados.to_dict('records')}
+                if not rotulos:
+                    st.info("Nenhum lançamento encontrado para a busca.")
+                id_selecionado = st.selectbox(
+                    "Selecione o lançamento para editar ou excluir",
+                    options=list(rotulos), format_func=rotulos.get,
+                    key=f"select_lancamento_{tipo_lancamento}"
+                )
+                if id_selecionado is not None:
                     col_btn1, col_btn2, col_btn3 = st.columns([1, 1, 4])
-                    if col_btn1.button("📝 Editar", key=f"edit_{tipo_lancamento}", use_container_width=True):
-                        st.session_state.edit_id = id_selecionado
-                        st.session_state.edit_table = 'entradas' if tipo_lancamento == "Entrada" else 'saidas'
-                        st.rerun()
+                    col_btn1.button(
+                        "📝 Editar", key=f"edit_{tipo_lancamento}", use_container_width=True,
+                        on_click=definir_edicao, args=(id_selecionado, tabela_gerenciar)
+                    )
 
                     if col_btn2.button("🗑️ Excluir", type="primary", key=f"delete_{tipo_lancamento}", use_container_width=True):
-                        deletar_lancamento('entradas' if tipo_lancamento == "Entrada" else 'saidas', id_selecionado)
+                        deletar_lancamento(tabela_gerenciar, id_selecionado)
                         st.success("Lançamento excluído!")
                         st.cache_data.clear()
                         st.rerun()
@@ -683,9 +786,14 @@ if "authentication_status" in st.session_state and st.session_state["authenticat
                                 except Exception as e:
                                     st.error(f"Erro ao excluir: {e}")
 
+    with tab2:
+        aba_lancamentos(entradas_df, saidas_df, clientes_cadastrados)
+
 # --- ABA DO DASHBOARD ---
 if "authentication_status" in st.session_state and st.session_state["authentication_status"]:
-    with tab1:
+    # Filtros, métricas, gráficos e exportação dependem dos mesmos filtros: um fragmento só.
+    @fragmento("painel")
+    def painel_financeiro(entradas_df, saidas_df):
         start_date, end_date = None, None
         entradas_filtradas, saidas_filtradas = pd.DataFrame(), pd.DataFrame()
 
@@ -741,11 +849,11 @@ if "authentication_status" in st.session_state and st.session_state["authenticat
                         with c_bot1:
                             cliente_filtro = st.selectbox("👤 Cliente:", options=["Todos"] + clientes_disponiveis)
 
-                        tecnicos_disponiveis = []
-                        if 'nome_tecnicos' in entradas_df.columns:
-                            series_tecnicos = entradas_df['nome_tecnicos'].dropna().str.split(',').explode()
-                            tecnicos_disponiveis = sorted(series_tecnicos.str.strip().replace('', pd.NA).dropna().unique())
-                        
+                        try:
+                            tecnicos_disponiveis = carregar_tecnicos(engine)
+                        except Exception:
+                            tecnicos_disponiveis = []
+
                         with c_bot2:
                             tecnico_filtro = st.multiselect("🔧 Técnico:", options=tecnicos_disponiveis, default=[], placeholder="Todos os técnicos")
 
@@ -770,8 +878,9 @@ if "authentication_status" in st.session_state and st.session_state["authenticat
                             entradas_filtradas = entradas_filtradas[entradas_filtradas['status'].isin(status_filtro)]
                         
                         if tecnico_filtro:
-                            regex_filtro = '|'.join(tecnico_filtro)
-                            entradas_filtradas = entradas_filtradas[entradas_filtradas['nome_tecnicos'].str.contains(regex_filtro, na=False, regex=True)]
+                            # Junção com entrada_tecnicos (nome exato, sem casar trechos de outros nomes)
+                            ids_tecnicos = entradas_dos_tecnicos(engine, tuple(tecnico_filtro))
+                            entradas_filtradas = entradas_filtradas[entradas_filtradas['id'].isin(ids_tecnicos)]
 
                         # Aplicação dos Filtros de Saída
                         if filtro_descricao_saida and 'descricao' in saidas_filtradas.columns:
@@ -779,22 +888,53 @@ if "authentication_status" in st.session_state and st.session_state["authenticat
                         
                         if filtro_tipo_saida and 'tipo_conta' in saidas_filtradas.columns:
                             saidas_filtradas = saidas_filtradas[saidas_filtradas['tipo_conta'].isin(filtro_tipo_saida)]
+
+                        # Assinatura dos filtros: identifica gráficos e exportações no cache
+                        assinatura_filtros = (
+                            start_date, end_date, cliente_filtro, tuple(status_filtro), tuple(tecnico_filtro),
+                            filtro_descricao_saida, tuple(filtro_tipo_saida)
+                        )
         else:
             st.warning("Nenhum dado lançado ainda.")
 
         # --- CONTAINER DE MÉTRICAS ---
         with st.container(border=True):
             st.subheader("💵 Resumo Financeiro do Período")
-            total_entradas = entradas_filtradas['valor_atendimento'].sum() if 'valor_atendimento' in entradas_filtradas.columns else 0
-            total_saidas = saidas_filtradas['valor'].sum() if 'valor' in saidas_filtradas.columns else 0
-            lucro_real = total_entradas - total_saidas
-            total_repasses = entradas_filtradas['valor_repasse_laboratorio'].sum() if 'valor_repasse_laboratorio' in entradas_filtradas.columns else 0
+            kpis = None
+            if start_date and end_date:
+                try:
+                    kpis = calcular_kpis(
+                        engine, start_date, end_date, status=tuple(status_filtro),
+                        cliente=None if cliente_filtro == "Todos" else cliente_filtro, tecnicos=tuple(tecnico_filtro),
+                        descricao_saida=filtro_descricao_saida or None, tipos_saida=tuple(filtro_tipo_saida)
+                    )
+                except Exception as e:
+                    st.error(f"Erro ao calcular os indicadores: {e}")
+
+            if kpis is not None:
+                periodos = periodos_comparacao(start_date, end_date)
+                indicadores = [
+                    ('entradas', "🟢 Total de Entradas", None),
+                    ('saidas', "🔴 Total de Saídas", None),
+                    ('lucro', "💰 Lucro Real", None),
+                    ('repasses', "🤝 Total Repasses", "Valor destinado a parceiros (Laboratório)."),
+                ]
+                for col_kpi, (medida, rotulo, ajuda) in zip(st.columns(4), indicadores):
+                    atual = kpis.loc['atual', medida]
+                    ano_anterior = kpis.loc['ano_anterior', medida]
+                    delta = variacao(atual, kpis.loc['anterior', medida])
+                    col_kpi.metric(
+                        rotulo, f"R$ {atual:,.2f}", delta=f"{delta} vs. período anterior" if delta else None,
+                        delta_color="inverse" if medida == 'saidas' else "normal", help=ajuda
+                    )
+                    delta_ano = variacao(atual, ano_anterior)
+                    col_kpi.caption(f"Ano passado: R$ {ano_anterior:,.2f}" + (f" ({delta_ano})" if delta_ano else ""))
 
-            col1, col2, col3, col4 = st.columns(4)
-            col1.metric("🟢 Total de Entradas", f"R$ {total_entradas:,.2f}")
-            col2.metric("🔴 Total de Saídas", f"R$ {total_saidas:,.2f}")
-            col3.metric("💰 Lucro Real", f"R$ {lucro_real:,.2f}")
-            col4.metric("🤝 Total Repasses", f"R$ {total_repasses:,.2f}", help="Valor destinado a parceiros (Laboratório).")
+                anterior_inicio, anterior_fim = periodos['anterior']
+                st.caption(
+                    f"Período anterior: {anterior_inicio.strftime('%d/%m/%Y')} a {anterior_fim.strftime('%d/%m/%Y')}. "
+                    "As comparações usam os mesmos filtros do painel."
+                )
 
         # --- CONTAINER DE GRÁFICOS ---
         with st.container(border=True):
@@ -804,8 +944,8 @@ if "authentication_status" in st.session_state and st.session_state["authenticat
             with col_charts1:
                 st.markdown("##### 🔴 Composição das Saídas")
                 if not saidas_filtradas.empty:
-                    fig = px.pie(saidas_filtradas, names='descricao', values='valor', title="Distribuição de Despesas")
-                    fig.update_traces(hovertemplate='<b>%{label}</b><br>Valor: R$ %{value:,.2f}<extra></extra>')
+                    # Maiores despesas + "Outros": descrições livres com grafias diferentes viram uma fatia só
+                    fig = grafico_pizza("dashboard_saidas", assinatura_filtros, saidas_filtradas, 'descricao', 'valor', titulo="Distribuição de Despesas")
                     st.plotly_chart(fig, use_container_width=True)
                 else:
                     st.info("Nenhuma saída no período.")
@@ -864,35 +1004,69 @@ if "authentication_status" in st.session_state and st.session_state["authenticat
             else:
                 st.info("Sem dados de entradas para calcular repasses.")
 
-        # --- CONTAINER DE EXPORTAÇÃO E TABELAS ---
+        # --- CONTAINER DE PRODUTIVIDADE POR TÉCNICO ---
+        with st.container(border=True):
+            st.subheader("👷 Produtividade por Técnico")
+            if start_date and end_date:
+                try:
+                    df_produtividade = produtividade_tecnicos(
+                        engine, start_date, end_date, status=tuple(status_filtro),
+                        cliente=None if cliente_filtro == "Todos" else cliente_filtro, tecnicos=tuple(tecnico_filtro)
+                    )
+                except Exception as e:
+                    st.error(f"Erro ao calcular a produtividade: {e}")
+                    df_produtividade = pd.DataFrame()
+
+                if not df_produtividade.empty:
+                    st.dataframe(
+                        df_produtividade,
+                        column_config={
+                            "tecnico": "Técnico",
+                            "ordens": st.column_config.NumberColumn("O.S.", format="%d"),
+                            "horas_normais": st.column_config.NumberColumn("Horas Normais", format="%.1f h"),
+                            "horas_extra_50": st.column_config.NumberColumn("Horas 50%", format="%.1f h"),
+                            "horas_extra_100": st.column_config.NumberColumn("Horas 100%", format="%.1f h"),
+                            "horas_total": st.column_config.NumberColumn("Total de Horas", format="%.1f h"),
+                            "faturamento": st.column_config.NumberColumn("Faturamento (R$)", format="R$ %.2f", help="Valor das O.S. dividido igualmente entre os técnicos de cada uma."),
+                        },
+                        use_container_width=True, hide_index=True
+                    )
+                else:
+                    st.info("Nenhum técnico vinculado às entradas do período.")
+
+        # --- CONTAINER DE EXPORTAÇÃO ---
         with st.container(border=True):
-            st.subheader("📥 Exportar e Visualizar Dados")
+            st.subheader("📥 Exportar Dados")
             if start_date and end_date:
                 col_exp1, col_exp2 = st.columns(2)
                 
+                sufixo_arquivo = f"{start_date.strftime('%Y%m%d')}_{end_date.strftime('%Y%m%d')}"
+
+                # Os arquivos só são gerados quando o botão é clicado (data=callable)
                 with col_exp1:
-                    buffer = io.BytesIO()
-                    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-                        entradas_filtradas.to_excel(writer, index=False, sheet_name='Entradas')
-                        saidas_filtradas.to_excel(writer, index=False, sheet_name='Saídas')
                     st.download_button(
                         label="📥 Baixar Relatório (Excel)",
-                        data=buffer.getvalue(),
-                        file_name=f"Relatorio_Financeiro_{start_date.strftime('%Y%m%d')}_{end_date.strftime('%Y%m%d')}.xlsx",
-                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                        data=lambda: gerar_excel_exportacao(assinatura_filtros, entradas_filtradas, saidas_filtradas),
+                        file_name=f"Relatorio_Financeiro_{sufixo_arquivo}.xlsx",
+                        mime=MIME_EXCEL,
                         use_container_width=True
                     )
                 
                 with col_exp2:
-                    pdf_bytes = gerar_pdf_financeiro(entradas_filtradas, saidas_filtradas, start_date, end_date)
                     st.download_button(
                         label="📄 Baixar Relatório (PDF)",
-                        data=pdf_bytes,
-                        file_name=f"Relatorio_Financeiro_{start_date.strftime('%Y%m%d')}_{end_date.strftime('%Y%m%d')}.pdf",
+                        data=lambda: gerar_pdf_exportacao(assinatura_filtros, entradas_filtradas, saidas_filtradas, start_date, end_date),
+                        file_name=f"Relatorio_Financeiro_{sufixo_arquivo}.pdf",
                         mime="application/pdf",
                         use_container_width=True
                     )
 
+    with tab1:
+        painel_financeiro(entradas_df, saidas_df)
+
+        # --- REGISTROS COMPLETOS (fora do painel: não dependem dos filtros) ---
+        with st.container(border=True):
+            st.subheader("📋 Registros Completos")
             currency_columns = {
                 "valor_atendimento": st.column_config.NumberColumn("Valor Total (R$)", format="R$ %.2f"),
                 "horas_tecnicas": st.column_config.NumberColumn("Horas Normais (R$)", format="R$ %.2f"),
@@ -910,7 +1084,18 @@ if "authentication_status" in st.session_state and st.session_state["authenticat
                 "patrimonio": "Patrimônio", "maquina": "Máquina", "hora_inicio": "Início", "hora_fim": "Fim",
                 "nome_tecnicos": "Técnico(s)"
             }
+            # Grades paginadas no banco: só a página visível é buscada e enviada ao navegador
             with st.expander("Ver todos os registros de Entrada"):
-                st.dataframe(entradas_df.sort_values(by='data', ascending=False), column_config=currency_columns, use_container_width=True, hide_index=True)
+                grade_paginada(
+                    engine, "grade_entradas", "SELECT * FROM entradas",
+                    colunas_busca=('id', 'ordem_servico', 'cliente', 'descricao_servico', 'maquina', 'patrimonio', 'nome_tecnicos', 'status'),
+                    ordenacoes={'Data': ORDEM_DATA, 'Valor': 'COALESCE(valor_atendimento, 0)', 'ID': 'id'},
+                    column_config=currency_columns
+                )
             with st.expander("Ver todos os registros de Saída"):
-                st.dataframe(saidas_df.sort_values(by='data', ascending=False), column_config=currency_columns, use_container_width=True, hide_index=True)
+                grade_paginada(
+                    engine, "grade_saidas", "SELECT * FROM saidas",
+                    colunas_busca=('id', 'descricao', 'tipo_conta', 'status'),
+                    ordenacoes={'Data': ORDEM_DATA, 'Valor': 'COALESCE(valor, 0)', 'ID': 'id'},
+                    column_config=currency_columns
+                )
@@ -0,0 +1,74 @@
+# benchmark_exportacao.py
+# Compara a exportação para Excel via pandas (workbook completo em BytesIO) com o exportacao.py
+# (openpyxl write_only), medindo tempo e pico de memória (RSS) em 200.000 linhas.
+# Cada forma roda em um processo separado, para que o pico de uma não contamine a outra.
+# Uso: python benchmark_exportacao.py [qtd_linhas]
+import io
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from exportacao import coluna_excel, gerar_planilha, linhas_dataframe
+
+COLUNAS = [
+    coluna_excel('data', 'Data', 'data_hora'),
+    coluna_excel('ordem_servico', 'Nº O.S.', largura=12),
+    coluna_excel('cliente', 'Cliente'),
+    coluna_excel('descricao_servico', 'Descrição', largura=45),
+    coluna_excel('valor_atendimento', 'Valor', 'moeda'),
+    coluna_excel('status', 'Status', largura=12),
+]
+
+def gerar_dados(qtd_linhas):
+    rng = np.random.default_rng(42)
+    return pd.DataFrame({
+        'data': pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 365 * 24 * 60, qtd_linhas), unit='min'),
+        'ordem_servico': rng.integers(1000, 99999, qtd_linhas).astype(str),
+        'cliente': rng.choice(["Metalúrgica São José", "Usinagem Precisa", "Ferramentaria Alfa", "Indústria Beta"], qtd_linhas),
+        'descricao_servico': rng.choice(["Troca de fuso", "Manutenção preventiva", "Ajuste de geometria", "Reparo no trocador de ferramentas"], qtd_linhas),
+        'valor_atendimento': rng.uniform(100, 10000, qtd_linhas).round(2),
+        'status': rng.choice(["Pendente", "Pago"], qtd_linhas),
+    })
+
+def linhas_geradas(qtd_linhas, tamanho_lote=5000):
+    """Simula um cursor do banco: entrega as linhas em lotes, sem o resultado inteiro na memória."""
+    for inicio in range(0, qtd_linhas, tamanho_lote):
+        yield from linhas_dataframe(gerar_dados(min(tamanho_lote, qtd_linhas - inicio)))
+
+def com_pandas(df):
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+        df.to_excel(writer, index=False, sheet_name='Entradas')
+    return buffer.getvalue()
+
+def com_exportacao_dataframe(df):
+    return gerar_planilha([{'nome': 'Entradas', 'colunas': COLUNAS, 'linhas': linhas_dataframe(df)}])
+
+def com_exportacao_cursor(qtd_linhas):
+    return gerar_planilha([{'nome': 'Entradas', 'colunas': COLUNAS, 'linhas': linhas_geradas(qtd_linhas)}])
+
+METODOS = {
+    'pandas + openpyxl': lambda n: com_pandas(gerar_dados(n)),
+    'exportacao (DataFrame)': lambda n: com_exportacao_dataframe(gerar_dados(n)),
+    'exportacao (cursor em lotes)': com_exportacao_cursor,
+}
+
+def medir(nome, qtd_linhas):
+    inicio = time.perf_counter()
+    conteudo = METODOS[nome](qtd_linhas)
+    duracao = time.perf_counter() - inicio
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KB -> MB (Linux)
+    print(f"{nome:<28} tempo: {duracao:6.1f}s | pico de memória: {pico:7.1f} MB | arquivo: {len(conteudo) / 1024 / 1024:5.1f} MB", flush=True)
+
+if __name__ == "__main__":
+    qtd_linhas = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    if len(sys.argv) > 2:
+        medir(sys.argv[2], qtd_linhas)
+    else:
+        print(f"Exportação de {qtd_linhas} linhas (o tempo inclui gerar os dados)", flush=True)
+        for nome in METODOS:
+            subprocess.run([sys.executable, __file__, str(qtd_linhas), nome], check=True)
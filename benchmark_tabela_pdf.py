@@ -0,0 +1,79 @@
+# benchmark_tabela_pdf.py
+# Compara o desenho linha a linha (iterrows + cell/multi_cell) com o tabela_pdf em tabelas de 5.000 linhas.
+# Uso: python benchmark_tabela_pdf.py [qtd_linhas]
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from relatorio_fechamento import FechamentoPDF, COLUNAS_SERVICOS
+from tabela_pdf import desenhar_tabela
+
+MAQUINAS = [
+    "Torno CNC",
+    "Centro de Usinagem Vertical Romi D800 com Quarto Eixo",
+    "Fresadora Ferramenteira",
+    "Retífica Cilíndrica CNC de Alta Precisão com Dressador Automático",
+]
+
+def gerar_dados(qtd_linhas):
+    rng = np.random.default_rng(42)
+    return pd.DataFrame({
+        'data': pd.Timestamp('2025-01-01') + pd.to_timedelta(rng.integers(0, 365, qtd_linhas), unit='D'),
+        'ordem_servico': rng.integers(1000, 99999, qtd_linhas).astype(str),
+        'maquina': rng.choice(MAQUINAS, qtd_linhas),
+        'patrimonio': [f"PAT-{i:05d}" for i in range(qtd_linhas)],
+        'valor_atendimento': rng.uniform(100, 10000, qtd_linhas).round(2),
+    })
+
+def novo_pdf():
+    pdf = FechamentoPDF()
+    pdf.add_font('DejaVu', '', 'DejaVuSans.ttf')
+    pdf.add_font('DejaVu', 'B', 'DejaVuSans-Bold.ttf')
+    pdf.add_font('DejaVu', 'I', 'DejaVuSans-Oblique.ttf')
+    pdf.set_auto_page_break(auto=True, margin=15)
+    pdf.add_page()
+    pdf.set_font('DejaVu', '', 10)
+    return pdf
+
+def desenho_linha_a_linha(df):
+    """Forma anterior: iterrows com set_xy manual para a coluna Máquina."""
+    pdf = novo_pdf()
+    for _, row in df.iterrows():
+        pdf.cell(25, 7, row['data'].strftime('%d/%m/%Y'), 1, 0, 'C')
+        pdf.cell(30, 7, str(row['ordem_servico']), 1, 0, 'C')
+        x_atual = pdf.get_x()
+        y_atual = pdf.get_y()
+        pdf.multi_cell(65, 7, str(row['maquina']), 1, 'L')
+        pdf.set_xy(x_atual + 65, y_atual)
+        pdf.cell(30, 7, str(row.get('patrimonio', '')), 1, 0, 'C')
+        pdf.cell(40, 7, f"R$ {row['valor_atendimento']:.2f}".replace('.', ','), 1, 1, 'R')
+    return pdf
+
+def desenho_tabela_pdf(df):
+    pdf = novo_pdf()
+    valores = [
+        df['data'].dt.strftime('%d/%m/%Y').tolist(),
+        df['ordem_servico'].astype(str).tolist(),
+        df['maquina'].astype(str).tolist(),
+        df['patrimonio'].astype(str).tolist(),
+        [f"R$ {v:.2f}".replace('.', ',') for v in df['valor_atendimento'].tolist()],
+    ]
+    desenhar_tabela(pdf, COLUNAS_SERVICOS, valores, altura_linha=7, tamanho_fonte=10)
+    return pdf
+
+def medir(nome, funcao, df):
+    inicio = time.perf_counter()
+    pdf = funcao(df)
+    desenho = time.perf_counter() - inicio
+    conteudo = bytes(pdf.output())
+    total = time.perf_counter() - inicio
+    print(f"{nome:<22} desenho: {desenho:6.2f}s | total: {total:6.2f}s | páginas: {pdf.page_no():4d} | {len(conteudo) / 1024:,.0f} KB")
+
+if __name__ == "__main__":
+    qtd_linhas = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    df = gerar_dados(qtd_linhas)
+    print(f"Tabela de serviços com {qtd_linhas} linhas")
+    medir("linha a linha", desenho_linha_a_linha, df)
+    medir("tabela_pdf", desenho_tabela_pdf, df)
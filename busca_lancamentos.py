@@ -0,0 +1,70 @@
+# busca_lancamentos.py
+# Busca rápida de lançamentos (entradas/saídas) para seleção: por ID, Nº O.S., início do cliente ou trecho da descrição.
+import pandas as pd
+from sqlalchemy import text
+
+LIMITE_RESULTADOS = 20
+
+# Cada critério usa o seu índice (ver setup_nuvem.py): a chave primária para o ID, btree para
+# o Nº O.S. e índices de trigramas (pg_trgm) para o início do nome e os trechos de descrição.
+TABELAS_BUSCA = {
+    'entradas': {
+        'colunas': "id, data, ordem_servico, cliente, valor_atendimento AS valor",
+        'exatas': ('ordem_servico',),
+        'prefixo': ('cliente',),
+        'trecho': ('descricao_servico',),
+    },
+    'saidas': {
+        'colunas': "id, data, descricao, tipo_conta, valor",
+        'exatas': (),
+        'prefixo': ('tipo_conta',),
+        'trecho': ('descricao',),
+    },
+}
+
+def _escapar_like(termo):
+    return termo.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def buscar_lancamentos(engine, tabela, termo=None, limite=LIMITE_RESULTADOS):
+    """Melhores resultados para `termo` em `tabela` ('entradas' ou 'saidas').
+    Ordem: ID exato, Nº O.S. exato, nome começando pelo termo, descrição contendo o termo;
+    dentro de cada grupo, os mais recentes primeiro. Sem termo, retorna os mais recentes."""
+    config = TABELAS_BUSCA[tabela]
+    termo = (termo or '').strip()
+    params = {"limite": limite}
+
+    if not termo:
+        query = f"SELECT {config['colunas']} FROM {tabela} ORDER BY data DESC, id DESC LIMIT :limite"
+        return pd.read_sql_query(text(query), engine, params=params, parse_dates=['data'])
+
+    # Cada critério é uma subconsulta limitada, para que o banco use o índice de cada um
+    candidatos = []
+    if termo.isdigit() and len(termo) < 10:
+        candidatos.append(f"(SELECT id, 1 AS prioridade FROM {tabela} WHERE id = :id)")
+        params["id"] = int(termo)
+    for coluna in config['exatas']:
+        candidatos.append(f"(SELECT id, 2 AS prioridade FROM {tabela} WHERE {coluna} = :termo ORDER BY data DESC LIMIT :limite)")
+    for coluna in config['prefixo']:
+        candidatos.append(f"(SELECT id, 3 AS prioridade FROM {tabela} WHERE {coluna} ILIKE :prefixo ORDER BY data DESC LIMIT :limite)")
+    for coluna in config['trecho']:
+        candidatos.append(f"(SELECT id, 4 AS prioridade FROM {tabela} WHERE {coluna} ILIKE :trecho ORDER BY data DESC LIMIT :limite)")
+    params.update(termo=termo, prefixo=f"{_escapar_like(termo)}%", trecho=f"%{_escapar_like(termo)}%")
+
+    colunas = ", ".join(f"t.{c.strip()}" for c in config['colunas'].split(','))
+    query = f"""
+        WITH candidatos AS ({" UNION ALL ".join(candidatos)})
+        SELECT {colunas}
+        FROM (SELECT id, MIN(prioridade) AS prioridade FROM candidatos GROUP BY id) c
+        JOIN {tabela} t ON t.id = c.id
+        ORDER BY c.prioridade, t.data DESC, t.id DESC
+        LIMIT :limite
+    """
+    return pd.read_sql_query(text(query), engine, params=params, parse_dates=['data'])
+
+def rotulo_lancamento(tabela, lancamento):
+    """Texto exibido no seletor para um lançamento (linha retornada por buscar_lancamentos)."""
+    data = lancamento['data'].strftime('%d/%m/%y %H:%M') if pd.notnull(lancamento['data']) else 'Data N/A'
+    valor = f"R$ {lancamento['valor']:.2f}" if pd.notnull(lancamento['valor']) else "R$ -"
+    if tabela == 'entradas':
+        return f"ID {lancamento['id']}: {data} - O.S. {lancamento['ordem_servico'] or 'N/A'} - {lancamento['cliente'] or 'N/A'} - {valor}"
+    return f"ID {lancamento['id']}: {data} - {lancamento['descricao'] or 'N/A'} - {valor}"
@@ -0,0 +1,100 @@
+# cobrancas.py
+# Régua de cobrança: clientes com recebíveis vencidos, links de WhatsApp, lembretes por e-mail e registro (tabela cobrancas).
+import re
+from urllib.parse import quote
+
+import pandas as pd
+import streamlit as st
+from sqlalchemy import text
+
+CANAIS = ('WhatsApp', 'Email')
+INTERVALO_PADRAO = 7  # dias sem repetir a cobrança pelo mesmo canal (chave 'cobranca_intervalo_dias' em configuracoes)
+
+def mensagem_cobranca(cliente, ordens, total):
+    """Texto da cobrança, o mesmo para WhatsApp e e-mail."""
+    return (
+        f"Olá {cliente}, tudo bem? \nConsta em nosso sistema pendência(s) referente(s) à(s) O.S. {ordens}, "
+        f"totalizando R$ {total:,.2f}. \nPoderia nos dar uma previsão de pagamento?"
+    )
+
+def link_whatsapp(telefone, texto):
+    """Link wa.me com a mensagem, ou None se o telefone estiver vazio. Números sem DDI recebem o 55."""
+    numero = re.sub(r'\D', '', str(telefone or ''))
+    if not numero:
+        return None
+    if not numero.startswith('55'):
+        numero = '55' + numero
+    return f"https://wa.me/{numero}?text={quote(texto)}"
+
+@st.cache_data(ttl=600)
+def intervalo_cobranca(_engine):
+    """Dias mínimos entre duas cobranças do mesmo cliente pelo mesmo canal (configuracoes)."""
+    try:
+        with _engine.connect() as con:
+            valor = con.execute(text("SELECT valor FROM configuracoes WHERE chave = 'cobranca_intervalo_dias'")).scalar()
+        return int(valor) if valor else INTERVALO_PADRAO
+    except Exception:
+        return INTERVALO_PADRAO
+
+QUERY_DEVEDORES = """
+    WITH vencidos AS (
+        SELECT
+            cliente,
+            COUNT(*) AS titulos,
+            SUM(valor_atendimento) AS total,
+            MIN(data) AS vencimento_mais_antigo,
+            string_agg(COALESCE(NULLIF(ordem_servico, ''), 'ID ' || id), ', ' ORDER BY data, id) AS ordens
+        FROM entradas
+        WHERE status = 'Pendente' AND data < CURRENT_DATE AND COALESCE(cliente, '') <> ''
+        GROUP BY cliente
+    ), contatos AS (
+        SELECT
+            cliente,
+            MAX(criada_em) FILTER (WHERE canal = 'WhatsApp') AS ultimo_whatsapp,
+            MAX(criada_em) FILTER (WHERE canal = 'Email') AS ultimo_email
+        FROM cobrancas
+        WHERE cliente IN (SELECT cliente FROM vencidos)
+        GROUP BY cliente
+    )
+    SELECT
+        v.cliente, v.titulos, v.total, v.vencimento_mais_antigo, v.ordens,
+        c.telefone, c.email, ct.ultimo_whatsapp, ct.ultimo_email,
+        COALESCE(ct.ultimo_whatsapp >= NOW() - make_interval(days => :dias), FALSE) AS whatsapp_recente,
+        COALESCE(ct.ultimo_email >= NOW() - make_interval(days => :dias), FALSE) AS email_recente
+    FROM vencidos v
+    LEFT JOIN clientes c ON c.nome = v.cliente
+    LEFT JOIN contatos ct ON ct.cliente = v.cliente
+    ORDER BY v.total DESC, v.cliente
+"""
+
+@st.cache_data(ttl=300)
+def carregar_devedores(_engine, dias):
+    """Clientes com recebíveis vencidos (uma linha por cliente), com telefone, e-mail e as últimas
+    cobranças; 'whatsapp_recente'/'email_recente' indicam contato pelo canal nos últimos `dias`."""
+    df = pd.read_sql_query(
+        text(QUERY_DEVEDORES), _engine, params={"dias": int(dias)},
+        parse_dates=['vencimento_mais_antigo', 'ultimo_whatsapp', 'ultimo_email']
+    )
+    df['total'] = df['total'].astype(float)
+    return df
+
+def registrar_cobrancas(con, cobrancas, usuario=None):
+    """Grava o registro dos contatos em uma única instrução, na transação de `con`.
+    `cobrancas`: dicts com cliente, canal, valor, titulos, ordens e (e-mail) email_id."""
+    if not cobrancas:
+        return
+    con.execute(text("""
+        INSERT INTO cobrancas (cliente, canal, valor, titulos, ordens, email_id, usuario_lancamento)
+        SELECT *, :usuario FROM unnest(
+            CAST(:clientes AS TEXT[]), CAST(:canais AS TEXT[]), CAST(:valores AS NUMERIC[]),
+            CAST(:titulos AS INTEGER[]), CAST(:ordens AS TEXT[]), CAST(:email_ids AS INTEGER[])
+        )
+    """), {
+        "clientes": [c['cliente'] for c in cobrancas],
+        "canais": [c['canal'] for c in cobrancas],
+        "valores": [float(c['valor']) for c in cobrancas],
+        "titulos": [int(c['titulos']) for c in cobrancas],
+        "ordens": [c['ordens'] for c in cobrancas],
+        "email_ids": [c.get('email_id') for c in cobrancas],
+        "usuario": usuario,
+    })
@@ -0,0 +1,542 @@
+# correio.py
+# Montagem e envio de e-mails: fila persistente (email_outbox), sessão SMTP reaproveitada e envio em segundo plano.
+import hashlib
+import io
+import logging
+import mimetypes
+import re
+import smtplib
+import threading
+import time
+from email.message import EmailMessage
+from email.parser import BytesHeaderParser
+from email.policy import SMTP as politica_smtp, default as politica_padrao
+from email.utils import getaddresses
+
+import streamlit as st
+from pypdf import PdfReader, PdfWriter
+from sqlalchemy import create_engine, text
+
+from pacote_zip import ArquivoSpool
+
+logger = logging.getLogger(__name__)
+
+ASSINATURA_HTML = """\
+                <table border="0" cellpadding="0" cellspacing="0" style="font-family: Arial, sans-serif; color: #333333; line-height: 1.4;">
+                    <tr>
+                        <td style="padding-right: 15px; border-right: 2px solid #cccccc;">
+                            <a href='https://postimg.cc/fVNyZqpf' target='_blank'>
+                                <img src='https://i.postimg.cc/fVNyZqpf/Whats-App-Image-2025-01-06-at-16-03-50.jpg' border='0' alt='Elite CNC Service' style='max-width: 140px; height: auto;'>
+                            </a>
+                        </td>
+                        <td style="padding-left: 15px;">
+                            <strong style="font-size: 16px;">Filipe Guimarães</strong><br>
+                            <span style="font-size: 14px; color: #666666;">Sócio Proprietário</span><br>
+                            <span style="font-size: 13px;">
+                            📞 WhatsApp: (11) 97761-7009<br>
+                            ✉️ elitecncservice@gmail.com<br>
+                            🌐 <a href="http://www.elitecncservice.com.br" style="color: #0056b3; text-decoration: none;">www.elitecncservice.com.br</a>
+                            </span>
+                        </td>
+                    </tr>
+                </table>"""
+
+# --- CONFIGURAÇÃO ---
+# Chaves opcionais em [email_credentials] no secrets.toml. O padrão é o Gmail (SSL na 465);
+# para testes locais (ex.: aiosmtpd) use host = "localhost", port = 8025, ssl = false.
+CONFIG_PADRAO = {
+    'host': 'smtp.gmail.com',
+    'port': 465,
+    'ssl': True,
+    'starttls': False,
+    'timeout': 30,
+    'intervalo_envio': 1.0,    # segundos mínimos entre duas mensagens (limite de taxa)
+    'max_tentativas': 5,
+    'backoff_base': 60,        # segundos; dobra a cada nova falha
+    'backoff_max': 3600,
+    # Tamanho máximo dos anexos já codificados em base64 por mensagem. O Gmail recusa
+    # mensagens acima de 25 MB; a folga cobre o corpo (texto + HTML) e os cabeçalhos.
+    'limite_anexos': 23 * 1024 * 1024,
+}
+
+def config_smtp(credenciais):
+    """Monta a configuração de envio a partir de st.secrets["email_credentials"]."""
+    config = dict(CONFIG_PADRAO)
+    config.update(dict(credenciais))
+    return config
+
+# --- MONTAGEM DA MENSAGEM ---
+def montar_mensagem(remetente, destinatario, assunto, corpo, anexos=()):
+    """Monta o e-mail (texto + HTML com a assinatura da empresa).
+    `anexos`: lista de dicts {'nome', 'dados'} ou {'nome', 'arquivo'}; o tipo é deduzido pela extensão."""
+    msg = EmailMessage()
+    msg['Subject'] = assunto
+    msg['From'] = remetente
+    msg['To'] = destinatario
+    msg.set_content(corpo)
+
+    corpo_html = corpo.replace('\n', '<br>')
+    html_content = f"""\
+        <html>
+            <body style="font-family: Arial, sans-serif; color: #333333; line-height: 1.6;">
+                <p>{corpo_html}</p>
+                <br>
+{ASSINATURA_HTML}
+            </body>
+        </html>
+        """
+    msg.add_alternative(html_content, subtype='html')
+
+    for anexo in anexos:
+        tipo = mimetypes.guess_type(anexo['nome'])[0] or 'application/octet-stream'
+        maintype, subtype = tipo.split('/', 1)
+        msg.add_attachment(ler_anexo(anexo), maintype=maintype, subtype=subtype, filename=anexo['nome'])
+    return msg
+
+# --- TAMANHO DOS ANEXOS ---
+# Um anexo é {'nome', 'dados'} (bytes) ou {'nome', 'arquivo'} (ArquivoSpool). Com 'arquivo'
+# o conteúdo fica no disco e só é lido na hora de montar a mensagem de que faz parte.
+def ler_anexo(anexo):
+    if 'arquivo' in anexo:
+        return anexo['arquivo'].ler()
+    return bytes(anexo['dados'])
+
+def abrir_anexo(anexo):
+    """Objeto de arquivo posicionado no início, sem copiar o conteúdo para a memória
+    (com 'arquivo', é o próprio arquivo temporário do ArquivoSpool)."""
+    if 'arquivo' in anexo:
+        anexo['arquivo'].arquivo.seek(0)
+        return anexo['arquivo'].arquivo
+    return io.BytesIO(anexo['dados'])
+
+def tamanho_anexo(anexo):
+    """Tamanho do conteúdo em bytes, sem ler o arquivo."""
+    if 'arquivo' in anexo:
+        return anexo['arquivo'].tamanho
+    return len(anexo['dados'])
+
+def tamanho_codificado(tamanho):
+    """Tamanho em base64 como vai na mensagem: 4 bytes a cada 3, linhas de 76 caracteres + CRLF."""
+    base64 = 4 * -(-tamanho // 3)
+    return base64 + 2 * -(-base64 // 76)
+
+def comprimir_pdf(anexo):
+    """Recomprime os fluxos de conteúdo e remove objetos duplicados de um PDF.
+    Retorna um anexo novo (em ArquivoSpool) se ficou menor; senão, o próprio anexo."""
+    if not anexo['nome'].lower().endswith('.pdf'):
+        return anexo
+    try:
+        escritor = PdfWriter(clone_from=PdfReader(abrir_anexo(anexo)))
+        for pagina in escritor.pages:
+            pagina.compress_content_streams(level=9)
+        escritor.compress_identical_objects(remove_identicals=True, remove_orphans=True)
+        comprimido = ArquivoSpool(anexo['nome'])
+        escritor.write(comprimido.arquivo)
+    except Exception as e:
+        logger.warning("Não foi possível recomprimir %s: %s", anexo['nome'], e)
+        return anexo
+    if comprimido.tamanho < tamanho_anexo(anexo):
+        return {'nome': anexo['nome'], 'arquivo': comprimido}
+    comprimido.descartar()
+    return anexo
+
+def dividir_anexos(anexos, limite):
+    """Agrupa os anexos em partes cujo tamanho codificado não passe de `limite`.
+    Primeiro recomprime os PDFs (só se o total não couber em uma mensagem); depois
+    distribui os anexos do maior para o menor na primeira parte em que couberem.
+    Dentro de cada parte a ordem original é mantida."""
+    anexos = list(anexos)
+    if sum(tamanho_codificado(tamanho_anexo(a)) for a in anexos) <= limite:
+        return [anexos] if anexos else [[]]
+
+    anexos = [comprimir_pdf(a) for a in anexos]
+    tamanhos = [tamanho_codificado(tamanho_anexo(a)) for a in anexos]
+    grandes = [a['nome'] for a, t in zip(anexos, tamanhos) if t > limite]
+    if grandes:
+        raise ValueError(
+            f"Anexo(s) maior(es) que o limite de {limite / 1024 / 1024:.0f} MB por email, mesmo após compressão: "
+            + ", ".join(grandes)
+        )
+
+    partes = []  # [tamanho ocupado, [índices]]
+    for indice in sorted(range(len(anexos)), key=lambda i: -tamanhos[i]):
+        parte = next((p for p in partes if p[0] + tamanhos[indice] <= limite), None)
+        if parte is None:
+            parte = [0, []]
+            partes.append(parte)
+        parte[0] += tamanhos[indice]
+        parte[1].append(indice)
+    return [[anexos[i] for i in sorted(indices)] for _, indices in partes]
+
+# --- SESSÃO SMTP ---
+class LimitadorTaxa:
+    """Garante um intervalo mínimo entre envios consecutivos."""
+
+    def __init__(self, intervalo):
+        self.intervalo = float(intervalo or 0)
+        self._ultimo = 0.0
+
+    def aguardar(self):
+        espera = self._ultimo + self.intervalo - time.monotonic()
+        if espera > 0:
+            time.sleep(espera)
+        self._ultimo = time.monotonic()
+
+class SessaoSMTP:
+    """Conexão SMTP autenticada reaproveitada para várias mensagens.
+    Conecta no primeiro envio e reconecta uma vez se o servidor derrubar a sessão."""
+
+    def __init__(self, config):
+        self.config = config
+        self.limitador = LimitadorTaxa(config.get('intervalo_envio'))
+        self._smtp = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+    def _conectar(self):
+        cfg = self.config
+        if cfg.get('ssl'):
+            smtp = smtplib.SMTP_SSL(cfg['host'], int(cfg['port']), timeout=cfg.get('timeout'))
+        else:
+            smtp = smtplib.SMTP(cfg['host'], int(cfg['port']), timeout=cfg.get('timeout'))
+            if cfg.get('starttls'):
+                smtp.starttls()
+        if cfg.get('username') and cfg.get('password'):
+            smtp.login(cfg['username'], cfg['password'])
+        self._smtp = smtp
+
+    def enviar(self, mensagem):
+        """Envia uma mensagem já serializada (bytes), respeitando o limite de taxa."""
+        cabecalhos = BytesHeaderParser(policy=politica_padrao).parsebytes(mensagem)
+        remetente = self.config.get('username') or cabecalhos['From']
+        destinatarios = [
+            endereco for _, endereco in
+            getaddresses(cabecalhos.get_all('To', []) + cabecalhos.get_all('Cc', []) + cabecalhos.get_all('Bcc', []))
+        ]
+
+        self.limitador.aguardar()
+        if self._smtp is None:
+            self._conectar()
+        try:
+            self._smtp.sendmail(remetente, destinatarios, mensagem)
+        except smtplib.SMTPServerDisconnected:
+            self._conectar()
+            self._smtp.sendmail(remetente, destinatarios, mensagem)
+
+    def fechar(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except smtplib.SMTPException:
+                pass
+            self._smtp = None
+
+def _erro_permanente(erro):
+    """Erros 5xx (destinatário recusado, mensagem rejeitada) não adiantam repetir."""
+    if isinstance(erro, smtplib.SMTPRecipientsRefused):
+        return True
+    return isinstance(erro, smtplib.SMTPResponseException) and 500 <= erro.smtp_code < 600 \
+        and not isinstance(erro, smtplib.SMTPAuthenticationError)
+
+# --- FILA (email_outbox) ---
+# Trechos de um PDF que mudam a cada geração mesmo com o mesmo conteúdo: datas e o /ID do trailer.
+# Os tamanhos são limitados para o hash poder ser feito em blocos (ver _hash_documento).
+RE_PDF_VOLATIL = re.compile(rb'/(?:CreationDate|ModDate) *\((?:[^()\\]|\\.){0,256}\)|/ID *\[[^\]]{0,512}\]')
+MARGEM_VOLATIL = 1024  # maior que qualquer trecho de RE_PDF_VOLATIL
+TAMANHO_BLOCO = 1024 * 1024
+
+def _hash_documento(arquivo):
+    """Hash do conteúdo de um anexo, lido em blocos de `arquivo` (ver abrir_anexo), sem carregar
+    o arquivo inteiro na memória. Em PDFs ignora os trechos de RE_PDF_VOLATIL; um trecho que
+    cruze o fim do bloco fica para o bloco seguinte."""
+    hash_ = hashlib.sha256()
+    pendente = arquivo.read(TAMANHO_BLOCO)
+    pdf = pendente.startswith(b'%PDF')
+    while True:
+        bloco = arquivo.read(TAMANHO_BLOCO)
+        pendente += bloco
+        if not bloco:
+            hash_.update(RE_PDF_VOLATIL.sub(b'', pendente) if pdf else pendente)
+            return hash_.hexdigest()
+        if not pdf:
+            hash_.update(pendente)
+            pendente = b''
+            continue
+        corte = len(pendente) - MARGEM_VOLATIL
+        trecho = next((m for m in RE_PDF_VOLATIL.finditer(pendente) if m.end() > corte), None)
+        if trecho is not None and trecho.start() < corte:
+            corte = trecho.end()
+        hash_.update(RE_PDF_VOLATIL.sub(b'', pendente[:corte]))
+        pendente = pendente[corte:]
+
+def chave_idempotencia(cliente, anexos, referencia):
+    """Chave que identifica o envio de um mesmo conjunto de documentos a um cliente
+    em uma referência (ex.: mês). Reenviar os mesmos documentos gera a mesma chave."""
+    documentos = sorted(_hash_documento(abrir_anexo(anexo)) for anexo in anexos)
+    base = "|".join([str(cliente or ''), str(referencia or '')] + documentos)
+    return hashlib.sha256(base.encode('utf-8')).hexdigest()
+
+def enfileirar_email(con, mensagem, usuario=None, chave=None):
+    """Grava a mensagem na fila dentro da conexão/transação `con`.
+    Com `chave`, um envio já existente não é duplicado: só volta para a fila se tiver
+    falhado definitivamente. Retorna {'id', 'status', 'enviado_em', 'novo'}."""
+    registro = con.execute(text("""
+        INSERT INTO email_outbox (destinatario, assunto, mensagem, usuario_lancamento, chave_idempotencia)
+        VALUES (:destinatario, :assunto, :mensagem, :usuario, :chave)
+        ON CONFLICT (chave_idempotencia) DO UPDATE
+            SET destinatario = EXCLUDED.destinatario, assunto = EXCLUDED.assunto, mensagem = EXCLUDED.mensagem,
+                usuario_lancamento = EXCLUDED.usuario_lancamento, status = 'Pendente', tentativas = 0,
+                proxima_tentativa = NOW(), ultimo_erro = NULL
+            WHERE email_outbox.status = 'Falhou'
+        RETURNING id, status, enviado_em
+    """), {
+        "destinatario": str(mensagem['To']),
+        "assunto": str(mensagem['Subject']),
+        "mensagem": mensagem.as_bytes(policy=politica_smtp),  # já com CRLF, pronta para o DATA
+        "usuario": usuario,
+        "chave": chave,
+    }).mappings().first()
+    if registro is not None:
+        return dict(registro, novo=True)
+
+    existente = con.execute(
+        text("SELECT id, status, enviado_em FROM email_outbox WHERE chave_idempotencia = :chave"),
+        {"chave": chave}
+    ).mappings().first()
+    return dict(existente, novo=False)
+
+# Reserva as mensagens vencidas. O "lease" de 10 minutos em proxima_tentativa devolve
+# à fila mensagens presas em 'Enviando' caso o processo caia no meio do envio.
+QUERY_RESERVAR = """
+    UPDATE email_outbox SET status = 'Enviando', proxima_tentativa = NOW() + INTERVAL '10 minutes'
+    WHERE id IN (
+        SELECT id FROM email_outbox
+        WHERE status IN ('Pendente', 'Enviando') AND proxima_tentativa <= NOW() {filtro_ids}
+        ORDER BY id
+        LIMIT :limite
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id, mensagem, tentativas
+"""
+
+def _registrar_sucesso(engine, id_email):
+    with engine.connect() as con:
+        con.execute(text("""
+            UPDATE email_outbox SET status = 'Enviado', enviado_em = NOW(), ultimo_erro = NULL,
+                   tentativas = tentativas + 1
+            WHERE id = :id
+        """), {"id": id_email})
+        con.commit()
+
+def _registrar_falha(engine, config, id_email, tentativas, erro):
+    tentativas += 1
+    definitiva = _erro_permanente(erro) or tentativas >= int(config['max_tentativas'])
+    atraso = min(float(config['backoff_base']) * 2 ** (tentativas - 1), float(config['backoff_max']))
+    with engine.connect() as con:
+        con.execute(text("""
+            UPDATE email_outbox SET status = :status, tentativas = :tentativas, ultimo_erro = :erro,
+                   proxima_tentativa = NOW() + make_interval(secs => :atraso)
+            WHERE id = :id
+        """), {
+            "status": 'Falhou' if definitiva else 'Pendente',
+            "tentativas": tentativas, "erro": str(erro)[:1000], "atraso": atraso, "id": id_email,
+        })
+        con.commit()
+    return definitiva
+
+def processar_fila(engine, config, ids=None, limite=50):
+    """Envia as mensagens vencidas da fila usando uma única sessão SMTP.
+    Com `ids`, processa só essas mensagens. Retorna um resumo com as contagens."""
+    filtro_ids = "AND id IN :ids" if ids else ""
+    params = {"limite": limite}
+    if ids:
+        params["ids"] = tuple(ids)
+    with engine.connect() as con:
+        reservadas = con.execute(text(QUERY_RESERVAR.format(filtro_ids=filtro_ids)), params).fetchall()
+        con.commit()
+
+    resumo = {'enviados': 0, 'reagendados': 0, 'falhas': 0}
+    with SessaoSMTP(config) as sessao:
+        for posicao, (id_email, mensagem, tentativas) in enumerate(reservadas):
+            try:
+                sessao.enviar(bytes(mensagem))
+                _registrar_sucesso(engine, id_email)
+                resumo['enviados'] += 1
+            except (smtplib.SMTPException, OSError) as e:
+                sessao.fechar()
+                if _registrar_falha(engine, config, id_email, tentativas, e):
+                    resumo['falhas'] += 1
+                else:
+                    resumo['reagendados'] += 1
+                if isinstance(e, smtplib.SMTPAuthenticationError):
+                    # Sem autenticação nada mais vai sair: devolve o restante para a fila
+                    for id_restante, _, tentativas_restante in reservadas[posicao + 1:]:
+                        _registrar_falha(engine, config, id_restante, tentativas_restante, e)
+                        resumo['reagendados'] += 1
+                    break
+    return resumo
+
+def status_emails(engine, ids):
+    """Situação atual das mensagens informadas (id, destinatario, status, tentativas, ultimo_erro, enviado_em)."""
+    with engine.connect() as con:
+        return con.execute(
+            text("SELECT id, destinatario, status, tentativas, ultimo_erro, enviado_em FROM email_outbox WHERE id IN :ids ORDER BY id"),
+            {"ids": tuple(ids)}
+        ).mappings().all()
+
+# --- ENVIO EM SEGUNDO PLANO ---
+class TrabalhadorCorreio(threading.Thread):
+    """Thread que esvazia a fila em segundo plano: a cada `intervalo` segundos
+    ou logo que for acordada por um novo enfileiramento."""
+
+    def __init__(self, url_conexao, config, intervalo=30):
+        super().__init__(name="trabalhador-correio", daemon=True)
+        self.engine = create_engine(url_conexao, pool_pre_ping=True)
+        self.config = config
+        self.intervalo = intervalo
+        self._evento = threading.Event()
+
+    def acordar(self):
+        self._evento.set()
+
+    def run(self):
+        while True:
+            try:
+                # Repete enquanto houver mensagens vencidas (lotes de até 50)
+                while sum(processar_fila(self.engine, self.config).values()):
+                    pass
+            except Exception:
+                logger.exception("Falha ao processar a fila de e-mails")
+            self._evento.wait(self.intervalo)
+            self._evento.clear()
+
+@st.cache_resource
+def trabalhador_correio(url_conexao, config):
+    """Um único trabalhador por processo, compartilhado por todas as páginas e sessões."""
+    trabalhador = TrabalhadorCorreio(url_conexao, config)
+    trabalhador.start()
+    return trabalhador
+
+def _resumo_partes(partes):
+    """Resultado de um envio dividido em várias mensagens, no formato de uma só."""
+    pendentes = [p for p in partes if p['status'] != 'Enviado']
+    return {
+        'id': partes[0]['id'],
+        'ids': [p['id'] for p in partes],
+        'status': pendentes[0]['status'] if pendentes else 'Enviado',
+        'enviado_em': None if pendentes else max(p['enviado_em'] for p in partes),
+        'novo': any(p['novo'] for p in partes),
+        'partes': len(partes),
+    }
+
+def enfileirar_envios(engine, credenciais, envios, usuario=None):
+    """Grava vários e-mails na fila em uma única transação e acorda o trabalhador uma vez.
+    `envios`: lista de dicts com destinatario, assunto, corpo, anexos, cliente e referencia.
+
+    Se os anexos passarem do limite por mensagem (`limite_anexos`), o envio é dividido em
+    mensagens numeradas ("parte 1/3"). Cada mensagem recebe a chave de idempotência
+    (cliente + documentos da parte + referência), calculada lendo os anexos do disco em blocos.
+    Cada mensagem é montada uma única vez (cada anexo é lido só enquanto é codificado) e
+    gravada antes da próxima, para que só uma mensagem fique em memória por vez.
+    Retorna, na mesma ordem, {'id', 'ids', 'status', 'enviado_em', 'novo', 'partes'}."""
+    config = config_smtp(credenciais)
+    # Divide antes de abrir a transação: um anexo grande demais não deixa nada pela metade
+    divisoes = [dividir_anexos(envio.get('anexos', ()), int(config['limite_anexos'])) for envio in envios]
+
+    resultados = []
+    with engine.connect() as con:
+        for envio, partes in zip(envios, divisoes):
+            resultados_partes = []
+            for numero, anexos in enumerate(partes, start=1):
+                assunto, corpo = envio['assunto'], envio['corpo']
+                if len(partes) > 1:
+                    assunto = f"{assunto} (parte {numero}/{len(partes)})"
+                    corpo = f"Devido ao tamanho dos anexos, este envio foi dividido em {len(partes)} emails. Esta é a parte {numero} de {len(partes)}.\n\n{corpo}"
+                chave = chave_idempotencia(envio.get('cliente') or envio['destinatario'], anexos, envio.get('referencia'))
+                mensagem = montar_mensagem(config['username'], envio['destinatario'], assunto, corpo, anexos)
+                resultados_partes.append(enfileirar_email(con, mensagem, usuario, chave))
+                del mensagem
+            resultados.append(_resumo_partes(resultados_partes))
+        con.commit()
+    trabalhador_correio(engine.url.render_as_string(hide_password=False), config).acordar()
+    return resultados
+
+def enfileirar_envio(engine, credenciais, destinatario, assunto, corpo, anexos=(), cliente=None, referencia=None, usuario=None):
+    """Atalho para as páginas: enfileira um único e-mail sem esperar o envio."""
+    envio = {
+        'destinatario': destinatario, 'assunto': assunto, 'corpo': corpo,
+        'anexos': anexos, 'cliente': cliente, 'referencia': referencia,
+    }
+    return enfileirar_envios(engine, credenciais, [envio], usuario)[0]
+
+# --- ACOMPANHAMENTO NA INTERFACE ---
+ROTULOS_STATUS = {
+    'Pendente': '⏳ Na fila',
+    'Enviando': '📤 Enviando',
+    'Enviado': '✅ Enviado',
+    'Falhou': '❌ Falhou',
+}
+
+def registrar_envio(envio, destinatario, avisar=True):
+    """Mostra o resultado do enfileiramento e passa a acompanhar o envio nesta sessão.
+    Com `avisar=False` (envios em lote) só acompanha, sem mensagens individuais."""
+    if avisar and envio['novo'] and envio.get('partes', 1) > 1:
+        st.toast(f"Anexos grandes: email para {destinatario} dividido em {envio['partes']} partes e colocado na fila de envio.", icon="📤")
+    elif avisar and envio['novo']:
+        st.toast(f"Email para {destinatario} colocado na fila de envio.", icon="📤")
+    elif avisar and envio['status'] == 'Enviado':
+        enviado_em = envio['enviado_em'].strftime('%d/%m/%Y %H:%M') if envio['enviado_em'] else ''
+        st.info(f"Estes documentos já foram enviados para {destinatario} em {enviado_em}. Nada foi reenviado.")
+    elif avisar:
+        st.info(f"Estes documentos já estão na fila de envio para {destinatario}.")
+
+    # Sem limite aqui: um lote grande (ex.: fechamento) é acompanhado por inteiro; só os
+    # envios já finalizados saem da lista (ver exibir_status_envios)
+    acompanhados = st.session_state.setdefault('envios_email', [])
+    for id_email in envio.get('ids', [envio['id']]):
+        if id_email not in acompanhados:
+            acompanhados.append(id_email)
+
+STATUS_EM_ANDAMENTO = ('Pendente', 'Enviando')
+LIMITE_FINALIZADOS = 20  # envios finalizados que continuam no painel (os mais recentes)
+
+def _painel_envios(envios):
+    with st.expander("📬 Envios de email desta sessão", expanded=True):
+        for envio in reversed(envios):
+            linha = f"{ROTULOS_STATUS.get(envio['status'], envio['status'])} — {envio['destinatario']}"
+            if envio['status'] == 'Enviado' and envio['enviado_em']:
+                linha += f" ({envio['enviado_em'].strftime('%d/%m %H:%M')})"
+            elif envio['ultimo_erro']:
+                linha += f" — tentativa {envio['tentativas']}: {envio['ultimo_erro']}"
+            st.caption(linha)
+
+@st.fragment(run_every=5)
+def _acompanhar_envios(engine, ids):
+    """Painel que se atualiza sozinho enquanto há e-mails na fila. Quando todos chegam a uma
+    situação final, a página é refeita e o painel passa a ser estático (para de consultar o banco)."""
+    envios = status_emails(engine, ids)
+    _painel_envios(envios)
+    if not any(envio['status'] in STATUS_EM_ANDAMENTO for envio in envios):
+        st.rerun()
+
+def exibir_status_envios(engine):
+    """Painel com a situação dos e-mails enviados nesta sessão; só atualiza sozinho
+    enquanto algum deles ainda está na fila ou sendo enviado."""
+    ids = st.session_state.get('envios_email')
+    if not ids:
+        return
+    envios = status_emails(engine, ids)
+    # Os que estão em andamento ficam sempre; dos finalizados, só os mais recentes
+    finalizados = [envio['id'] for envio in envios if envio['status'] not in STATUS_EM_ANDAMENTO]
+    descartados = set(finalizados[:-LIMITE_FINALIZADOS])
+    if descartados:
+        ids = st.session_state['envios_email'] = [id_email for id_email in ids if id_email not in descartados]
+        envios = [envio for envio in envios if envio['id'] not in descartados]
+    if any(envio['status'] in STATUS_EM_ANDAMENTO for envio in envios):
+        _acompanhar_envios(engine, list(ids))
+    else:
+        _painel_envios(envios)
@@ -0,0 +1,217 @@
+# documentos_fiscais.py
+# Leitura de boletos e notas fiscais (PDF/XML) e identificação automática do cliente (CNPJ ou nome).
+import calendar
+import io
+import re
+import unicodedata
+import xml.etree.ElementTree as ET
+from datetime import date
+
+from pypdf import PdfReader
+
+from processos import mapear
+
+CNPJ_EMPRESA = "61159425000132"  # Elite CNC Service (beneficiário): nunca é o pagador
+
+RE_CNPJ = re.compile(r'\b\d{2}\.?\d{3}\.?\d{3}/?\d{4}-?\d{2}\b')
+RE_VALOR = re.compile(r'\d{1,3}(?:\.\d{3})*,\d{2}')
+RE_VALOR_DOCUMENTO = re.compile(r'valor\s+(?:do\s+)?documento[^\d]{0,40}(\d{1,3}(?:\.\d{3})*,\d{2})', re.IGNORECASE)
+RE_VENCIMENTO = re.compile(r'vencimento[^\d]{0,40}(\d{2}/\d{2}/\d{4})', re.IGNORECASE)
+RE_PAGADOR = re.compile(r'(?:pagador|sacado)\s*:?\s*(.+)', re.IGNORECASE)
+
+RE_NUMERO_NF = re.compile(
+    r'(?:n[úu]mero\s+da\s+(?:nfs-?e|nota)|nfs-?e\s*n[º°o.]*|nota\s+fiscal\s*(?:eletr[ôo]nica\s*)?n[º°o.]*)\D{0,20}(\d+)',
+    re.IGNORECASE
+)
+RE_TOTAL_NF = re.compile(
+    r'(?:valor\s+total\s+da\s+nota|valor\s+l[íi]quido(?:\s+da\s+nfs-?e)?|valor\s+total|valor\s+dos\s+servi[çc]os)[^\d]{0,40}(\d{1,3}(?:\.\d{3})*,\d{2})',
+    re.IGNORECASE
+)
+RE_NOME_TOMADOR = re.compile(r'(?:raz[ãa]o\s+social|nome)\s*(?:/\s*nome)?\s*:?\s*(.+)', re.IGNORECASE)
+
+SUFIXOS_EMPRESA = {'LTDA', 'ME', 'EPP', 'EIRELI', 'SA', 'S', 'A', 'CIA', 'MEI'}
+MESES = {
+    'JANEIRO': 1, 'FEVEREIRO': 2, 'MARCO': 3, 'ABRIL': 4, 'MAIO': 5, 'JUNHO': 6,
+    'JULHO': 7, 'AGOSTO': 8, 'SETEMBRO': 9, 'OUTUBRO': 10, 'NOVEMBRO': 11, 'DEZEMBRO': 12,
+}
+
+# --- UTILITÁRIOS ---
+def so_digitos(texto):
+    return re.sub(r'\D', '', str(texto or ''))
+
+def normalizar_nome(nome):
+    """Nome sem acentos, pontuação e sufixos societários (LTDA, ME, S/A...), em maiúsculas."""
+    texto = unicodedata.normalize('NFKD', str(nome or '')).encode('ascii', 'ignore').decode('ascii')
+    palavras = re.sub(r'[^A-Za-z0-9]+', ' ', texto).upper().split()
+    return ' '.join(p for p in palavras if p not in SUFIXOS_EMPRESA)
+
+def valor_brasileiro(texto):
+    """'1.234,56' -> 1234.56"""
+    return float(texto.replace('.', '').replace(',', '.'))
+
+def periodo_referencia(texto):
+    """'Janeiro/2024', 'janeiro 2024' ou '01/2024' -> (primeiro dia, último dia) do mês.
+    Retorna None se o texto não for reconhecido."""
+    partes = normalizar_nome(texto).split()
+    if len(partes) != 2 or not partes[1].isdigit():
+        return None
+    mes = int(partes[0]) if partes[0].isdigit() else MESES.get(partes[0])
+    ano = int(partes[1])
+    if not mes or not 1 <= mes <= 12:
+        return None
+    return date(ano, mes, 1), date(ano, mes, calendar.monthrange(ano, mes)[1])
+
+def _em_paralelo(funcao, arquivos):
+    if not arquivos:
+        return []
+    # A extração do pypdf é Python puro; o pool compartilhado (processos.py) evita a disputa pelo GIL.
+    return list(mapear(funcao, arquivos))
+
+def _cnpj_cliente(cnpjs):
+    """Primeiro CNPJ que não é o da própria empresa."""
+    return next((c for c in (so_digitos(c) for c in cnpjs) if c != CNPJ_EMPRESA), None)
+
+def extrair_texto_pdf(dados):
+    leitor = PdfReader(io.BytesIO(dados))
+    return "\n".join(pagina.extract_text() or '' for pagina in leitor.pages)
+
+# --- BOLETOS ---
+def analisar_boleto(tarefa):
+    """Extrai CNPJ e nome do pagador, valor e vencimento de um boleto em PDF.
+    Recebe (nome_arquivo, dados) para poder rodar em um pool de processos."""
+    nome_arquivo, dados = tarefa
+    resultado = {'arquivo': nome_arquivo, 'cnpj': None, 'pagador': None, 'valor': None, 'vencimento': None, 'erro': None}
+    try:
+        texto = extrair_texto_pdf(dados)
+    except Exception as e:
+        resultado['erro'] = f"PDF ilegível: {e}"
+        return resultado
+
+    resultado['cnpj'] = _cnpj_cliente(RE_CNPJ.findall(texto))
+
+    pagador = RE_PAGADOR.search(texto)
+    if pagador:
+        # O nome vem antes do CPF/CNPJ na mesma linha
+        nome = re.split(r'CPF|CNPJ|\d{2}\.\d{3}\.\d{3}', pagador.group(1), flags=re.IGNORECASE)[0]
+        resultado['pagador'] = nome.strip(' -:') or None
+
+    valor = RE_VALOR_DOCUMENTO.search(texto)
+    if valor:
+        resultado['valor'] = valor_brasileiro(valor.group(1))
+    else:
+        valores = [valor_brasileiro(v) for v in RE_VALOR.findall(texto)]
+        resultado['valor'] = max(valores) if valores else None
+
+    vencimento = RE_VENCIMENTO.search(texto)
+    if vencimento:
+        resultado['vencimento'] = vencimento.group(1)
+    return resultado
+
+def analisar_boletos(arquivos):
+    """Analisa vários boletos em paralelo. `arquivos`: lista de (nome_arquivo, dados).
+    Retorna os resultados na mesma ordem."""
+    return _em_paralelo(analisar_boleto, arquivos)
+
+# --- NOTAS FISCAIS ---
+# Tags procuradas no XML, em ordem de preferência (NF-e modelo 55 e NFS-e padrão ABRASF)
+TAGS_NUMERO_NF = ('nNF', 'NumeroNfse', 'Numero')
+TAGS_TOTAL_NF = ('vNF', 'ValorLiquidoNfse', 'ValorServicos', 'vServ')
+TAGS_TOMADOR = ('dest', 'TomadorServico', 'Tomador', 'tomador')
+
+def _nome_local(tag):
+    return tag.rsplit('}', 1)[-1]
+
+def _primeiro_texto(elemento, nomes):
+    """Texto do primeiro descendente cujo nome (sem namespace) esteja em `nomes`, por ordem de preferência."""
+    encontrados = {}
+    for filho in elemento.iter():
+        nome = _nome_local(filho.tag)
+        if nome in nomes and nome not in encontrados and (filho.text or '').strip():
+            encontrados[nome] = filho.text.strip()
+    return next((encontrados[n] for n in nomes if n in encontrados), None)
+
+def _analisar_xml_nf(dados, resultado):
+    raiz = ET.fromstring(dados)
+    resultado['numero'] = _primeiro_texto(raiz, TAGS_NUMERO_NF)
+    total = _primeiro_texto(raiz, TAGS_TOTAL_NF)
+    resultado['valor'] = float(total) if total else None
+
+    tomador = next((e for e in raiz.iter() if _nome_local(e.tag) in TAGS_TOMADOR), None)
+    if tomador is not None:
+        resultado['cnpj'] = so_digitos(_primeiro_texto(tomador, ('CNPJ', 'Cnpj', 'CPF', 'Cpf'))) or None
+        resultado['tomador'] = _primeiro_texto(tomador, ('xNome', 'RazaoSocial', 'Nome'))
+    if not resultado['cnpj']:
+        cnpjs = [e.text for e in raiz.iter() if _nome_local(e.tag) in ('CNPJ', 'Cnpj') and e.text]
+        resultado['cnpj'] = _cnpj_cliente(cnpjs)
+
+def _analisar_pdf_nf(dados, resultado):
+    texto = extrair_texto_pdf(dados)
+    numero = RE_NUMERO_NF.search(texto)
+    resultado['numero'] = numero.group(1) if numero else None
+
+    # Os dados do cliente ficam no quadro do tomador; sem ele, usa o texto todo
+    posicao_tomador = re.search(r'tomador', texto, re.IGNORECASE)
+    trecho_tomador = texto[posicao_tomador.start():] if posicao_tomador else texto
+    resultado['cnpj'] = _cnpj_cliente(RE_CNPJ.findall(trecho_tomador)) or _cnpj_cliente(RE_CNPJ.findall(texto))
+    nome = RE_NOME_TOMADOR.search(trecho_tomador) if posicao_tomador else None
+    if nome:
+        resultado['tomador'] = re.split(r'CPF|CNPJ|\d{2}\.\d{3}\.\d{3}', nome.group(1), flags=re.IGNORECASE)[0].strip(' -:') or None
+
+    total = RE_TOTAL_NF.search(texto)
+    if total:
+        resultado['valor'] = valor_brasileiro(total.group(1))
+    else:
+        valores = [valor_brasileiro(v) for v in RE_VALOR.findall(texto)]
+        resultado['valor'] = max(valores) if valores else None
+
+def analisar_nota_fiscal(tarefa):
+    """Extrai número, CNPJ/nome do tomador e valor total de uma NF em PDF ou XML.
+    Recebe (nome_arquivo, dados) para poder rodar em um pool de processos."""
+    nome_arquivo, dados = tarefa
+    resultado = {'arquivo': nome_arquivo, 'numero': None, 'cnpj': None, 'tomador': None, 'valor': None, 'erro': None}
+    try:
+        if nome_arquivo.lower().endswith('.xml') or dados.lstrip()[:1] == b'<':
+            _analisar_xml_nf(dados, resultado)
+        else:
+            _analisar_pdf_nf(dados, resultado)
+    except Exception as e:
+        resultado['erro'] = f"Arquivo ilegível: {e}"
+    return resultado
+
+def analisar_notas_fiscais(arquivos):
+    """Analisa várias NFs (PDF ou XML) em paralelo. `arquivos`: lista de (nome_arquivo, dados)."""
+    return _em_paralelo(analisar_nota_fiscal, arquivos)
+
+# --- IDENTIFICAÇÃO DO CLIENTE ---
+class IndiceClientes:
+    """Índice em memória dos clientes por CNPJ (só dígitos) e por nome normalizado."""
+
+    def __init__(self, df_clientes):
+        self.por_cnpj = {}
+        self.por_nome = {}
+        for cliente in df_clientes.to_dict('records'):
+            cnpj = so_digitos(cliente.get('cnpj'))
+            if cnpj:
+                self.por_cnpj[cnpj] = cliente
+            nome = normalizar_nome(cliente.get('nome'))
+            if nome:
+                self.por_nome[nome] = cliente
+
+    def encontrar(self, cnpj=None, nome=None):
+        """Retorna (cliente, critério) ou (None, None).
+        Ordem: CNPJ exato, nome exato, nome do cadastro contido no nome lido (o mais longo)."""
+        cnpj = so_digitos(cnpj)
+        if cnpj and cnpj in self.por_cnpj:
+            return self.por_cnpj[cnpj], 'CNPJ'
+        nome = normalizar_nome(nome)
+        if not nome:
+            return None, None
+        if nome in self.por_nome:
+            return self.por_nome[nome], 'Nome'
+        candidatos = [
+            n for n in self.por_nome
+            if f" {n} " in f" {nome} " or (len(nome) >= 5 and f" {nome} " in f" {n} ")
+        ]
+        if candidatos:
+            return self.por_nome[max(candidatos, key=len)], 'Nome aproximado'
+        return None, None
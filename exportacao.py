@@ -0,0 +1,155 @@
+# exportacao.py
+# Exportação para Excel em modo streaming (openpyxl write_only): linhas escritas em lotes, direto do cursor do banco.
+import math
+from datetime import date, datetime
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from openpyxl.utils import get_column_letter
+from sqlalchemy import text
+
+from pacote_zip import ArquivoSpool
+
+MIME_EXCEL = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+TAMANHO_LOTE = 5000  # linhas buscadas por vez do cursor do servidor
+
+FORMATOS = {
+    'texto': None,
+    'numero': '#,##0.00',
+    'inteiro': '0',
+    'moeda': '"R$" #,##0.00',
+    'data': 'DD/MM/YYYY',
+    'data_hora': 'DD/MM/YYYY HH:MM',
+}
+LARGURAS_PADRAO = {'texto': 30, 'numero': 14, 'inteiro': 10, 'moeda': 16, 'data': 12, 'data_hora': 17}
+
+def coluna_excel(campo, titulo=None, tipo='texto', largura=None):
+    """Define uma coluna da planilha: `campo` é o nome da coluna na consulta/DataFrame."""
+    return {
+        'campo': campo,
+        'titulo': titulo or campo,
+        'tipo': tipo,
+        'largura': largura or LARGURAS_PADRAO[tipo],
+    }
+
+def colunas_dataframe(df, moeda=(), titulos=None):
+    """Colunas de todas as colunas de `df`, com o tipo deduzido do dtype.
+    As colunas listadas em `moeda` saem no formato de moeda; `titulos` renomeia no cabeçalho."""
+    titulos = titulos or {}
+    colunas = []
+    for campo, dtype in df.dtypes.items():
+        if campo in moeda:
+            tipo = 'moeda'
+        elif pd.api.types.is_datetime64_any_dtype(dtype):
+            tipo = 'data_hora'
+        elif pd.api.types.is_bool_dtype(dtype):
+            tipo = 'texto'
+        elif pd.api.types.is_integer_dtype(dtype):
+            tipo = 'inteiro'
+        elif pd.api.types.is_float_dtype(dtype):
+            tipo = 'numero'
+        else:
+            tipo = 'texto'
+        colunas.append(coluna_excel(campo, titulos.get(campo), tipo))
+    return colunas
+
+# --- FONTES DE LINHAS ---
+def linhas_consulta(engine, query, params=None, tamanho_lote=TAMANHO_LOTE):
+    """Gera as linhas (dicts) de uma consulta com cursor no servidor, `tamanho_lote` por vez,
+    sem carregar o resultado inteiro na memória."""
+    with engine.connect() as con:
+        resultado = con.execution_options(stream_results=True, yield_per=tamanho_lote).execute(text(query), params or {})
+        for linha in resultado.mappings():
+            yield linha
+
+def linhas_dataframe(df):
+    """Gera as linhas (dicts) de um DataFrame já carregado."""
+    colunas = list(df.columns)
+    for valores in df.itertuples(index=False, name=None):
+        yield dict(zip(colunas, valores))
+
+def _valor_celula(valor, tipo):
+    """Converte para um tipo nativo aceito pelo openpyxl (sem NaN/NaT, numpy ou fuso horário)."""
+    if valor is None or valor is pd.NaT:
+        return None
+    if isinstance(valor, np.generic):
+        valor = valor.item()
+    if isinstance(valor, float) and math.isnan(valor):
+        return None
+    if isinstance(valor, pd.Timestamp):
+        valor = valor.to_pydatetime()
+    if isinstance(valor, datetime):
+        valor = valor.replace(tzinfo=None)
+        return valor.date() if tipo == 'data' else valor
+    if isinstance(valor, (int, float, Decimal, date)):
+        return valor
+    return str(valor)
+
+# --- ESCRITA ---
+def escrever_planilha(destino, abas):
+    """Escreve a planilha em `destino` (arquivo ou objeto com write).
+    `abas`: lista de dicts {'nome', 'colunas' (coluna_excel), 'linhas' (iterável de dicts)}.
+    As linhas são consumidas uma a uma; só o XML da aba (compactado no fim) passa pelo disco."""
+    livro = Workbook(write_only=True)
+    for aba in abas:
+        planilha = livro.create_sheet(title=aba['nome'][:31])
+        colunas = aba['colunas']
+        # Largura e congelamento precisam ser definidos antes da primeira linha no modo write_only
+        for indice, col in enumerate(colunas, start=1):
+            planilha.column_dimensions[get_column_letter(indice)].width = col['largura']
+        planilha.freeze_panes = 'A2'
+
+        negrito = Font(bold=True)
+        cabecalho = []
+        for col in colunas:
+            celula = WriteOnlyCell(planilha, value=col['titulo'])
+            celula.font = negrito
+            cabecalho.append(celula)
+        planilha.append(cabecalho)
+
+        formatos = [(col['campo'], col['tipo'], FORMATOS[col['tipo']]) for col in colunas]
+        for linha in aba['linhas']:
+            valores = []
+            for campo, tipo, formato in formatos:
+                valor = _valor_celula(linha.get(campo), tipo)
+                if formato and valor is not None:
+                    celula = WriteOnlyCell(planilha, value=valor)
+                    celula.number_format = formato
+                    valores.append(celula)
+                else:
+                    valores.append(valor)
+            planilha.append(valores)
+    livro.save(destino)
+
+def gerar_planilha(abas):
+    """Gera a planilha e retorna os bytes. O arquivo é montado em um ArquivoSpool, que vai
+    para o disco quando passa do limite de memória."""
+    arquivo = ArquivoSpool("exportacao.xlsx")
+    try:
+        escrever_planilha(arquivo.arquivo, abas)
+        return arquivo.ler()
+    finally:
+        arquivo.descartar()
+
+@st.cache_data(ttl=300, max_entries=20, show_spinner="Gerando planilha...")
+def exportar_consultas(_engine, abas):
+    """Planilha com uma aba por consulta, lida do banco em lotes.
+    `abas`: lista de dicts {'nome', 'colunas', 'query', 'params'}. O cache é pela própria
+    definição (SQL + parâmetros + colunas), então a mesma exportação não é refeita."""
+    return gerar_planilha([
+        {'nome': aba['nome'], 'colunas': aba['colunas'], 'linhas': linhas_consulta(_engine, aba['query'], aba.get('params'))}
+        for aba in abas
+    ])
+
+def exportar_dataframes(abas):
+    """Planilha a partir de DataFrames já filtrados na página.
+    `abas`: lista de dicts {'nome', 'colunas', 'df'}."""
+    return gerar_planilha([
+        {'nome': aba['nome'], 'colunas': aba['colunas'], 'linhas': linhas_dataframe(aba['df'])}
+        for aba in abas
+    ])
@@ -0,0 +1,159 @@
+# fluxo_caixa.py
+# Movimentos do fluxo de caixa em uma consulta (UNION ALL): realizado pela data de pagamento, previsto pelo vencimento.
+from datetime import timedelta
+
+import pandas as pd
+import streamlit as st
+from sqlalchemy import text
+
+# Agrupamentos da tela -> unidade do date_trunc
+UNIDADES = {'Dia': 'day', 'Semana': 'week', 'Mês': 'month'}
+
+def _movimentos(incluir_pendentes):
+    """Subconsulta com os movimentos de :inicio a :fim (exclusivo), saídas com valor negativo.
+    Cada parte filtra pela própria coluna de data, para usar os índices (status, data_pagamento) e (status, data)."""
+    partes = [
+        """SELECT data_pagamento AS data, 'Entrada' AS tipo, id, descricao_servico AS descricao, cliente AS categoria,
+                  'Pago' AS status_pagamento, valor_atendimento AS valor
+           FROM entradas WHERE status = 'Pago' AND data_pagamento >= :inicio AND data_pagamento < :fim""",
+        """SELECT data_pagamento, 'Saída', id, descricao, tipo_conta, 'Pago', -valor
+           FROM saidas WHERE status = 'Pago' AND data_pagamento >= :inicio AND data_pagamento < :fim""",
+    ]
+    if incluir_pendentes:
+        partes += [
+            """SELECT data, 'Entrada', id, descricao_servico, cliente, 'Previsto', valor_atendimento
+               FROM entradas WHERE status = 'Pendente' AND data >= :inicio AND data < :fim""",
+            """SELECT data, 'Saída', id, descricao, tipo_conta, 'Previsto', -valor
+               FROM saidas WHERE status = 'Pendente' AND data >= :inicio AND data < :fim""",
+        ]
+    return "\n            UNION ALL\n            ".join(partes)
+
+def _params(inicio, fim):
+    return {"inicio": pd.Timestamp(inicio), "fim": pd.Timestamp(fim + timedelta(days=1))}
+
+@st.cache_data(ttl=300)
+def periodo_fluxo(_engine, incluir_pendentes):
+    """Primeira e última data com movimento (date), ou (None, None) se não houver nenhum.
+    MIN/MAX por status saem direto dos índices, sem ler o histórico."""
+    partes = [
+        "SELECT MIN(data_pagamento) AS primeira, MAX(data_pagamento) AS ultima FROM entradas WHERE status = 'Pago'",
+        "SELECT MIN(data_pagamento), MAX(data_pagamento) FROM saidas WHERE status = 'Pago'",
+    ]
+    if incluir_pendentes:
+        partes += [
+            "SELECT MIN(data), MAX(data) FROM entradas WHERE status = 'Pendente'",
+            "SELECT MIN(data), MAX(data) FROM saidas WHERE status = 'Pendente'",
+        ]
+    query = f"SELECT MIN(primeira), MAX(ultima) FROM ({' UNION ALL '.join(partes)}) AS limites"
+    with _engine.connect() as con:
+        primeira, ultima = con.execute(text(query)).one()
+    if primeira is None:
+        return None, None
+    return primeira.date(), ultima.date()
+
+def consulta_extrato(incluir_pendentes, inicio, fim, saldo_inicial=0.0):
+    """Consulta dos movimentos do período (datas inclusivas) em ordem, com o saldo após cada um
+    calculado no banco (saldo inicial + SUM ... OVER). Usada pela tabela e pela exportação."""
+    query = f"""
+        SELECT
+            data, tipo, descricao, categoria, status_pagamento, valor,
+            :saldo_inicial + SUM(valor) OVER (ORDER BY data, tipo, id ROWS UNBOUNDED PRECEDING) AS saldo_acumulado
+        FROM (
+            {_movimentos(incluir_pendentes)}
+        ) AS movimentos
+        ORDER BY data, tipo, id
+    """
+    return {'query': query, 'params': {**_params(inicio, fim), "saldo_inicial": float(saldo_inicial)}}
+
+@st.cache_data(ttl=300)
+def extrato_fluxo(_engine, incluir_pendentes, inicio, fim, saldo_inicial=0.0):
+    """Linhas do extrato (ver consulta_extrato). Só para a visão 'Detalhado' e a tabela do extrato."""
+    consulta = consulta_extrato(incluir_pendentes, inicio, fim, saldo_inicial)
+    df = pd.read_sql_query(text(consulta['query']), _engine, params=consulta['params'], parse_dates=['data'])
+    df[['valor', 'saldo_acumulado']] = df[['valor', 'saldo_acumulado']].astype(float)
+    return df
+
+@st.cache_data(ttl=300)
+def resumo_fluxo(_engine, incluir_pendentes, inicio, fim, saldo_inicial=0.0):
+    """Totais do período em uma linha: quantidade, entradas, saídas (negativo), o menor saldo
+    após um movimento e a data em que o saldo fica negativo pela primeira vez (ou None)."""
+    query = f"""
+        WITH acumulado AS (
+            SELECT
+                data, tipo, valor,
+                :saldo_inicial + SUM(valor) OVER (ORDER BY data, tipo, id ROWS UNBOUNDED PRECEDING) AS saldo
+            FROM (
+                {_movimentos(incluir_pendentes)}
+            ) AS movimentos
+        )
+        SELECT
+            COUNT(*) AS quantidade,
+            COALESCE(SUM(valor) FILTER (WHERE tipo = 'Entrada'), 0) AS entradas,
+            COALESCE(SUM(valor) FILTER (WHERE tipo = 'Saída'), 0) AS saidas,
+            MIN(saldo) AS menor_saldo,
+            MIN(data) FILTER (WHERE saldo < 0) AS primeira_data_negativa
+        FROM acumulado
+    """
+    params = {**_params(inicio, fim), "saldo_inicial": float(saldo_inicial)}
+    with _engine.connect() as con:
+        linha = con.execute(text(query), params).mappings().one()
+    return {
+        'quantidade': linha['quantidade'],
+        'entradas': float(linha['entradas']),
+        'saidas': float(linha['saidas']),
+        'menor_saldo': float(linha['menor_saldo']) if linha['menor_saldo'] is not None else None,
+        'primeira_data_negativa': linha['primeira_data_negativa'],
+    }
+
+@st.cache_data(ttl=300)
+def composicao_fluxo(_engine, incluir_pendentes, inicio, fim):
+    """Receitas (valor > 0) e despesas (valor < 0, em módulo) somadas por categoria no banco.
+    Colunas: lado ('Receita' ou 'Despesa'), categoria e valor."""
+    query = f"""
+        SELECT
+            CASE WHEN valor > 0 THEN 'Receita' ELSE 'Despesa' END AS lado,
+            categoria,
+            SUM(ABS(valor)) AS valor
+        FROM (
+            {_movimentos(incluir_pendentes)}
+        ) AS movimentos
+        WHERE valor <> 0
+        GROUP BY 1, 2
+        ORDER BY valor DESC
+    """
+    df = pd.read_sql_query(text(query), _engine, params=_params(inicio, fim))
+    df['valor'] = df['valor'].astype(float)
+    return df
+
+@st.cache_data(ttl=300)
+def maiores_despesas(_engine, incluir_pendentes, inicio, fim, n=5):
+    """As `n` maiores despesas do período somadas por descrição (colunas descricao e valor)."""
+    query = f"""
+        SELECT descricao, SUM(-valor) AS valor
+        FROM (
+            {_movimentos(incluir_pendentes)}
+        ) AS movimentos
+        WHERE valor < 0
+        GROUP BY descricao
+        ORDER BY valor DESC
+        LIMIT :n
+    """
+    df = pd.read_sql_query(text(query), _engine, params={**_params(inicio, fim), "n": int(n)})
+    df['valor'] = df['valor'].astype(float)
+    return df
+
+@st.cache_data(ttl=300)
+def fluxo_agrupado(_engine, incluir_pendentes, inicio, fim, agrupamento):
+    """Movimento líquido (coluna valor) por Dia, Semana (começando na segunda) ou Mês, agrupado com date_trunc."""
+    unidade = UNIDADES[agrupamento]
+    query = f"""
+        SELECT date_trunc('{unidade}', data) AS data, SUM(valor) AS valor
+        FROM (
+            {_movimentos(incluir_pendentes)}
+        ) AS movimentos
+        GROUP BY 1
+        ORDER BY 1
+    """
+    df = pd.read_sql_query(text(query), _engine, params=_params(inicio, fim), parse_dates=['data'])
+    df['valor'] = df['valor'].astype(float)
+    return df
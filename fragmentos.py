@@ -0,0 +1,28 @@
+# fragmentos.py
+# Fragmentos (st.fragment) que registram no log o tempo de cada renderização.
+import functools
+import time
+
+import streamlit as st
+from streamlit.logger import get_logger
+
+# Logger configurado pelo Streamlit (nível de `logger.level`, INFO por padrão, e handler próprio):
+# um logging.getLogger comum herdaria o WARNING do root e descartaria as medições.
+logger = get_logger(__name__)
+
+def fragmento(nome):
+    """Decorador: transforma a função em um st.fragment (reexecutado sozinho quando um widget
+    dele muda) e registra em INFO quanto tempo cada renderização levou, com o `nome` dado.
+
+    Os dados de que o fragmento depende devem vir como argumentos: numa reexecução só do
+    fragmento, o Streamlit reaproveita os argumentos da última execução completa da página."""
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def cronometrado(*args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                return funcao(*args, **kwargs)
+            finally:
+                logger.info("Fragmento '%s' renderizado em %.1f ms", nome, (time.perf_counter() - inicio) * 1000)
+        return st.fragment(cronometrado)
+    return decorador
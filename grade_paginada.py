@@ -0,0 +1,123 @@
+# grade_paginada.py
+# Grade de registros paginada no banco (keyset em (ordenação, id)), com busca e ordenação no servidor.
+import numpy as np
+import pandas as pd
+import streamlit as st
+from sqlalchemy import text
+
+TAMANHO_PAGINA_PADRAO = 50
+# Ordenação por data sem nulos: na comparação de cursor uma data nula daria NULL e encerraria a
+# paginação. A data mínima volta do psycopg2 como datetime(1, 1, 1) e faz o caminho de volta intacta.
+ORDEM_DATA = "COALESCE(data, TIMESTAMP '0001-01-01')"
+
+def _montar_filtros(colunas_busca, busca):
+    """Cláusula de busca (ILIKE em qualquer das colunas) e seus parâmetros."""
+    if not busca or not colunas_busca:
+        return "TRUE", {}
+    condicoes = " OR ".join(f"CAST({col} AS TEXT) ILIKE :busca" for col in colunas_busca)
+    return f"({condicoes})", {"busca": f"%{busca.strip()}%"}
+
+def buscar_pagina(engine, consulta, ordem, descendente=True, cursor=None, busca=None,
+                  colunas_busca=(), tamanho_pagina=TAMANHO_PAGINA_PADRAO, params=None):
+    """Busca uma página de `consulta` (um SELECT que tenha a coluna `id`).
+
+    `ordem`: expressão SQL de ordenação (não nula), sempre desempatada pelo id.
+    `cursor`: (valor da ordem, id) do último registro da página anterior; None na primeira.
+    Retorna (DataFrame da página, cursor da próxima página ou None se for a última)."""
+    filtro_busca, params_busca = _montar_filtros(colunas_busca, busca)
+    comparacao = "<" if descendente else ">"
+    direcao = "DESC" if descendente else "ASC"
+    filtro_cursor = f"({ordem}, id) {comparacao} (:cursor_ordem, :cursor_id)" if cursor else "TRUE"
+
+    query = f"""
+        SELECT base.*, {ordem} AS _ordem
+        FROM ({consulta}) AS base
+        WHERE {filtro_busca} AND {filtro_cursor}
+        ORDER BY {ordem} {direcao}, id {direcao}
+        LIMIT :limite
+    """
+    parametros = dict(params or {}, **params_busca, limite=tamanho_pagina + 1)
+    if cursor:
+        parametros.update(cursor_ordem=cursor[0], cursor_id=cursor[1])
+    pagina = pd.read_sql_query(text(query), engine, params=parametros)
+
+    # Um registro a mais indica que existe próxima página
+    proximo = None
+    if len(pagina) > tamanho_pagina:
+        pagina = pagina.iloc[:tamanho_pagina]
+        ultimo = pagina.iloc[-1]
+        valor_ordem = ultimo['_ordem']
+        if isinstance(valor_ordem, np.generic):  # o psycopg2 não adapta tipos do numpy
+            valor_ordem = valor_ordem.item()
+        proximo = (valor_ordem, int(ultimo['id']))
+    return pagina.drop(columns=['_ordem']), proximo
+
+@st.cache_data(ttl=60)
+def contar_registros(_engine, consulta, busca=None, colunas_busca=(), params=None):
+    """Total de registros da consulta com a busca. Em cache por consulta, busca e parâmetros:
+    trocar de página ou de ordenação não repete o COUNT(*) (a gravação limpa o cache)."""
+    filtro_busca, params_busca = _montar_filtros(colunas_busca, busca)
+    query = f"SELECT COUNT(*) FROM ({consulta}) AS base WHERE {filtro_busca}"
+    with _engine.connect() as con:
+        return con.execute(text(query), dict(params or {}, **params_busca)).scalar()
+
+def estado_paginas(chave, assinatura):
+    """Pilha de cursores (início de cada página visitada) guardada no session_state em `chave`.
+    Recomeça na primeira página quando a `assinatura` (consulta, filtros, busca, ordem) muda."""
+    estado = st.session_state.get(chave)
+    if not estado or estado['assinatura'] != assinatura:
+        estado = {'assinatura': assinatura, 'cursores': [None]}
+        st.session_state[chave] = estado
+    return estado
+
+def navegacao_paginas(chave, estado, proximo, total, tamanho_pagina=TAMANHO_PAGINA_PADRAO):
+    """Botões Anterior/Próxima e a posição atual. Os botões só mexem na pilha de cursores
+    (callbacks): o clique já reexecuta quem desenhou a página."""
+    numero_pagina = len(estado['cursores'])
+    total_paginas = max(1, -(-int(total) // tamanho_pagina))
+    col_anterior, col_info, col_proxima = st.columns([1, 3, 1])
+    col_anterior.button(
+        "⬅️ Anterior", key=f"{chave}_anterior", disabled=numero_pagina == 1, use_container_width=True,
+        on_click=estado['cursores'].pop
+    )
+    col_info.caption(f"Página {numero_pagina} de {total_paginas} · {total} registro(s)")
+    col_proxima.button(
+        "Próxima ➡️", key=f"{chave}_proxima", disabled=proximo is None, use_container_width=True,
+        on_click=estado['cursores'].append, args=(proximo,)
+    )
+
+@st.fragment
+def grade_paginada(engine, chave, consulta, colunas_busca=(), ordenacoes=None, column_config=None,
+                   tamanho_pagina=TAMANHO_PAGINA_PADRAO, params=None, colunas_datas=('data',)):
+    """Exibe `consulta` em uma grade paginada no banco. Só a página visível é buscada e enviada
+    ao navegador; mudar de página, de ordenação ou a busca reexecuta apenas a grade.
+
+    `chave`: identificador único da grade na página (guarda a posição no session_state).
+    `ordenacoes`: {rótulo: expressão SQL não nula}; o padrão é {'Data': ORDEM_DATA}.
+    `params`: parâmetros usados dentro de `consulta` (ex.: filtros da página)."""
+    ordenacoes = ordenacoes or {'Data': ORDEM_DATA}
+
+    col_busca, col_ordem, col_direcao = st.columns([3, 1, 1])
+    busca = col_busca.text_input("🔎 Buscar", key=f"{chave}_busca", placeholder="Digite parte de um texto para filtrar")
+    rotulo_ordem = col_ordem.selectbox("Ordenar por", options=list(ordenacoes), key=f"{chave}_ordem")
+    descendente = col_direcao.selectbox("Sentido", options=["Decrescente", "Crescente"], key=f"{chave}_direcao") == "Decrescente"
+
+    # A pilha de cursores recomeça se a busca, a ordem ou os filtros mudarem
+    assinatura = (consulta, tuple(sorted((params or {}).items())), busca, rotulo_ordem, descendente)
+    estado = estado_paginas(f"{chave}_paginas", assinatura)
+
+    try:
+        pagina, proximo = buscar_pagina(
+            engine, consulta, ordenacoes[rotulo_ordem], descendente, estado['cursores'][-1],
+            busca, colunas_busca, tamanho_pagina, params
+        )
+        total = contar_registros(engine, consulta, busca, colunas_busca, params)
+    except Exception as e:
+        st.error(f"Erro ao carregar os registros: {e}")
+        return
+
+    for coluna in colunas_datas:
+        if coluna in pagina.columns:
+            pagina[coluna] = pd.to_datetime(pagina[coluna])
+    st.dataframe(pagina, column_config=column_config, use_container_width=True, hide_index=True)
+    navegacao_paginas(chave, estado, proximo, total, tamanho_pagina)
@@ -0,0 +1,71 @@
+# graficos.py
+# Dados agregados dos gráficos (N maiores categorias + "Outros") e especificação das figuras em cache por filtros.
+import re
+import unicodedata
+
+import pandas as pd
+import plotly.express as px
+import plotly.io as pio
+import streamlit as st
+
+TOP_N_PADRAO = 8
+ROTULO_OUTROS = "Outros"
+ROTULO_VAZIO = "Sem descrição"
+HOVER_MOEDA = '<b>%{label}</b><br>Valor: R$ %{value:,.2f} (%{percent})<extra></extra>'
+
+def chave_categoria(texto):
+    """Chave de agrupamento de um texto livre: sem acentos, pontuação e espaços repetidos, em maiúsculas.
+    'Gasolina', ' gasolina.' e 'GASOLÍNA' caem na mesma categoria."""
+    texto = unicodedata.normalize('NFKD', str(texto)).encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(re.sub(r'[^A-Za-z0-9]+', ' ', texto).upper().split())
+
+def agrupar_top_n(df, categoria, valor, n=TOP_N_PADRAO, rotulo_outros=ROTULO_OUTROS):
+    """Soma `valor` por `categoria`, unificando as variantes de grafia, e mantém as `n` maiores;
+    o restante vira uma única fatia `rotulo_outros`. Valores nulos, zerados ou negativos são ignorados.
+
+    Cada categoria é exibida com a grafia de maior valor entre as suas variantes.
+    Retorna um DataFrame com as colunas 'categoria' e 'valor', do maior para o menor."""
+    dados = pd.DataFrame({
+        'original': df[categoria].fillna('').astype(str).str.strip(),
+        'valor': pd.to_numeric(df[valor], errors='coerce'),
+    })
+    dados = dados[dados['valor'] > 0]
+    if dados.empty:
+        return pd.DataFrame({'categoria': pd.Series(dtype=str), 'valor': pd.Series(dtype=float)})
+
+    # A normalização roda uma vez por texto distinto, não por linha
+    chaves = {original: chave_categoria(original) for original in dados['original'].unique()}
+    dados['chave'] = dados['original'].map(chaves)
+
+    por_variante = dados.groupby(['chave', 'original'], as_index=False)['valor'].sum()
+    rotulos = por_variante.sort_values('valor', ascending=False).drop_duplicates('chave').set_index('chave')['original']
+    totais = por_variante.groupby('chave')['valor'].sum().sort_values(ascending=False)
+
+    principais = totais.head(n)
+    resultado = pd.DataFrame({
+        'categoria': rotulos.loc[principais.index].replace('', ROTULO_VAZIO).to_numpy(),
+        'valor': principais.to_numpy(),
+    })
+    restante = totais.iloc[n:].sum()
+    if restante > 0:
+        resultado.loc[len(resultado)] = [rotulo_outros, restante]
+    return resultado
+
+@st.cache_data(ttl=300, max_entries=50)
+def _especificacao_pizza(chave, assinatura, _df, categoria, valor, n, titulo, buraco, altura, layout):
+    dados = agrupar_top_n(_df, categoria, valor, n)
+    fig = px.pie(dados, names='categoria', values='valor', title=titulo, hole=buraco, height=altura)
+    # sort=False mantém a ordem do agrupamento: maiores primeiro e "Outros" por último
+    fig.update_traces(hovertemplate=HOVER_MOEDA, sort=False)
+    if layout:
+        fig.update_layout(**layout)
+    return fig.to_json()
+
+def grafico_pizza(chave, assinatura, df, categoria, valor, n=TOP_N_PADRAO, titulo=None, buraco=None, altura=None, layout=None):
+    """Pizza das `n` maiores categorias de `df` + "Outros", pronta para o st.plotly_chart.
+
+    O DataFrame não é hasheado: a especificação (JSON) da figura fica em cache por `chave`
+    (qual gráfico) e `assinatura` (os filtros que produziram `df`), como nas exportações.
+    `layout`: ajustes extras repassados ao update_layout (ex.: {'showlegend': False})."""
+    especificacao = _especificacao_pizza(chave, assinatura, df, categoria, valor, n, titulo, buraco, altura, layout)
+    return pio.from_json(especificacao)
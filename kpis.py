@@ -0,0 +1,87 @@
+# kpis.py
+# Indicadores do resumo financeiro: período selecionado x período anterior equivalente x mesmo período do ano passado.
+from datetime import timedelta
+
+import pandas as pd
+import streamlit as st
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import text
+
+MEDIDAS = ('entradas', 'saidas', 'repasses')
+
+def periodos_comparacao(inicio, fim):
+    """Períodos comparados, como (primeiro dia, último dia):
+    'atual' (o selecionado), 'anterior' (mesmo número de dias, imediatamente antes) e
+    'ano_anterior' (as mesmas datas um ano antes)."""
+    dias = (fim - inicio).days + 1
+    return {
+        'atual': (inicio, fim),
+        'anterior': (inicio - timedelta(days=dias), inicio - timedelta(days=1)),
+        'ano_anterior': (inicio - relativedelta(years=1), fim - relativedelta(years=1)),
+    }
+
+def variacao(atual, base):
+    """Variação percentual de `base` para `atual` ('+12.3%'), ou None se não houver base para comparar."""
+    if not base:
+        return None
+    return f"{(atual - base) / abs(base):+.1%}"
+
+@st.cache_data(ttl=300, max_entries=50)
+def calcular_kpis(_engine, inicio, fim, status=(), cliente=None, tecnicos=(), descricao_saida=None, tipos_saida=()):
+    """Entradas, saídas, repasses e lucro dos três períodos de `periodos_comparacao`, com os mesmos
+    filtros do painel. Uma única consulta: as linhas dos três períodos são lidas juntas (pelo índice
+    de data) e somadas por período com FILTER. O cache é pelo período e pelos filtros.
+
+    Retorna um DataFrame com índice 'atual', 'anterior' e 'ano_anterior' e as colunas
+    'entradas', 'saidas', 'repasses' e 'lucro'."""
+    periodos = periodos_comparacao(inicio, fim)
+    params = {}
+    for nome, (p_inicio, p_fim) in periodos.items():
+        params[f"{nome}_inicio"] = pd.Timestamp(p_inicio)
+        params[f"{nome}_fim"] = pd.Timestamp(p_fim) + pd.Timedelta(days=1)
+    em_algum_periodo = " OR ".join(f"(data >= :{nome}_inicio AND data < :{nome}_fim)" for nome in periodos)
+
+    filtros_entradas, filtros_saidas = "", ""
+    if status:
+        filtros_entradas += " AND status = ANY(:status)"
+        params["status"] = list(status)
+    if cliente:
+        filtros_entradas += " AND cliente = :cliente"
+        params["cliente"] = cliente
+    if tecnicos:
+        filtros_entradas += """ AND EXISTS (
+            SELECT 1 FROM entrada_tecnicos et JOIN tecnicos t ON t.id = et.tecnico_id
+            WHERE et.entrada_id = entradas.id AND t.nome = ANY(:tecnicos))"""
+        params["tecnicos"] = list(tecnicos)
+    if descricao_saida:
+        filtros_saidas += " AND POSITION(lower(:descricao_saida) IN lower(descricao)) > 0"
+        params["descricao_saida"] = descricao_saida
+    if tipos_saida:
+        filtros_saidas += " AND tipo_conta = ANY(:tipos_saida)"
+        params["tipos_saida"] = list(tipos_saida)
+
+    somas = ",\n            ".join(
+        f"COALESCE(SUM({medida}) FILTER (WHERE data >= :{nome}_inicio AND data < :{nome}_fim), 0) AS {medida}_{nome}"
+        for nome in periodos for medida in MEDIDAS
+    )
+    query = f"""
+        WITH lancamentos AS (
+            SELECT data, valor_atendimento AS entradas, 0 AS saidas, valor_repasse_laboratorio AS repasses
+            FROM entradas WHERE ({em_algum_periodo}){filtros_entradas}
+            UNION ALL
+            SELECT data, 0, valor, 0
+            FROM saidas WHERE ({em_algum_periodo}){filtros_saidas}
+        )
+        SELECT
+            {somas}
+        FROM lancamentos
+    """
+    with _engine.connect() as con:
+        linha = con.execute(text(query), params).mappings().one()
+
+    kpis = pd.DataFrame(
+        [{medida: float(linha[f"{medida}_{nome}"]) for medida in MEDIDAS} for nome in periodos],
+        index=list(periodos)
+    )
+    kpis['lucro'] = kpis['entradas'] - kpis['saidas']
+    return kpis
@@ -0,0 +1,117 @@
+# negociacoes.py
+# Registro das negociações (tabelas negociacoes e negociacao_itens): originais x parcelas, saldo a receber e reversão.
+import pandas as pd
+import streamlit as st
+from sqlalchemy import text
+
+def registrar_negociacao(con, tipo, cliente, ids_originais, ids_parcelas, usuario=None):
+    """Grava a negociação e os vínculos com os lançamentos originais e as parcelas geradas.
+    Roda na conexão `con` da negociação, para ficar na mesma transação (o commit é de quem chama).
+    Retorna o id da negociação."""
+    negociacao_id = con.execute(text("""
+        INSERT INTO negociacoes (cliente, tipo, valor_original, usuario_lancamento)
+        SELECT :cliente, :tipo, COALESCE(SUM(valor_atendimento), 0), :usuario
+        FROM entradas WHERE id = ANY(:originais)
+        RETURNING id
+    """), {"cliente": cliente, "tipo": tipo, "originais": list(ids_originais), "usuario": usuario}).scalar()
+    con.execute(text("""
+        INSERT INTO negociacao_itens (negociacao_id, entrada_id, papel)
+        SELECT :negociacao_id, unnest(CAST(:originais AS INTEGER[])), 'original'
+        UNION ALL
+        SELECT :negociacao_id, unnest(CAST(:parcelas AS INTEGER[])), 'parcela'
+    """), {"negociacao_id": negociacao_id, "originais": list(ids_originais), "parcelas": list(ids_parcelas)})
+    return negociacao_id
+
+QUERY_SALDOS = """
+    SELECT
+        n.id, n.criada_em, n.cliente, n.tipo, n.valor_original, n.usuario_lancamento,
+        COUNT(*) FILTER (WHERE i.papel = 'original') AS originais,
+        COUNT(*) FILTER (WHERE i.papel = 'parcela') AS parcelas,
+        COUNT(*) FILTER (WHERE i.papel = 'parcela' AND e.status = 'Pago') AS parcelas_pagas,
+        COUNT(*) FILTER (WHERE i.papel = 'parcela' AND e.status = 'Negociado') AS parcelas_renegociadas,
+        COALESCE(SUM(e.valor_atendimento) FILTER (WHERE i.papel = 'parcela'), 0) AS valor_negociado,
+        COALESCE(SUM(e.valor_atendimento) FILTER (WHERE i.papel = 'parcela' AND e.status = 'Pago'), 0) AS recebido,
+        COALESCE(SUM(e.valor_atendimento) FILTER (WHERE i.papel = 'parcela' AND e.status = 'Pendente'), 0) AS a_receber,
+        MIN(e.data) FILTER (WHERE i.papel = 'parcela' AND e.status = 'Pendente') AS proximo_vencimento
+    FROM negociacoes n
+    JOIN negociacao_itens i ON i.negociacao_id = n.id
+    JOIN entradas e ON e.id = i.entrada_id
+    WHERE n.status = 'Ativa' {filtros}
+    GROUP BY n.id
+    ORDER BY n.criada_em DESC
+"""
+
+@st.cache_data(ttl=300)
+def carregar_negociacoes(_engine, cliente=None, entrada_id=None):
+    """Negociações ativas com o saldo de cada uma (parcelas pagas, recebido e a receber).
+    `entrada_id` localiza a negociação de que um lançamento (original ou parcela) faz parte."""
+    filtros, params = "", {}
+    if cliente:
+        filtros += " AND n.cliente = :cliente"
+        params["cliente"] = cliente
+    if entrada_id:
+        filtros += " AND n.id IN (SELECT negociacao_id FROM negociacao_itens WHERE entrada_id = :entrada_id)"
+        params["entrada_id"] = int(entrada_id)
+    df = pd.read_sql_query(
+        text(QUERY_SALDOS.format(filtros=filtros)), _engine, params=params,
+        parse_dates=['criada_em', 'proximo_vencimento']
+    )
+    colunas_valor = ['valor_original', 'valor_negociado', 'recebido', 'a_receber']
+    df[colunas_valor] = df[colunas_valor].astype(float)
+    return df
+
+@st.cache_data(ttl=300)
+def carregar_itens_negociacao(_engine, negociacao_id):
+    """Lançamentos originais e parcelas de uma negociação."""
+    query = """
+        SELECT i.papel, e.id, e.data, e.ordem_servico, e.descricao_servico, e.valor_atendimento, e.status
+        FROM negociacao_itens i
+        JOIN entradas e ON e.id = i.entrada_id
+        WHERE i.negociacao_id = :negociacao_id
+        ORDER BY i.papel DESC, e.data, e.id
+    """
+    return pd.read_sql_query(text(query), _engine, params={"negociacao_id": int(negociacao_id)}, parse_dates=['data'])
+
+def reverter_negociacao(con, negociacao_id):
+    """Desfaz uma negociação ativa em uma única instrução: os originais ainda 'Negociado' voltam
+    a 'Pendente', as parcelas ainda 'Pendente' ficam 'Cancelado' e a negociação, 'Revertida'.
+    Não reverte se alguma parcela já foi paga ou foi renegociada (status 'Negociado' ou original
+    de outra negociação ativa). Retorna {'restaurados', 'canceladas'}, ou None se nada foi revertido."""
+    resultado = con.execute(text("""
+        WITH itens AS (
+            SELECT i.entrada_id, i.papel
+            FROM negociacao_itens i
+            JOIN negociacoes n ON n.id = i.negociacao_id AND n.status = 'Ativa'
+            WHERE i.negociacao_id = :negociacao_id
+              AND NOT EXISTS (
+                  SELECT 1 FROM negociacao_itens p JOIN entradas e ON e.id = p.entrada_id
+                  WHERE p.negociacao_id = :negociacao_id AND p.papel = 'parcela' AND e.status IN ('Pago', 'Negociado')
+              )
+              AND NOT EXISTS (
+                  SELECT 1 FROM negociacao_itens p
+                  JOIN negociacao_itens outra ON outra.entrada_id = p.entrada_id AND outra.papel = 'original'
+                      AND outra.negociacao_id <> p.negociacao_id
+                  JOIN negociacoes n2 ON n2.id = outra.negociacao_id AND n2.status = 'Ativa'
+                  WHERE p.negociacao_id = :negociacao_id AND p.papel = 'parcela'
+              )
+        ), restaurados AS (
+            UPDATE entradas e SET status = 'Pendente'
+            FROM itens WHERE e.id = itens.entrada_id AND itens.papel = 'original' AND e.status = 'Negociado'
+            RETURNING e.id
+        ), canceladas AS (
+            UPDATE entradas e SET status = 'Cancelado'
+            FROM itens WHERE e.id = itens.entrada_id AND itens.papel = 'parcela' AND e.status = 'Pendente'
+            RETURNING e.id
+        ), negociacao AS (
+            UPDATE negociacoes SET status = 'Revertida', revertida_em = NOW()
+            WHERE id = :negociacao_id AND EXISTS (SELECT 1 FROM itens)
+            RETURNING id
+        )
+        SELECT
+            (SELECT COUNT(*) FROM restaurados) AS restaurados,
+            (SELECT COUNT(*) FROM canceladas) AS canceladas,
+            (SELECT COUNT(*) FROM negociacao) AS revertidas
+    """), {"negociacao_id": int(negociacao_id)}).mappings().one()
+    if not resultado['revertidas']:
+        return None
+    return {'restaurados': resultado['restaurados'], 'canceladas': resultado['canceladas']}
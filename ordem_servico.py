@@ -0,0 +1,71 @@
+# ordem_servico.py
+# Numeração das O.S. pela sequence ordem_servico_seq (criada em setup_nuvem.py): alocação O(1) e sem números repetidos.
+import re
+from collections import Counter
+
+from sqlalchemy import text
+
+SEQUENCIA = "ordem_servico_seq"
+RE_NUMERICA = re.compile(r'^[0-9]{1,18}$')  # o que cabe em BIGINT, o tipo da sequence
+
+def proxima_os(con):
+    """Aloca o próximo número de O.S. O nextval é atômico e não volta atrás em rollback:
+    dois usuários ao mesmo tempo nunca recebem o mesmo número (no máximo sobra um buraco)."""
+    return str(con.execute(text(f"SELECT nextval('{SEQUENCIA}')")).scalar())
+
+def travar_numeracao(con):
+    """Advisory lock das O.S. digitadas ou importadas, liberado no commit de quem chama."""
+    con.execute(text("SELECT pg_advisory_xact_lock(hashtext(:chave))"), {"chave": SEQUENCIA})
+
+def definir_os(con, informado):
+    """Número da O.S. de um lançamento novo: aloca da sequence se `informado` estiver vazio.
+    Um número digitado à mão é mantido e, se for numérico, avança a sequence até ele,
+    para que a próxima alocação automática não o repita. Os números digitados são
+    serializados por um advisory lock (liberado no commit de quem chama), e um número
+    que já existe é recusado com ValueError."""
+    informado = str(informado or '').strip()
+    if not informado:
+        return proxima_os(con)
+    if RE_NUMERICA.match(informado):
+        travar_numeracao(con)
+        if con.execute(text("SELECT 1 FROM entradas WHERE ordem_servico = :numero LIMIT 1"), {"numero": informado}).first():
+            raise ValueError(f"A O.S. {informado} já existe. Deixe o campo vazio para numerar automaticamente.")
+        con.execute(
+            text(f"""
+                SELECT setval('{SEQUENCIA}', CAST(:numero AS BIGINT))
+                FROM {SEQUENCIA}
+                WHERE CAST(:numero AS BIGINT) > CASE WHEN is_called THEN last_value ELSE last_value - 1 END
+            """),
+            {"numero": informado}
+        )
+    return informado
+
+def normalizar_os(valor):
+    """O.S. lida de uma planilha como texto: 123.0 vira '123' e vazia vira None."""
+    if valor is None or valor != valor:  # NaN
+        return None
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    return str(valor).strip() or None
+
+def os_repetidas(con, numeros):
+    """O.S. numéricas de `numeros` repetidas na própria lista ou já existentes em entradas
+    (as que o índice único recusaria), em ordem. Chame depois de `travar_numeracao`."""
+    numericas = [n for n in numeros if isinstance(n, str) and RE_NUMERICA.match(n)]
+    repetidas = {n for n, vezes in Counter(numericas).items() if vezes > 1}
+    repetidas.update(con.execute(
+        text("SELECT DISTINCT ordem_servico FROM entradas WHERE ordem_servico = ANY(:numeros)"),
+        {"numeros": sorted(set(numericas))}
+    ).scalars())
+    return sorted(repetidas, key=int)
+
+def acompanhar_sequencia(con):
+    """Avança a sequence até a maior O.S. numérica gravada (como o setup_nuvem.py), depois
+    de inserções que não passaram por `definir_os` (ex.: importação de CSV). Nunca volta atrás."""
+    con.execute(text(f"""
+        SELECT setval('{SEQUENCIA}', GREATEST(m.maior, s.last_value, 1), m.maior > 0 OR s.is_called)
+        FROM (
+            SELECT COALESCE(MAX(CAST(ordem_servico AS BIGINT)), 0) AS maior
+            FROM entradas WHERE ordem_servico ~ '^[0-9]{{1,18}}$'
+        ) m, {SEQUENCIA} s
+    """))
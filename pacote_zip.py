@@ -0,0 +1,73 @@
+# pacote_zip.py
+# Empacotamento de documentos para download com uso de memória limitado por sessão.
+import os
+import tempfile
+import zipfile
+
+# Acima deste tamanho o conteúdo deixa a memória e passa para um arquivo temporário em disco.
+LIMITE_MEMORIA_PADRAO = 8 * 1024 * 1024  # 8 MB
+
+class ArquivoSpool:
+    """Arquivo temporário que fica em memória até `limite_memoria` bytes e depois vai para o disco.
+    É este objeto (e não os bytes) que deve ser guardado no session_state."""
+
+    def __init__(self, nome_arquivo, limite_memoria=LIMITE_MEMORIA_PADRAO):
+        self.nome_arquivo = nome_arquivo
+        self.arquivo = tempfile.SpooledTemporaryFile(max_size=limite_memoria)
+
+    @property
+    def tamanho(self):
+        posicao = self.arquivo.tell()
+        self.arquivo.seek(0, 2)
+        tamanho = self.arquivo.tell()
+        self.arquivo.seek(posicao)
+        return tamanho
+
+    @property
+    def em_disco(self):
+        return self.arquivo._rolled
+
+    def ler(self):
+        """Lê o conteúdo completo. Pensado para ser passado como `data` de um
+        st.download_button, para que a leitura só aconteça no clique."""
+        self.arquivo.seek(0)
+        return self.arquivo.read()
+
+    def descartar(self):
+        self.arquivo.close()
+
+class PacoteZip(ArquivoSpool):
+    """ZIP escrito de forma incremental: cada documento é comprimido assim que é
+    adicionado, e os bytes originais podem ser descartados em seguida."""
+
+    def __init__(self, nome_arquivo, limite_memoria=LIMITE_MEMORIA_PADRAO):
+        super().__init__(nome_arquivo, limite_memoria)
+        self._zip = zipfile.ZipFile(self.arquivo, 'w', compression=zipfile.ZIP_DEFLATED)
+        self.documentos = []
+        self._nomes = set()
+
+    def _nome_unico(self, nome):
+        """Nome ainda não usado no pacote: um nome repetido recebe um sufixo numérico
+        ('Relatorio.pdf', 'Relatorio_2.pdf', ...), para que nenhum documento fique escondido."""
+        base, extensao = os.path.splitext(nome)
+        candidato, numero = nome, 1
+        while candidato in self._nomes:
+            numero += 1
+            candidato = f"{base}_{numero}{extensao}"
+        self._nomes.add(candidato)
+        self.documentos.append(candidato)
+        return candidato
+
+    def adicionar(self, nome, dados):
+        """Adiciona um documento já gerado (bytes) ao pacote. Retorna o nome usado no ZIP."""
+        nome = self._nome_unico(nome)
+        self._zip.writestr(nome, bytes(dados))
+        return nome
+
+    def abrir_documento(self, nome):
+        """Abre um documento do pacote para escrita em streaming (ex.: PdfWriter.write)."""
+        return self._zip.open(self._nome_unico(nome), 'w', force_zip64=True)
+
+    def fechar(self):
+        """Finaliza o ZIP (grava o índice central). Deve ser chamado antes do download."""
+        self._zip.close()
@@ -3,7 +3,6 @@ import pandas as pd
 from datetime import datetime, timedelta
 from sqlalchemy import create_engine, text
 from fpdf import FPDF
-import io
 
 # --- CONFIGURAÇÃO DA PÁGINA E CONEXÃO COM DB ---
 st.set_page_config(page_title="Lançamento de Laboratório", page_icon="🔬", layout="wide")
@@ -16,6 +15,10 @@ if "authentication_status" not in st.session_state or not st.session_state["auth
 import os, sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from menu import exibir_menu
+from exportacao import MIME_EXCEL, coluna_excel, exportar_consultas
+from ordem_servico import definir_os
+from schema import exigir_esquema
+from tecnicos import sincronizar_tecnicos
 exibir_menu()
 
 st.title("🔬 Lançamento de Laboratório")
@@ -23,6 +26,7 @@ st.write("Use esta tela para registrar serviços realizados exclusivamente no la
 
 connection_url = st.secrets["database"]["connection_url"]
 engine = create_engine(connection_url)
+exigir_esquema(connection_url)
 
 # --- FUNÇÕES AUXILIARES ---
 
@@ -43,11 +47,19 @@ def carregar_lancamentos_recentes():
     df = pd.read_sql_query(query, engine, parse_dates=['data'])
     return df
 
+QUERY_REPASSES = "SELECT id, data, ordem_servico, cliente, valor_atendimento, valor_repasse_laboratorio FROM entradas WHERE data >= :inicio AND data <= :fim ORDER BY data DESC"
+COLUNAS_EXCEL_REPASSES = [
+    coluna_excel('data', 'Data', 'data'),
+    coluna_excel('ordem_servico', 'O.S.', largura=12),
+    coluna_excel('cliente', 'Cliente'),
+    coluna_excel('valor_atendimento', 'Total Cliente (R$)', 'moeda'),
+    coluna_excel('valor_repasse_laboratorio', 'Repasse (R$)', 'moeda'),
+]
+
 @st.cache_data(ttl=300)
 def carregar_repasses_filtrados(inicio, fim):
     """Carrega os repasses filtrados por período."""
-    query = text("SELECT id, data, ordem_servico, cliente, valor_atendimento, valor_repasse_laboratorio FROM entradas WHERE data >= :inicio AND data <= :fim ORDER BY data DESC")
-    df = pd.read_sql_query(query, engine, params={"inicio": inicio, "fim": f"{fim} 23:59:59"}, parse_dates=['data'])
+    df = pd.read_sql_query(text(QUERY_REPASSES), engine, params={"inicio": inicio, "fim": f"{fim} 23:59:59"}, parse_dates=['data'])
     return df
 
 
@@ -69,6 +81,18 @@ def deletar_lancamento(id_lancamento):
     except Exception as e:
         st.error(f"Erro ao excluir lançamento: {e}")
 
+def inserir_lancamento(dados):
+    """Insere o lançamento na tabela de entradas e vincula o técnico, na mesma transação.
+    Sem Nº de O.S. informado, o número é alocado da sequence e gravado em dados['ordem_servico']."""
+    colunas = ", ".join(dados.keys())
+    valores = ", ".join(f":{key}" for key in dados.keys())
+    with engine.connect() as con:
+        dados['ordem_servico'] = definir_os(con, dados.get('ordem_servico'))
+        entrada_id = con.execute(text(f"INSERT INTO entradas ({colunas}) VALUES ({valores}) RETURNING id"), dados).scalar()
+        sincronizar_tecnicos(con, entrada_id, dados.get('nome_tecnicos'))
+        con.commit()
+    return entrada_id
+
 def atualizar_lancamento(id_lancamento, dados):
     """Atualiza um lançamento na tabela de entradas."""
     try:
@@ -77,49 +101,112 @@ def atualizar_lancamento(id_lancamento, dados):
             dados['id'] = id_lancamento
             query = text(f"UPDATE entradas SET {set_clause} WHERE id = :id")
             con.execute(query, dados)
+            sincronizar_tecnicos(con, id_lancamento, dados.get('nome_tecnicos'))
             con.commit()
         st.success("Lançamento atualizado com sucesso!")
         st.cache_data.clear()
     except Exception as e:
         st.error(f"Erro ao atualizar lançamento: {e}")
 
+# --- ETIQUETAS ---
+LARGURA_ETIQUETA, ALTURA_ETIQUETA = 100, 60  # mm (etiqueta térmica padrão)
+LAYOUTS_ETIQUETA = {
+    "termica": "Rolo térmico (1 por página)",
+    "a4": "Folha A4 (8 por folha, 2x4)",
+}
+COLUNAS_A4, LINHAS_A4 = 2, 4
+
+def buscar_dados_etiquetas(ids=None, inicio=None, fim=None):
+    """Busca, em uma única consulta, os dados de etiqueta dos lançamentos
+    informados por `ids` ou por período (`inicio`/`fim`)."""
+    colunas = "id, data, ordem_servico, cliente, maquina, patrimonio"
+    if ids:
+        query = text(f"SELECT {colunas} FROM entradas WHERE id IN :ids ORDER BY data, ordem_servico")
+        params = {"ids": tuple(int(i) for i in ids)}
+    else:
+        query = text(f"SELECT {colunas} FROM entradas WHERE data >= :inicio AND data <= :fim ORDER BY data, ordem_servico")
+        params = {"inicio": inicio, "fim": f"{fim} 23:59:59"}
+    return pd.read_sql_query(query, engine, params=params, parse_dates=['data'])
+
+def _novo_pdf_etiquetas(layout):
+    """Cria o documento do layout escolhido, registrando as fontes uma única vez."""
+    if layout == "a4":
+        pdf = FPDF('P', 'mm', 'A4')
+    else:
+        # Paisagem, mm, 100x60 - Tamanho comum de etiqueta térmica
+        pdf = FPDF('L', 'mm', (ALTURA_ETIQUETA, LARGURA_ETIQUETA))
+    pdf.set_margins(3, 3, 3)
+    pdf.set_auto_page_break(False)
+
+    # Tenta usar fonte DejaVu se disponível, senão Arial
+    try:
+        pdf.add_font('DejaVu', '', 'DejaVuSans.ttf')
+        pdf.add_font('DejaVu', 'B', 'DejaVuSans-Bold.ttf')
+        fonte = 'DejaVu'
+    except:
+        fonte = 'Arial'
+    return pdf, fonte
+
+def _desenhar_etiqueta(pdf, x, y, dados, fonte):
+    """Desenha uma etiqueta 100x60mm com o canto superior esquerdo em (x, y)."""
+    largura_util = LARGURA_ETIQUETA - 6
+
+    # Cabeçalho
+    pdf.set_font(fonte, 'B', 10)
+    pdf.set_xy(x + 3, y + 3)
+    pdf.cell(largura_util, 5, "ELITE CNC - LABORATÓRIO", 0, 0, 'C')
+    pdf.line(x + 2, y + 9, x + LARGURA_ETIQUETA - 2, y + 9)
+
+    # Número da O.S. em destaque
+    pdf.set_font(size=16)
+    pdf.set_xy(x + 3, y + 12)
+    pdf.cell(largura_util, 8, f"O.S.: {dados['ordem_servico']}", 0, 0, 'C')
+
+    # Detalhes
+    data_txt = pd.to_datetime(dados['data']).strftime('%d/%m/%Y') if pd.notnull(dados['data']) else ''
+    detalhes = [
+        f"Cliente: {str(dados['cliente'])[:28]}",
+        f"Data: {data_txt}",
+        f"Equip: {str(dados['maquina'])[:28]}",
+        f"Patrimônio: {str(dados['patrimonio'])[:20]}",
+    ]
+    pdf.set_font(size=9)
+    for i, linha in enumerate(detalhes):
+        pdf.set_xy(x + 3, y + 22 + 5 * i)
+        pdf.cell(largura_util, 5, linha, 0, 0, 'L')
+
+def gerar_etiquetas_pdf(df_etiquetas, layout="termica"):
+    """Renderiza todas as etiquetas de `df_etiquetas` em um único PDF.
+    'termica': uma etiqueta por página; 'a4': 2x4 etiquetas por folha, com linhas de corte."""
+    pdf, fonte = _novo_pdf_etiquetas(layout)
+    registros = df_etiquetas.to_dict('records')
+
+    if layout == "a4":
+        por_folha = COLUNAS_A4 * LINHAS_A4
+        margem_x = (pdf.w - COLUNAS_A4 * LARGURA_ETIQUETA) / 2
+        margem_y = (pdf.h - LINHAS_A4 * ALTURA_ETIQUETA) / 2
+        for i, dados in enumerate(registros):
+            posicao = i % por_folha
+            if posicao == 0:
+                pdf.add_page()
+            x = margem_x + (posicao % COLUNAS_A4) * LARGURA_ETIQUETA
+            y = margem_y + (posicao // COLUNAS_A4) * ALTURA_ETIQUETA
+            pdf.set_draw_color(200, 200, 200)
+            pdf.rect(x, y, LARGURA_ETIQUETA, ALTURA_ETIQUETA)
+            pdf.set_draw_color(0, 0, 0)
+            _desenhar_etiqueta(pdf, x, y, dados, fonte)
+    else:
+        for dados in registros:
+            pdf.add_page()
+            _desenhar_etiqueta(pdf, 0, 0, dados, fonte)
+
+    return bytes(pdf.output())
+
 def gerar_etiqueta_pdf(id_lancamento):
     """Gera uma etiqueta PDF 100x60mm para o lançamento."""
     try:
-        # Busca os dados completos do lançamento
-        dados = pd.read_sql_query(f"SELECT * FROM entradas WHERE id = {id_lancamento}", engine).iloc[0]
-        
-        # Configuração do PDF (Paisagem, mm, 100x60 - Tamanho comum de etiqueta térmica)
-        pdf = FPDF('L', 'mm', (60, 100))
-        pdf.set_margins(3, 3, 3)
-        pdf.add_page()
-
-        # Tenta usar fonte DejaVu se disponível, senão Arial
-        try:
-            pdf.add_font('DejaVu', '', 'DejaVuSans.ttf')
-            pdf.add_font('DejaVu', 'B', 'DejaVuSans-Bold.ttf')
-            pdf.set_font('DejaVu', 'B', 10)
-        except:
-            pdf.set_font('Arial', 'B', 10)
-
-        # Cabeçalho
-        pdf.cell(0, 5, "ELITE CNC - LABORATÓRIO", 0, 1, 'C')
-        pdf.line(2, 9, 98, 9)
-        pdf.ln(4)
-
-        # Número da O.S. em destaque
-        pdf.set_font(size=16)
-        pdf.cell(0, 8, f"O.S.: {dados['ordem_servico']}", 0, 1, 'C')
-        pdf.ln(2)
-
-        # Detalhes
-        pdf.set_font(size=9)
-        pdf.cell(0, 5, f"Cliente: {str(dados['cliente'])[:28]}", 0, 1, 'L')
-        pdf.cell(0, 5, f"Data: {pd.to_datetime(dados['data']).strftime('%d/%m/%Y')}", 0, 1, 'L')
-        pdf.cell(0, 5, f"Equip: {str(dados['maquina'])[:28]}", 0, 1, 'L')
-        pdf.cell(0, 5, f"Patrimônio: {str(dados['patrimonio'])[:20]}", 0, 1, 'L')
-
-        return bytes(pdf.output())
+        dados = buscar_dados_etiquetas(ids=[id_lancamento])
+        return gerar_etiquetas_pdf(dados, "termica")
     except Exception as e:
         st.error(f"Erro ao gerar etiqueta: {e}")
         return None
@@ -183,7 +270,7 @@ with col1:
                 numero_serie = st.text_input("Número de Série (Patrimônio)", value=numero_serie_default)
             
             with c2:
-                os_id = st.text_input("Nº da O.S.", value=os_id_default)
+                os_id = st.text_input("Nº da O.S.", value=os_id_default, placeholder="Automático", help="Deixe em branco para usar o próximo número da sequência.")
                 tecnico_responsavel = st.text_input("Técnico Responsável", value=tecnico_default)
                 modelo = st.text_input("Modelo", value=modelo_default)
                 # Espaçador visual para alinhar
@@ -206,7 +293,7 @@ with col1:
             submit_button = st.form_submit_button(submit_button_text, use_container_width=True, type="primary")
 
         if submit_button:
-            if not cliente or not os_id:
+            if not cliente or (st.session_state.edit_lab_id and not os_id):
                 st.error("Os campos 'Cliente' e 'Nº da O.S.' são obrigatórios.")
             else:
                 # Combina as descrições em um único campo para o banco de dados
@@ -246,8 +333,8 @@ with col1:
                 else:
                     # Modo de inserção
                     try:
-                        pd.DataFrame([dados_lancamento]).to_sql('entradas', engine, if_exists='append', index=False)
-                        st.success(f"Serviço de laboratório para O.S. '{os_id}' lançado com sucesso!")
+                        inserir_lancamento(dados_lancamento)
+                        st.success(f"Serviço de laboratório para O.S. '{dados_lancamento['ordem_servico']}' lançado com sucesso!")
                         st.cache_data.clear()
                     except Exception as e:
                         st.error(f"Ocorreu um erro ao salvar no banco de dados: {e}")
@@ -298,16 +385,15 @@ with col2:
                     hide_index=True
                 )
 
-                # Botão de Exportação para Excel
-                buffer = io.BytesIO()
-                with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-                    df_repasses[['data', 'ordem_servico', 'cliente', 'valor_atendimento', 'valor_repasse_laboratorio']].to_excel(writer, index=False, sheet_name='Repasses')
-                
+                # Botão de Exportação para Excel (lida do banco em lotes, só no clique)
                 st.download_button(
                     label="📥 Baixar Tabela em Excel",
-                    data=buffer.getvalue(),
+                    data=lambda: exportar_consultas(engine, [{
+                        'nome': 'Repasses', 'colunas': COLUNAS_EXCEL_REPASSES, 'query': QUERY_REPASSES,
+                        'params': {"inicio": data_inicial, "fim": f"{data_final} 23:59:59"},
+                    }]),
                     file_name=f"Repasses_Laboratorio_{data_inicial.strftime('%Y%m%d')}_{data_final.strftime('%Y%m%d')}.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                    mime=MIME_EXCEL
                 )
 
             # Ordena para garantir que o mais recente apareça primeiro na lista
@@ -336,4 +422,58 @@ with col2:
                 # Botão de Etiqueta
                 pdf_bytes = gerar_etiqueta_pdf(id_selecionado)
                 if pdf_bytes:
-                    btn_col3.download_button("🖨️ Etiqueta", data=pdf_bytes, file_name=f"Etiqueta_OS_{id_selecionado}.pdf", mime="application/pdf", use_container_width=True)
\ No newline at end of file
+                    btn_col3.download_button("🖨️ Etiqueta", data=pdf_bytes, file_name=f"Etiqueta_OS_{id_selecionado}.pdf", mime="application/pdf", use_container_width=True)
+
+    # --- ETIQUETAS EM LOTE ---
+    st.write("")
+    with st.container(border=True):
+        st.subheader("🖨️ Etiquetas em Lote")
+
+        modo_selecao = st.radio("Selecionar por:", ["Período", "Lançamentos recentes"], horizontal=True, key="etiq_modo")
+        ids_etiquetas, periodo_etiquetas = [], None
+        if modo_selecao == "Período":
+            periodo_etiquetas = st.date_input(
+                "Período de Entrada", value=[datetime.now().date(), datetime.now().date()],
+                format="DD/MM/YYYY", key="etiq_periodo"
+            )
+        elif not df_gerenciar.empty:
+            rotulos = dict(zip(df_gerenciar['id'], df_gerenciar['display']))
+            ids_etiquetas = st.multiselect(
+                "Lançamentos:", options=list(rotulos.keys()), format_func=rotulos.get,
+                placeholder="Selecione os lançamentos...", key="etiq_ids"
+            )
+
+        layout_etiquetas = st.radio(
+            "Formato de impressão:", options=list(LAYOUTS_ETIQUETA.keys()),
+            format_func=LAYOUTS_ETIQUETA.get, horizontal=True, key="etiq_layout"
+        )
+
+        if st.button("🏷️ Gerar Etiquetas", use_container_width=True, key="etiq_gerar"):
+            st.session_state.pop('etiquetas_lote', None)
+            try:
+                if ids_etiquetas:
+                    df_etiquetas = buscar_dados_etiquetas(ids=ids_etiquetas)
+                elif periodo_etiquetas is not None and len(periodo_etiquetas) == 2:
+                    df_etiquetas = buscar_dados_etiquetas(inicio=periodo_etiquetas[0], fim=periodo_etiquetas[1])
+                else:
+                    df_etiquetas = pd.DataFrame()
+
+                if df_etiquetas.empty:
+                    st.warning("Nenhum lançamento encontrado para a seleção.")
+                else:
+                    st.session_state.etiquetas_lote = {
+                        'pdf': gerar_etiquetas_pdf(df_etiquetas, layout_etiquetas),
+                        'quantidade': len(df_etiquetas),
+                        'layout': layout_etiquetas,
+                    }
+            except Exception as e:
+                st.error(f"Erro ao gerar etiquetas: {e}")
+
+        lote = st.session_state.get('etiquetas_lote')
+        if lote:
+            st.success(f"{lote['quantidade']} etiqueta(s) pronta(s).")
+            st.download_button(
+                "📥 Baixar Etiquetas (PDF)", data=lote['pdf'],
+                file_name=f"Etiquetas_{lote['layout']}_{datetime.now().strftime('%Y%m%d_%H%M')}.pdf",
+                mime="application/pdf", use_container_width=True
+            )
@@ -12,6 +12,7 @@ if "authentication_status" not in st.session_state or not st.session_state["auth
     st.stop()
 
 from menu import exibir_menu
+from grade_paginada import ORDEM_DATA, grade_paginada
 exibir_menu()
 
 st.title("📦 Controle de Estoque")
@@ -30,20 +31,25 @@ def carregar_componentes():
         st.error(f"Erro ao carregar componentes: {e}")
         return pd.DataFrame()
 
+# Histórico exibido pela grade paginada (grade_paginada.py): só a página visível é buscada
+CONSULTA_MOVIMENTACOES = """
+    SELECT m.id, m.data, c.nome as componente, m.tipo_movimento, m.local, m.quantidade, m.observacao, m.usuario_lancamento
+    FROM estoque_movimentacao m
+    JOIN estoque_componentes c ON m.componente_id = c.id
+    WHERE m.tipo_movimento = ANY(:tipos) AND m.local = ANY(:locais) AND c.nome = ANY(:componentes)
+"""
+
 @st.cache_data(ttl=300)
-def carregar_movimentacoes():
-    """Carrega o histórico de movimentações."""
+def carregar_opcoes_historico():
+    """Tipos e locais já usados nas movimentações (para os filtros do histórico)."""
     try:
-        query = """
-        SELECT m.data, c.nome as componente, m.tipo_movimento, m.local, m.quantidade, m.observacao, m.usuario_lancamento
-        FROM estoque_movimentacao m
-        JOIN estoque_componentes c ON m.componente_id = c.id
-        ORDER BY m.data DESC
-        """
-        return pd.read_sql(query, engine, parse_dates=['data'])
+        with engine.connect() as con:
+            tipos = con.execute(text("SELECT DISTINCT tipo_movimento FROM estoque_movimentacao WHERE tipo_movimento IS NOT NULL ORDER BY 1")).scalars().all()
+            locais = con.execute(text("SELECT DISTINCT local FROM estoque_movimentacao WHERE local IS NOT NULL ORDER BY 1")).scalars().all()
+        return tipos, locais
     except Exception as e:
         st.error(f"Erro ao carregar movimentações: {e}")
-        return pd.DataFrame()
+        return [], []
 
 def executar_movimentacao(componente_id, tipo_movimento, local, quantidade, observacao, usuario):
     """Registra uma movimentação e atualiza o saldo do componente."""
@@ -119,7 +125,7 @@ def atualizar_componente(id_componente, dados):
 
 # --- CARREGANDO DADOS ---
 df_componentes = carregar_componentes()
-df_movimentacoes = carregar_movimentacoes()
+tipos_movimentacao, locais_movimentacao = carregar_opcoes_historico()
 
 # Calcula total para uso geral
 if not df_componentes.empty:
@@ -561,7 +567,7 @@ with tab_gerenciar:
 with tab_historico:
     st.subheader("Histórico Completo de Movimentações")
 
-    if df_movimentacoes.empty:
+    if not tipos_movimentacao:
         st.info("Nenhuma movimentação de estoque foi registrada ainda.")
     else:
         # Filtros
@@ -569,33 +575,30 @@ with tab_historico:
         with col1:
             tipos_filtro = st.multiselect(
                 "Filtrar por Tipo:",
-                options=df_movimentacoes['tipo_movimento'].unique(),
-                default=df_movimentacoes['tipo_movimento'].unique()
+                options=tipos_movimentacao,
+                default=tipos_movimentacao
             )
         with col2:
             locais_filtro = st.multiselect(
                 "Filtrar por Local:",
-                options=df_movimentacoes['local'].unique(),
-                default=df_movimentacoes['local'].unique()
+                options=locais_movimentacao,
+                default=locais_movimentacao
             )
         with col3:
+            nomes_componentes = df_componentes['nome'].tolist() if not df_componentes.empty else []
             componentes_filtro = st.multiselect(
                 "Filtrar por Componente:",
-                options=df_movimentacoes['componente'].unique(),
-                default=df_movimentacoes['componente'].unique()
+                options=nomes_componentes,
+                default=nomes_componentes
             )
 
-        df_filtrado = df_movimentacoes[
-            df_movimentacoes['tipo_movimento'].isin(tipos_filtro) &
-            df_movimentacoes['local'].isin(locais_filtro) &
-            df_movimentacoes['componente'].isin(componentes_filtro)
-        ]
-
-        st.dataframe(
-            df_filtrado,
-            use_container_width=True,
-            hide_index=True,
+        grade_paginada(
+            engine, "grade_movimentacoes", CONSULTA_MOVIMENTACOES,
+            colunas_busca=('componente', 'observacao', 'usuario_lancamento'),
+            ordenacoes={'Data': ORDEM_DATA, 'Quantidade': 'COALESCE(quantidade, 0)'},
+            params={'tipos': tipos_filtro, 'locais': locais_filtro, 'componentes': componentes_filtro},
             column_config={
+                "id": None,
                 "data": st.column_config.DatetimeColumn("Data", format="DD/MM/YYYY HH:mm"),
                 "componente": "Componente",
                 "tipo_movimento": "Tipo",
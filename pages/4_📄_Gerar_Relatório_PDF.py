@@ -6,10 +6,8 @@ import pandas as pd
 from sqlalchemy import create_engine
 from fpdf import FPDF
 from datetime import datetime
-import smtplib
 import re
 from urllib.parse import quote
-from email.message import EmailMessage
 
 # --- CONFIGURAÇÃO DA PÁGINA ---
 st.set_page_config(page_title="Gerar PDF", page_icon="📄", layout="wide")
@@ -30,6 +28,7 @@ authenticator = None  # só para manter compatibilidade se precisar do logout
 import os, sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from menu import exibir_menu
+from correio import enfileirar_envio, registrar_envio, exibir_status_envios
 exibir_menu()
 
 st.title("📄 Gerar Relatório em PDF")
@@ -38,6 +37,7 @@ st.write("Selecione uma Ordem de Serviço abaixo para gerar um relatório em PDF
 # Conexão com o banco de dados da nuvem a partir dos "Secrets"
 connection_url = st.secrets["database"]["connection_url"]
 engine = create_engine(connection_url)
+exibir_status_envios(engine)
 
 # --- CLASSE PARA GERAR O PDF ---
 class PDF(FPDF):
@@ -83,55 +83,17 @@ class PDF(FPDF):
         self.cell(0, 10, f'Página {self.page_no()}', 0, 0, 'C')
 
 # --- FUNÇÃO PARA ENVIAR EMAIL COM ANEXO ---
-def enviar_pdf_por_email(destinatario, assunto, corpo, dados_pdf, nome_arquivo_pdf):
+def enviar_pdf_por_email(destinatario, assunto, corpo, dados_pdf, nome_arquivo_pdf, cliente=None, referencia=None):
     try:
-        remetente = st.secrets["email_credentials"]["username"]
-        senha = st.secrets["email_credentials"]["password"]
-        msg = EmailMessage()
-        msg['Subject'] = assunto
-        msg['From'] = remetente
-        msg['To'] = destinatario
-        msg.set_content(corpo)
-        
-        corpo_html = corpo.replace('\n', '<br>')
-        html_content = f"""\
-        <html>
-            <body style="font-family: Arial, sans-serif; color: #333333; line-height: 1.6;">
-                <p>{corpo_html}</p>
-                <br>
-                <table border="0" cellpadding="0" cellspacing="0" style="font-family: Arial, sans-serif; color: #333333; line-height: 1.4;">
-                    <tr>
-                        <td style="padding-right: 15px; border-right: 2px solid #cccccc;">
-                            <a href='https://postimg.cc/fVNyZqpf' target='_blank'>
-                                <img src='https://i.postimg.cc/fVNyZqpf/Whats-App-Image-2025-01-06-at-16-03-50.jpg' border='0' alt='Elite CNC Service' style='max-width: 140px; height: auto;'>
-                            </a>
-                        </td>
-                        <td style="padding-left: 15px;">
-                            <strong style="font-size: 16px;">Filipe Guimarães</strong><br>
-                            <span style="font-size: 14px; color: #666666;">Sócio Proprietário</span><br>
-                            <span style="font-size: 13px;">
-                            📞 WhatsApp: (11) 97761-7009<br>
-                            ✉️ elitecncservice@gmail.com<br>
-                            🌐 <a href="http://www.elitecncservice.com.br" style="color: #0056b3; text-decoration: none;">www.elitecncservice.com.br</a>
-                            </span>
-                        </td>
-                    </tr>
-                </table>
-            </body>
-        </html>
-        """
-        msg.add_alternative(html_content, subtype='html')
-        
-        msg.add_attachment(dados_pdf, maintype='application', subtype='pdf', filename=nome_arquivo_pdf)
-        with smtplib.SMTP_SSL('smtp.gmail.com', 465) as smtp:
-            smtp.login(remetente, senha)
-            smtp.send_message(msg)
-        st.success(f"Email com o relatório enviado com sucesso para {destinatario}!")
-        return True
+        envio = enfileirar_envio(
+            engine, st.secrets["email_credentials"], destinatario, assunto, corpo, [{'nome': nome_arquivo_pdf, 'dados': dados_pdf}],
+            cliente=cliente, referencia=referencia, usuario=st.session_state.get("username")
+        )
     except Exception as e:
-        st.error(f"Falha ao enviar o email. Erro: {e}")
-        st.error("Verifique as credenciais em secrets.toml e sua Senha de App.")
+        st.error(f"Erro ao colocar o email na fila de envio: {e}")
         return False
+    registrar_envio(envio, destinatario)
+    return True
 
 # --- FUNÇÃO PARA CARREGAR DADOS ---
 @st.cache_data
@@ -302,14 +264,15 @@ if not df_os.empty and 'ordem_servico' in df_os.columns and not df_os['ordem_ser
         with col_acao2:
             if email_cliente and pd.notnull(email_cliente):
                 if st.button("✉️ Enviar por Email", use_container_width=True, type="primary"):
-                    with st.spinner(f"Enviando para {email_cliente}..."):
-                        enviar_pdf_por_email(
-                            destinatario=email_cliente,
-                            assunto=f"Relatório de Serviço - O.S. {os_details.get('ordem_servico')}",
-                            corpo=mensagem_envio,
-                            dados_pdf=pdf_bytes,
-                            nome_arquivo_pdf=nome_arquivo
-                        )
+                    enviar_pdf_por_email(
+                        destinatario=email_cliente,
+                        assunto=f"Relatório de Serviço - O.S. {os_details.get('ordem_servico')}",
+                        corpo=mensagem_envio,
+                        dados_pdf=pdf_bytes,
+                        nome_arquivo_pdf=nome_arquivo,
+                        cliente=os_details.get('cliente'),
+                        referencia=f"O.S. {os_details.get('ordem_servico')}"
+                    )
             else:
                 st.button("✉️ Enviar por Email", use_container_width=True, disabled=True)
                 st.caption("Cliente sem email cadastrado.")
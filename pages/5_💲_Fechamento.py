@@ -4,12 +4,10 @@ import yaml
 from yaml.loader import SafeLoader
 import pandas as pd
 from sqlalchemy import create_engine
-from fpdf import FPDF
 from datetime import datetime, date
 from urllib.parse import quote
 import re
-import smtplib
-from email.message import EmailMessage
+import time
 
 # --- CONFIGURAÇÃO DA PÁGINA ---
 st.set_page_config(page_title="Fechamento Mensal", page_icon="💲", layout="wide")
@@ -30,6 +28,12 @@ authenticator = None
 import os, sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from menu import exibir_menu
+from correio import enfileirar_envio, registrar_envio, exibir_status_envios
+from relatorio_fechamento import (
+    buscar_servicos_periodo, gerar_pdf_fechamento, nome_arquivo_fechamento,
+    gerar_fechamentos_em_lote, montar_resumo_lote, adicionar_resumo_lote
+)
+from pacote_zip import PacoteZip
 exibir_menu()
 
 st.title("💲 Relatório de Fechamento por Cliente")
@@ -37,88 +41,20 @@ st.title("💲 Relatório de Fechamento por Cliente")
 # Conexão com o banco de dados
 connection_url = st.secrets["database"]["connection_url"]
 engine = create_engine(connection_url)
-
-# --- CLASSE PDF ---
-class PDF(FPDF):
-    def header(self):
-        empresa_razao_social = "Elite CNC Service"
-        empresa_cnpj = "CNPJ: 61.159.425/0001-32"
-        empresa_endereco = "Rua da Paz, 230 - Santa Rita - Monte Alto SP"
-        empresa_contato = "Tel: (11) 97761-7009 | Email: elitecncservice@gmail.com"
-        empresa_site = "www.elitecncservice.com.br"
-        try:
-            self.image('logo.png', 10, 1, 50)
-        except FileNotFoundError:
-            self.set_xy(10, 8)
-            self.set_font('Arial', 'B', 12)
-            self.cell(50, 10, 'Logo N/A', 0, 1, 'L')
-        self.set_font('DejaVu', '', 9)
-        self.set_y(8); self.set_x(-105)
-        self.cell(100, 5, empresa_razao_social, 0, 1, 'R'); self.set_x(-105)
-        self.cell(100, 5, empresa_cnpj, 0, 1, 'R'); self.set_x(-105)
-        self.cell(100, 5, empresa_endereco, 0, 1, 'R'); self.set_x(-105)
-        self.cell(100, 5, empresa_contato, 0, 1, 'R'); self.set_x(-105)
-        self.cell(100, 5, empresa_site, 0, 1, 'R')
-        self.set_y(35)
-        self.set_line_width(0.5)
-        self.line(10, self.get_y(), 200, self.get_y())
-        self.ln(3)
-        self.set_font('DejaVu', 'B', 16)
-        self.cell(0, 10, 'RELATÓRIO DE FECHAMENTO', 0, 1, 'C')
-        self.ln(5)
-
-    def footer(self):
-        self.set_y(-15)
-        self.set_font('DejaVu', 'I', 8)
-        self.cell(0, 10, f'Página {self.page_no()}', 0, 0, 'C')
+exibir_status_envios(engine)
 
 # --- FUNÇÃO EMAIL ---
-def enviar_pdf_por_email(destinatario, assunto, corpo, dados_pdf, nome_arquivo_pdf):
+def enviar_pdf_por_email(destinatario, assunto, corpo, dados_pdf, nome_arquivo_pdf, cliente=None, referencia=None):
     try:
-        remetente = st.secrets["email_credentials"]["username"]
-        senha = st.secrets["email_credentials"]["password"]
-        msg = EmailMessage()
-        msg['Subject'], msg['From'], msg['To'] = assunto, remetente, destinatario
-        msg.set_content(corpo)
-        
-        corpo_html = corpo.replace('\n', '<br>')
-        html_content = f"""\
-        <html>
-            <body style="font-family: Arial, sans-serif; color: #333333; line-height: 1.6;">
-                <p>{corpo_html}</p>
-                <br>
-                <table border="0" cellpadding="0" cellspacing="0" style="font-family: Arial, sans-serif; color: #333333; line-height: 1.4;">
-                    <tr>
-                        <td style="padding-right: 15px; border-right: 2px solid #cccccc;">
-                            <a href='https://postimg.cc/fVNyZqpf' target='_blank'>
-                                <img src='https://i.postimg.cc/fVNyZqpf/Whats-App-Image-2025-01-06-at-16-03-50.jpg' border='0' alt='Elite CNC Service' style='max-width: 140px; height: auto;'>
-                            </a>
-                        </td>
-                        <td style="padding-left: 15px;">
-                            <strong style="font-size: 16px;">Filipe Guimarães</strong><br>
-                            <span style="font-size: 14px; color: #666666;">Sócio Proprietário</span><br>
-                            <span style="font-size: 13px;">
-                            📞 WhatsApp: (11) 97761-7009<br>
-                            ✉️ elitecncservice@gmail.com<br>
-                            🌐 <a href="http://www.elitecncservice.com.br" style="color: #0056b3; text-decoration: none;">www.elitecncservice.com.br</a>
-                            </span>
-                        </td>
-                    </tr>
-                </table>
-            </body>
-        </html>
-        """
-        msg.add_alternative(html_content, subtype='html')
-        
-        msg.add_attachment(dados_pdf, maintype='application', subtype='pdf', filename=nome_arquivo_pdf)
-        with smtplib.SMTP_SSL('smtp.gmail.com', 465) as smtp:
-            smtp.login(remetente, senha)
-            smtp.send_message(msg)
-        st.success(f"Email enviado para {destinatario} com sucesso!")
-        return True
+        envio = enfileirar_envio(
+            engine, st.secrets["email_credentials"], destinatario, assunto, corpo, [{'nome': nome_arquivo_pdf, 'dados': dados_pdf}],
+            cliente=cliente, referencia=referencia, usuario=st.session_state.get("username")
+        )
     except Exception as e:
-        st.error(f"Erro ao enviar email: {e}")
+        st.error(f"Erro ao colocar o email na fila de envio: {e}")
         return False
+    registrar_envio(envio, destinatario)
+    return True
 
 # --- FUNÇÕES DE DADOS ---
 @st.cache_data
@@ -134,16 +70,7 @@ def carregar_clientes_e_dados():
 
 def buscar_servicos_cliente(cliente, data_inicio, data_fim):
     try:
-        # Query original para buscar todos os serviços
-        query = f"""
-        SELECT data, ordem_servico, maquina, patrimonio, valor_atendimento
-        FROM entradas
-        WHERE cliente = '{cliente}' 
-          AND date(data) BETWEEN '{data_inicio}' AND '{data_fim}'
-          AND status NOT IN ('Negociado', 'Cancelado')
-        ORDER BY data ASC
-        """
-        return pd.read_sql_query(query, engine, parse_dates=['data'])
+        return buscar_servicos_periodo(engine, data_inicio, data_fim, cliente=cliente).drop(columns=['cliente'])
     except Exception as e:
         st.error(f"Erro ao buscar serviços: {e}")
         return pd.DataFrame()
@@ -190,81 +117,9 @@ if 'servicos_df' in st.session_state and not st.session_state.servicos_df.empty:
     st.subheader("Ações do Relatório")
 
     # --- PDF ---
-    pdf = PDF()
-    try:
-        pdf.add_font('DejaVu', '', 'DejaVuSans.ttf')
-        pdf.add_font('DejaVu', 'B', 'DejaVuSans-Bold.ttf')
-        pdf.add_font('DejaVu', 'I', 'DejaVuSans-Oblique.ttf')
-    except:
-        pass
-
     dados_cliente = df_clientes[df_clientes['nome'] == cliente_selecionado].iloc[0]
-    telefone_cliente = dados_cliente.get('telefone')
-    email_cliente = dados_cliente.get('email')
-    cnpj_cliente = dados_cliente.get('cnpj')
-
-    pdf.add_page()
-    pdf.set_auto_page_break(auto=True, margin=15)
-
-    # Cliente (coluna esquerda)
-    pdf.set_xy(10, 50)
-    pdf.set_font('DejaVu', 'B', 12)
-    pdf.cell(95, 8, 'DADOS DO CLIENTE', 'B', 1, 'L')
-    pdf.set_font('DejaVu', '', 10)
-    pdf.set_x(10)
-    pdf.multi_cell(
-        95, 6,
-        f"Nome: {cliente_selecionado}\n"
-        f"CNPJ: {cnpj_cliente if pd.notnull(cnpj_cliente) else 'N/A'}\n"
-        f"Telefone: {telefone_cliente if pd.notnull(telefone_cliente) else 'N/A'}\n"
-        f"Email: {email_cliente if pd.notnull(email_cliente) else 'N/A'}"
-    )
-
-    # Período (coluna direita)
-    pdf.set_xy(110, 50)
-    pdf.set_font('DejaVu', 'B', 12)
-    pdf.cell(95, 8, 'PERÍODO REFERENTE', 'B', 1, 'L')
-    pdf.set_font('DejaVu', '', 10)
-    pdf.set_x(110)
-    pdf.multi_cell(
-        95, 6,
-        f"Data Inicial: {data_inicio.strftime('%d/%m/%Y')}\n"
-        f"Data Final: {data_fim.strftime('%d/%m/%Y')}"
-    )
-
-    # Tabela
-    pdf.ln(40)
-    pdf.set_font('DejaVu', 'B', 12)
-    pdf.cell(0, 8, 'SERVIÇOS REALIZADOS NO PERÍODO', 'B', 1, 'L')
-    pdf.ln(2)
-
-    pdf.set_font('DejaVu', 'B', 10)
-    pdf.cell(25, 7, 'Data', 1, 0, 'C')
-    pdf.cell(30, 7, 'Nº O.S.', 1, 0, 'C')
-    pdf.cell(65, 7, 'Máquina', 1, 0, 'C')
-    pdf.cell(30, 7, 'Patrimônio', 1, 0, 'C')
-    pdf.cell(40, 7, 'Valor Total', 1, 1, 'C')
-
-    pdf.set_font('DejaVu', '', 10)
-    for _, row in servicos_df.iterrows():
-        pdf.cell(25, 7, row['data'].strftime('%d/%m/%Y'), 1, 0, 'C')
-        pdf.cell(30, 7, str(row['ordem_servico']), 1, 0, 'C')
-        
-        # MultiCell para máquina
-        x_atual = pdf.get_x()
-        y_atual = pdf.get_y()
-        pdf.multi_cell(65, 7, str(row['maquina']), 1, 'L')
-        pdf.set_xy(x_atual + 65, y_atual)
-
-        pdf.cell(30, 7, str(row.get('patrimonio', '')), 1, 0, 'C')
-        pdf.cell(40, 7, f"R$ {row['valor_atendimento']:.2f}".replace('.',','), 1, 1, 'R')
-
-    pdf.set_font('DejaVu', 'B', 11)
-    pdf.cell(150, 8, 'VALOR TOTAL A PAGAR', 1, 0, 'R') # Ajustado para 150 (25+30+65+30)
-    pdf.cell(40, 8, f"R$ {total_a_pagar:.2f}".replace('.',','), 1, 1, 'R')
-
-    pdf_bytes = bytes(pdf.output())
-    nome_arquivo = f"Fechamento_{cliente_selecionado.replace(' ', '_')}_{data_inicio.strftime('%Y%m%d')}-{data_fim.strftime('%Y%m%d')}.pdf"
+    pdf_bytes = gerar_pdf_fechamento(cliente_selecionado, dados_cliente.to_dict(), servicos_df, data_inicio, data_fim)
+    nome_arquivo = nome_arquivo_fechamento(cliente_selecionado, data_inicio, data_fim)
 
     # Botão Download
     st.download_button(
@@ -324,14 +179,84 @@ Atenciosamente,
     with col2:
         if email_cliente and pd.notnull(email_cliente):
             if st.button("✉️ Enviar por Email com Anexo", use_container_width=True, type="primary"):
-                with st.spinner(f"Enviando para {email_cliente}..."):
-                    enviar_pdf_por_email(
-                        destinatario=email_cliente,
-                        assunto=f"Fechamento de Serviços - {cliente_selecionado}",
-                        corpo=mensagem_envio,
-                        dados_pdf=pdf_bytes,
-                        nome_arquivo_pdf=nome_arquivo
-                    )
+                enviar_pdf_por_email(
+                    destinatario=email_cliente,
+                    assunto=f"Fechamento de Serviços - {cliente_selecionado}",
+                    corpo=mensagem_envio,
+                    dados_pdf=pdf_bytes,
+                    nome_arquivo_pdf=nome_arquivo,
+                    cliente=cliente_selecionado,
+                    referencia=f"{data_inicio:%Y-%m-%d}/{data_fim:%Y-%m-%d}"
+                )
         else:
             st.button("✉️ Enviar por Email com Anexo", use_container_width=True, disabled=True)
             st.caption("Cliente sem email.")
+
+# --- FECHAMENTO EM LOTE ---
+st.markdown("---")
+with st.container(border=True):
+    st.subheader("📚 Fechamento em Lote (Todos os Clientes)")
+    st.caption("Gera o fechamento de todos os clientes com serviços no período de uma só vez: um ZIP com os PDFs de cada cliente e uma planilha-resumo com os totais.")
+
+    col_lote1, col_lote2 = st.columns(2)
+    with col_lote1:
+        lote_inicio = st.date_input("Data Inicial", value=datetime.now().replace(day=1), key="lote_data_inicio")
+    with col_lote2:
+        lote_fim = st.date_input("Data Final", value=date.today(), key="lote_data_fim")
+
+    if st.button("📚 Gerar Fechamento de Todos os Clientes", use_container_width=True):
+        inicio_execucao = time.perf_counter()
+        with st.spinner("Gerando os fechamentos de todos os clientes..."):
+            try:
+                servicos_lote = buscar_servicos_periodo(engine, lote_inicio, lote_fim)
+            except Exception as e:
+                st.error(f"Erro ao buscar serviços: {e}")
+                servicos_lote = pd.DataFrame()
+
+            # Descarta o pacote anterior (e o arquivo temporário dele) antes de gerar outro
+            lote_anterior = st.session_state.pop('lote_fechamento', None)
+            if lote_anterior:
+                lote_anterior['pacote'].descartar()
+
+            if servicos_lote.empty:
+                st.warning("Nenhum serviço faturável encontrado no período selecionado.")
+            else:
+                pacote = PacoteZip(f"Fechamentos_{lote_inicio.strftime('%Y%m%d')}-{lote_fim.strftime('%Y%m%d')}.zip")
+                resultados = gerar_fechamentos_em_lote(servicos_lote, df_clientes, lote_inicio, lote_fim, pacote)
+                resumo_df = montar_resumo_lote(resultados)
+                adicionar_resumo_lote(pacote, resumo_df, lote_inicio, lote_fim)
+                pacote.fechar()
+                st.session_state.lote_fechamento = {
+                    'pacote': pacote,
+                    'resumo': resumo_df,
+                    'duracao': time.perf_counter() - inicio_execucao,
+                }
+
+    if 'lote_fechamento' in st.session_state:
+        lote = st.session_state.lote_fechamento
+        resumo_df = lote['resumo']
+
+        c_res1, c_res2, c_res3 = st.columns(3)
+        c_res1.metric("👥 Clientes", len(resumo_df))
+        c_res2.metric("💰 Total Geral", f"R$ {resumo_df['total'].sum():,.2f}")
+        c_res3.metric("⏱️ Tempo de Geração", f"{lote['duracao']:.1f} s")
+
+        st.dataframe(
+            resumo_df,
+            column_config={
+                "cliente": "Cliente",
+                "qtd_servicos": st.column_config.NumberColumn("Serviços", format="%d"),
+                "total": st.column_config.NumberColumn("Total (R$)", format="R$ %.2f"),
+                "email": "Email",
+                "arquivo": "Arquivo",
+            },
+            use_container_width=True,
+            hide_index=True
+        )
+        st.download_button(
+            label=f"📦 Baixar ZIP com {len(resumo_df)} Fechamento(s)",
+            data=lote['pacote'].ler,
+            file_name=lote['pacote'].nome_arquivo,
+            mime="application/zip",
+            use_container_width=True
+        )
@@ -1,6 +1,4 @@
 import streamlit as st
-import pandas as pd
-import io
 import plotly.graph_objects as go
 import plotly.express as px
 from sqlalchemy import create_engine
@@ -18,48 +16,29 @@ if "authentication_status" not in st.session_state or not st.session_state["auth
 import os, sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from menu import exibir_menu
+from exportacao import MIME_EXCEL, coluna_excel, exportar_consultas
+from graficos import grafico_pizza
+from fluxo_caixa import (
+    composicao_fluxo, consulta_extrato, extrato_fluxo, fluxo_agrupado, maiores_despesas, periodo_fluxo, resumo_fluxo
+)
 exibir_menu()
 
+COLUNAS_EXCEL_EXTRATO = [
+    coluna_excel('data', 'Data', 'data_hora'),
+    coluna_excel('tipo', 'Tipo', largura=10),
+    coluna_excel('categoria', 'Categoria'),
+    coluna_excel('descricao', 'Descrição', largura=45),
+    coluna_excel('status_pagamento', 'Situação', largura=12),
+    coluna_excel('valor', 'Valor', 'moeda'),
+    coluna_excel('saldo_acumulado', 'Saldo Acumulado', 'moeda'),
+]
+
 def main():
     st.title("🌊 Fluxo de Caixa")
 
     connection_url = st.secrets["database"]["connection_url"]
     engine = create_engine(connection_url)
 
-    @st.cache_data(ttl=300)
-    def carregar_transacoes(incluir_pendentes):
-        try:
-            # 1. REALIZADO (Pago) - Baseado na data de pagamento
-            q_ent_pago = "SELECT data_pagamento as data, descricao_servico as descricao, valor_atendimento as valor, 'Pago' as status_pagamento, cliente as categoria FROM entradas WHERE status = 'Pago' AND data_pagamento IS NOT NULL"
-            q_sai_pago = "SELECT data_pagamento as data, descricao, valor, 'Pago' as status_pagamento, tipo_conta as categoria FROM saidas WHERE status = 'Pago' AND data_pagamento IS NOT NULL"
-            
-            entradas_df = pd.read_sql_query(q_ent_pago, engine, parse_dates=['data'])
-            saidas_df = pd.read_sql_query(q_sai_pago, engine, parse_dates=['data'])
-            
-            # 2. PROJETADO (Pendente) - Baseado na data de vencimento (se solicitado)
-            if incluir_pendentes:
-                q_ent_pend = "SELECT data, descricao_servico as descricao, valor_atendimento as valor, 'Previsto' as status_pagamento, cliente as categoria FROM entradas WHERE status = 'Pendente'"
-                q_sai_pend = "SELECT data, descricao, valor, 'Previsto' as status_pagamento, tipo_conta as categoria FROM saidas WHERE status = 'Pendente'"
-                
-                ent_pend_df = pd.read_sql_query(q_ent_pend, engine, parse_dates=['data'])
-                sai_pend_df = pd.read_sql_query(q_sai_pend, engine, parse_dates=['data'])
-                
-                entradas_df = pd.concat([entradas_df, ent_pend_df])
-                saidas_df = pd.concat([saidas_df, sai_pend_df])
-
-            entradas_df['tipo'] = 'Entrada'
-            saidas_df['tipo'] = 'Saída'
-            saidas_df['valor'] = saidas_df['valor'] * -1
-            
-            transacoes_df = pd.concat([entradas_df, saidas_df], ignore_index=True)
-            # Remove linhas onde a data é nula (pode acontecer se houver dados inconsistentes)
-            transacoes_df.dropna(subset=['data'], inplace=True)
-            transacoes_df.sort_values(by='data', inplace=True)
-            return transacoes_df
-            
-        except Exception:
-            return pd.DataFrame()
-
     # --- FILTROS NO TOPO (LAYOUT MELHORADO) ---
     with st.container(border=True):
         col_f1, col_f2, col_f3 = st.columns([1, 1, 2])
@@ -73,14 +52,11 @@ def main():
             index=1 # Padrão para 'Dia'
         )
         
-        df_transacoes = carregar_transacoes(incluir_previsao)
-
-        if not df_transacoes.empty:
-            min_date = df_transacoes['data'].min().date()
-            max_date = df_transacoes['data'].max().date()
-        else:
-            min_date = date.today()
-            max_date = date.today()
+        # Só as datas extremas; os movimentos são lidos depois, já limitados ao período escolhido
+        min_date, max_date = periodo_fluxo(engine, incluir_previsao)
+        sem_movimentos = min_date is None
+        if sem_movimentos:
+            min_date = max_date = date.today()
             
         data_range = col_f3.date_input(
             "🗓️ Período de Análise:",
@@ -89,33 +65,26 @@ def main():
             max_value=max_date
         )
         
-        if isinstance(data_range, list) and len(data_range) == 2:
+        # O date_input devolve uma tupla; durante a seleção ela tem só a data inicial
+        if len(data_range) == 2:
             data_inicio, data_fim = data_range
         else:
             data_inicio, data_fim = min_date, max_date
 
-    if df_transacoes.empty:
+    if sem_movimentos:
         st.info("Não há lançamentos para exibir o fluxo de caixa com os filtros atuais.")
     else:
-        # --- FILTRANDO OS DADOS ---
-        df_filtrado = df_transacoes[
-            (df_transacoes['data'].dt.date >= data_inicio) & 
-            (df_transacoes['data'].dt.date <= data_fim)
-        ].copy()
+        # --- TOTAIS DO PERÍODO (somados no banco; as linhas só são lidas no Detalhado e no extrato) ---
+        resumo = resumo_fluxo(engine, incluir_previsao, data_inicio, data_fim, saldo_inicial)
 
-        if df_filtrado.empty:
+        if not resumo['quantidade']:
             st.warning("Nenhum dado encontrado para o período selecionado.")
         else:
-            df_filtrado.reset_index(drop=True, inplace=True)
-
             # --- MÉTRICAS RESUMIDAS ---
-            saldo_final = saldo_inicial + df_filtrado['valor'].sum()
-            total_entradas = df_filtrado[df_filtrado['tipo'] == 'Entrada']['valor'].sum()
-            total_saidas = df_filtrado[df_filtrado['tipo'] == 'Saída']['valor'].sum() # Já é negativo
+            total_entradas = resumo['entradas']
+            total_saidas = resumo['saidas'] # Já é negativo
             resultado_liquido = total_entradas + total_saidas # Soma de valores positivos e negativos
-            
-            # Calcula saldo para cada transação para encontrar picos e vales
-            df_filtrado['saldo_acumulado'] = saldo_inicial + df_filtrado['valor'].cumsum()
+            saldo_final = saldo_inicial + resultado_liquido
             
             with st.container(border=True):
                 st.subheader("📊 Resumo Financeiro")
@@ -126,17 +95,16 @@ def main():
                 col4.metric("🔴 Saídas", f"R$ {abs(total_saidas):,.2f}")
                 col5.metric("💧 Líquido", f"R$ {resultado_liquido:,.2f}", delta_color="normal" if resultado_liquido >= 0 else "inverse")
 
-            # --- ALERTA DE SALDO NEGATIVO ---
-            min_saldo = df_filtrado['saldo_acumulado'].min()
-            if min_saldo < 0:
-                data_negativo = df_filtrado[df_filtrado['saldo_acumulado'] < 0]['data'].iloc[0]
-                st.error(f"🚨 ALERTA DE CAIXA: O saldo ficará negativo (R$ {min_saldo:,.2f}) em {data_negativo.strftime('%d/%m/%Y')}. Verifique as previsões!", icon="📉")
+            # --- ALERTA DE SALDO NEGATIVO (menor saldo após cada transação, calculado no banco) ---
+            if resumo['primeira_data_negativa'] is not None:
+                st.error(f"🚨 ALERTA DE CAIXA: O saldo ficará negativo (R$ {resumo['menor_saldo']:,.2f}) em {resumo['primeira_data_negativa'].strftime('%d/%m/%Y')}. Verifique as previsões!", icon="📉")
 
             # --- LÓGICA DE AGRUPAMENTO E GRÁFICOS ---
             with st.container(border=True):
                 st.subheader(f"📈 Evolução do Caixa ({agrupamento})")
 
                 if agrupamento == 'Detalhado':
+                    df_filtrado = extrato_fluxo(engine, incluir_previsao, data_inicio, data_fim, saldo_inicial)
                     fig = go.Figure()
                     fig.add_trace(go.Bar(
                         x=df_filtrado['data'], y=df_filtrado['valor'], name='Transação',
@@ -150,19 +118,9 @@ def main():
                     ))
                     fig.update_layout(hovermode='x unified', margin=dict(l=0, r=0, t=30, b=0))
                 else:
-                    # Lógica para agrupar por Dia, Semana ou Mês
-                    if agrupamento == 'Dia':
-                        grouper = pd.Grouper(key='data', freq='D')
-                        date_format = "%d/%m/%Y"
-                    elif agrupamento == 'Semana':
-                        grouper = pd.Grouper(key='data', freq='W-MON')
-                        date_format = "Semana %d/%m"
-                    else: # Mês
-                        grouper = pd.Grouper(key='data', freq='MS')
-                        date_format = "%B/%Y"
-
-                    df_agrupado = df_filtrado.groupby(grouper)['valor'].sum().reset_index()
-                    # df_agrupado = df_agrupado[df_agrupado['valor'] != 0]
+                    # Agrupamento por Dia, Semana ou Mês feito no banco (date_trunc)
+                    date_format = {'Dia': "%d/%m/%Y", 'Semana': "Semana %d/%m", 'Mês': "%B/%Y"}[agrupamento]
+                    df_agrupado = fluxo_agrupado(engine, incluir_previsao, data_inicio, data_fim, agrupamento)
 
                     # Gráfico de Cascata (Waterfall)
                     fig = go.Figure(go.Waterfall(
@@ -202,20 +160,22 @@ def main():
             with st.container(border=True):
                 st.subheader("🍰 Composição do Fluxo")
                 col_pie1, col_pie2 = st.columns(2)
+                # As pizzas dependem só do período e da previsão (não do saldo inicial)
+                assinatura_pizzas = (incluir_previsao, data_inicio, data_fim)
+                df_composicao = composicao_fluxo(engine, incluir_previsao, data_inicio, data_fim)
                 
                 with col_pie1:
-                    df_entradas_pie = df_filtrado[df_filtrado['valor'] > 0]
+                    df_entradas_pie = df_composicao[df_composicao['lado'] == 'Receita']
                     if not df_entradas_pie.empty:
-                        fig_pie1 = px.pie(df_entradas_pie, values='valor', names='categoria', title='Receitas por Cliente', hole=0.4)
+                        fig_pie1 = grafico_pizza("fluxo_receitas", assinatura_pizzas, df_entradas_pie, 'categoria', 'valor', titulo='Receitas por Cliente', buraco=0.4)
                         st.plotly_chart(fig_pie1, use_container_width=True)
                     else:
                         st.info("Sem entradas no período.")
 
                 with col_pie2:
-                    df_saidas_pie = df_filtrado[df_filtrado['valor'] < 0].copy()
-                    df_saidas_pie['valor'] = df_saidas_pie['valor'].abs() # Converte para positivo para o gráfico
+                    df_saidas_pie = df_composicao[df_composicao['lado'] == 'Despesa'] # Já em módulo
                     if not df_saidas_pie.empty:
-                        fig_pie2 = px.pie(df_saidas_pie, values='valor', names='categoria', title='Despesas por Categoria', hole=0.4)
+                        fig_pie2 = grafico_pizza("fluxo_despesas", assinatura_pizzas, df_saidas_pie, 'categoria', 'valor', titulo='Despesas por Categoria', buraco=0.4)
                         st.plotly_chart(fig_pie2, use_container_width=True)
                     else:
                         st.info("Sem saídas no período.")
@@ -227,9 +187,8 @@ def main():
                 
                 with col_top1:
                     st.markdown("##### 🟢 Principais Clientes (Receita)")
-                    # Agrupa por cliente (categoria para entradas)
-                    df_top_receitas = df_filtrado[df_filtrado['valor'] > 0].groupby('categoria')['valor'].sum().reset_index()
-                    df_top_receitas = df_top_receitas.sort_values(by='valor', ascending=False).head(5)
+                    # Clientes (categoria das entradas) já somados no banco, do maior para o menor
+                    df_top_receitas = df_composicao[df_composicao['lado'] == 'Receita'].head(5)
                     
                     if not df_top_receitas.empty:
                         fig_top_rec = px.bar(
@@ -254,11 +213,8 @@ def main():
 
                 with col_top2:
                     st.markdown("##### 🔴 Principais Despesas (Descrição)")
-                    # Agrupa por descrição para detalhar a despesa
-                    df_top_despesas = df_filtrado[df_filtrado['valor'] < 0].copy()
-                    df_top_despesas['valor'] = df_top_despesas['valor'].abs()
-                    df_top_despesas = df_top_despesas.groupby('descricao')['valor'].sum().reset_index()
-                    df_top_despesas = df_top_despesas.sort_values(by='valor', ascending=False).head(5)
+                    # Agrupa por descrição para detalhar a despesa (no banco)
+                    df_top_despesas = maiores_despesas(engine, incluir_previsao, data_inicio, data_fim, 5)
                     
                     if not df_top_despesas.empty:
                         fig_top_desp = px.bar(
@@ -285,38 +241,42 @@ def main():
             with st.container(border=True):
                 st.subheader("📝 Extrato Detalhado")
                 
-                # Botão de Exportação
-                buffer = io.BytesIO()
-                with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-                    df_filtrado.to_excel(writer, index=False, sheet_name='Extrato')
-                
+                # Botão de Exportação (a planilha só é gerada no clique, lida do banco em lotes)
                 st.download_button(
                     label="📥 Baixar Extrato em Excel",
-                    data=buffer.getvalue(),
+                    data=lambda: exportar_consultas(engine, [{
+                        'nome': 'Extrato', 'colunas': COLUNAS_EXCEL_EXTRATO,
+                        **consulta_extrato(incluir_previsao, data_inicio, data_fim, saldo_inicial)
+                    }]),
                     file_name=f"Fluxo_Caixa_{data_inicio}_{data_fim}.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                    mime=MIME_EXCEL
                 )
 
-                def colorir_valores(val):
-                    color = '#28a745' if val > 0 else '#dc3545' if val < 0 else 'black'
-                    return f'color: {color}; font-weight: bold;'
+                # As linhas do período só são carregadas no Detalhado ou quando o extrato é pedido
+                mostrar_extrato = agrupamento == 'Detalhado' or st.toggle(f"Mostrar os {resumo['quantidade']} lançamentos do período", key="fluxo_mostrar_extrato")
+                if mostrar_extrato:
+                    df_filtrado = extrato_fluxo(engine, incluir_previsao, data_inicio, data_fim, saldo_inicial)
+
+                    def colorir_valores(val):
+                        color = '#28a745' if val > 0 else '#dc3545' if val < 0 else 'black'
+                        return f'color: {color}; font-weight: bold;'
                 
-                df_display = df_filtrado[['data', 'descricao', 'categoria', 'status_pagamento', 'valor', 'saldo_acumulado']].copy()
+                    df_display = df_filtrado[['data', 'descricao', 'categoria', 'status_pagamento', 'valor', 'saldo_acumulado']].copy()
                 
-                st.dataframe(
-                    df_display.style.applymap(colorir_valores, subset=['valor']).format({'valor': 'R$ {:,.2f}', 'saldo_acumulado': 'R$ {:,.2f}'}),
-                    column_config={
-                        "data": st.column_config.DatetimeColumn("Data", format="DD/MM/YYYY - HH:mm"), 
-                        "descricao": "Descrição", 
-                        "categoria": "Categoria/Cliente",
-                        "status_pagamento": "Status",
-                        "valor": "Valor (R$)", 
-                        "saldo_acumulado": "Saldo (R$)"
-                    },
-                    use_container_width=True,
-                    hide_index=True,
-                    height=400
-                )
+                    st.dataframe(
+                        df_display.style.map(colorir_valores, subset=['valor']).format({'valor': 'R$ {:,.2f}', 'saldo_acumulado': 'R$ {:,.2f}'}),
+                        column_config={
+                            "data": st.column_config.DatetimeColumn("Data", format="DD/MM/YYYY - HH:mm"), 
+                            "descricao": "Descrição", 
+                            "categoria": "Categoria/Cliente",
+                            "status_pagamento": "Status",
+                            "valor": "Valor (R$)", 
+                            "saldo_acumulado": "Saldo (R$)"
+                        },
+                        use_container_width=True,
+                        hide_index=True,
+                        height=400
+                    )
 
 if __name__ == "__main__":
     if st.session_state.get("authentication_status"):
@@ -1,10 +1,8 @@
 import streamlit as st
 import pandas as pd
 from sqlalchemy import create_engine
-from email.message import EmailMessage
 import re
 from urllib.parse import quote
-import smtplib
 from datetime import datetime, timedelta
 
 # --- CONFIGURAÇÃO DA PÁGINA E CONEXÃO COM DB ---
@@ -25,6 +23,8 @@ elif st.session_state["authentication_status"] is None:
 import os, sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from menu import exibir_menu
+from correio import enfileirar_envio, enfileirar_envios, registrar_envio, exibir_status_envios
+from documentos_fiscais import IndiceClientes, analisar_boletos
 exibir_menu()
 
 st.title("💸 Enviar Boleto Bancário")
@@ -33,6 +33,7 @@ st.markdown("Envie boletos de cobrança para seus clientes via E-mail e WhatsApp
 # Conexão com o banco de dados
 connection_url = st.secrets["database"]["connection_url"]
 engine = create_engine(connection_url)
+exibir_status_envios(engine)
 
 # --- FUNÇÕES AUXILIARES ---
 
@@ -41,69 +42,36 @@ def carregar_clientes():
     """Carrega os clientes do banco de dados para o selectbox."""
     try:
         clientes_df = pd.read_sql_query(
-            "SELECT nome, email, telefone FROM clientes ORDER BY nome",
+            "SELECT nome, email, telefone, cnpj FROM clientes ORDER BY nome",
             engine
         )
         return clientes_df
     except Exception as e:
         st.error(f"Erro ao carregar clientes: {e}")
-        return pd.DataFrame(columns=['nome', 'email'])
+        return pd.DataFrame(columns=['nome', 'email', 'telefone', 'cnpj'])
 
-def enviar_email_com_anexos(destinatario, assunto, corpo, lista_anexos):
-    """Envia um email com múltiplos anexos em PDF."""
+def enviar_email_com_anexos(destinatario, assunto, corpo, lista_anexos, cliente=None, referencia=None):
+    """Coloca na fila um email com múltiplos anexos em PDF."""
     try:
-        remetente = st.secrets["email_credentials"]["username"]
-        senha = st.secrets["email_credentials"]["password"]
-        
-        msg = EmailMessage()
-        msg['Subject'] = assunto
-        msg['From'] = remetente
-        msg['To'] = destinatario
-        msg.set_content(corpo)
-        
-        corpo_html = corpo.replace('\n', '<br>')
-        html_content = f"""\
-        <html>
-            <body style="font-family: Arial, sans-serif; color: #333333; line-height: 1.6;">
-                <p>{corpo_html}</p>
-                <br>
-                <table border="0" cellpadding="0" cellspacing="0" style="font-family: Arial, sans-serif; color: #333333; line-height: 1.4;">
-                    <tr>
-                        <td style="padding-right: 15px; border-right: 2px solid #cccccc;">
-                            <a href='https://postimg.cc/fVNyZqpf' target='_blank'>
-                                <img src='https://i.postimg.cc/fVNyZqpf/Whats-App-Image-2025-01-06-at-16-03-50.jpg' border='0' alt='Elite CNC Service' style='max-width: 140px; height: auto;'>
-                            </a>
-                        </td>
-                        <td style="padding-left: 15px;">
-                            <strong style="font-size: 16px;">Filipe Guimarães</strong><br>
-                            <span style="font-size: 14px; color: #666666;">Sócio Proprietário</span><br>
-                            <span style="font-size: 13px;">
-                            📞 WhatsApp: (11) 97761-7009<br>
-                            ✉️ elitecncservice@gmail.com<br>
-                            🌐 <a href="http://www.elitecncservice.com.br" style="color: #0056b3; text-decoration: none;">www.elitecncservice.com.br</a>
-                            </span>
-                        </td>
-                    </tr>
-                </table>
-            </body>
-        </html>
-        """
-        msg.add_alternative(html_content, subtype='html')
-        
-        # Adiciona os anexos
-        for anexo in lista_anexos:
-            msg.add_attachment(anexo['dados'], maintype='application', subtype='pdf', filename=anexo['nome'])
-        
-        with smtplib.SMTP_SSL('smtp.gmail.com', 465) as smtp:
-            smtp.login(remetente, senha)
-            smtp.send_message(msg)
-            
-        st.success(f"Email com boleto(s) enviado para {destinatario} com sucesso!")
-        return True
+        envio = enfileirar_envio(
+            engine, st.secrets["email_credentials"], destinatario, assunto, corpo, lista_anexos,
+            cliente=cliente, referencia=referencia, usuario=st.session_state.get("username")
+        )
     except Exception as e:
-        st.error(f"Erro ao enviar email: {e}")
-        st.error("Verifique as credenciais em secrets.toml e sua Senha de App.")
+        st.error(f"Erro ao colocar o email na fila de envio: {e}")
         return False
+    registrar_envio(envio, destinatario)
+    return True
+
+def montar_corpo_boleto(cliente, mes_referencia):
+    return f"""Prezado(a) {cliente},
+
+Segue em anexo os boletos referente ao fechamento de {mes_referencia}.
+
+Qualquer dúvida, estamos à disposição.
+
+Atenciosamente,
+"""
 
 def get_sugestao_mes_anterior():
     """Retorna uma string com o Mês/Ano anterior ao atual (ex: Janeiro/2024)."""
@@ -155,14 +123,7 @@ else:
                 
                 # Configuração do Email
                 assunto_padrao = f"Boleto Bancário - {cliente_selecionado} - Ref. {mes_referencia}"
-                corpo_padrao = f"""Prezado(a) {cliente_selecionado},
-
-Segue em anexo os boletos referente ao fechamento de {mes_referencia}.
-
-Qualquer dúvida, estamos à disposição.
-
-Atenciosamente,
-"""
+                corpo_padrao = montar_corpo_boleto(cliente_selecionado, mes_referencia)
                 st.markdown("##### 📧 Configuração do Email")
                 assunto = st.text_input("Assunto:", value=assunto_padrao)
                 corpo_email = st.text_area("Mensagem:", value=corpo_padrao, height=150)
@@ -194,6 +155,98 @@ Atenciosamente,
                     # --- Botão Email ---
                     if st.button(f"✉️ Enviar Email", type="primary", use_container_width=True):
                         lista_anexos = [{'nome': f.name, 'dados': f.getvalue()} for f in uploaded_files]
-                        enviar_email_com_anexos(email_cliente, assunto, corpo_email, lista_anexos)
+                        enviar_email_com_anexos(email_cliente, assunto, corpo_email, lista_anexos, cliente=cliente_selecionado, referencia=mes_referencia)
         elif not uploaded_files:
-            st.info("👈 Selecione um cliente e anexe o(s) Boleto(s) para habilitar o envio.")
\ No newline at end of file
+            st.info("👈 Selecione um cliente e anexe o(s) Boleto(s) para habilitar o envio.")
+
+# --- ENVIO EM LOTE ---
+if lista_clientes_nomes:
+    st.markdown("---")
+    with st.container(border=True):
+        st.subheader("📚 Envio em Lote")
+        st.caption("Anexe os boletos de vários clientes de uma vez. O pagador (CNPJ ou nome) e o valor são lidos de cada PDF e o cliente é identificado automaticamente. Confira a tabela antes de enviar.")
+
+        col_lote1, col_lote2 = st.columns([1, 2])
+        with col_lote1:
+            mes_referencia_lote = st.text_input("Mês/Ano de Referência", value=get_sugestao_mes_anterior(), key="lote_mes_referencia")
+        with col_lote2:
+            arquivos_lote = st.file_uploader("Boletos (PDF)", type="pdf", accept_multiple_files=True, key="lote_boletos")
+
+        # Cada upload é identificado pelo file_id: dois arquivos com o mesmo nome continuam distintos
+        assinatura_lote = tuple(f.file_id for f in arquivos_lote or [])
+        if st.button("🔍 Ler Boletos e Identificar Clientes", use_container_width=True, disabled=not arquivos_lote):
+            with st.spinner(f"Lendo {len(arquivos_lote)} boleto(s)..."):
+                leituras = analisar_boletos([(f.name, f.getvalue()) for f in arquivos_lote])
+
+            indice = IndiceClientes(df_clientes)
+            emails = df_clientes.set_index('nome')['email'].dropna()
+            linhas = []
+            for arquivo, leitura in zip(arquivos_lote, leituras):
+                cliente, criterio = indice.encontrar(leitura['cnpj'], leitura['pagador'])
+                linhas.append({
+                    'enviar': cliente is not None and bool(emails.get(cliente['nome'])),
+                    'id_arquivo': arquivo.file_id,
+                    'arquivo': leitura['arquivo'],
+                    'cliente': cliente['nome'] if cliente else None,
+                    'criterio': criterio or (leitura['erro'] or 'Não identificado'),
+                    'pagador_lido': leitura['pagador'],
+                    'cnpj_lido': leitura['cnpj'],
+                    'valor': leitura['valor'],
+                    'vencimento': leitura['vencimento'],
+                })
+            st.session_state.boletos_lote = pd.DataFrame(linhas)
+            st.session_state.boletos_lote_arquivos = assinatura_lote
+
+        # A revisão só vale para o mesmo conjunto de arquivos que foi lido
+        if arquivos_lote and st.session_state.get('boletos_lote_arquivos') == assinatura_lote:
+            revisao = st.data_editor(
+                st.session_state.boletos_lote,
+                column_config={
+                    "enviar": st.column_config.CheckboxColumn("Enviar"),
+                    "id_arquivo": None,
+                    "arquivo": st.column_config.TextColumn("Arquivo", disabled=True),
+                    "cliente": st.column_config.SelectboxColumn("Cliente", options=df_clientes['nome'].tolist()),
+                    "criterio": st.column_config.TextColumn("Identificado por", disabled=True),
+                    "pagador_lido": st.column_config.TextColumn("Pagador (PDF)", disabled=True),
+                    "cnpj_lido": st.column_config.TextColumn("CNPJ (PDF)", disabled=True),
+                    "valor": st.column_config.NumberColumn("Valor", format="R$ %.2f", disabled=True),
+                    "vencimento": st.column_config.TextColumn("Vencimento", disabled=True),
+                },
+                use_container_width=True, hide_index=True, key="editor_boletos_lote"
+            )
+
+            selecionados = revisao[revisao['enviar'] & revisao['cliente'].notna()]
+            emails = df_clientes.set_index('nome')['email'].dropna()
+            sem_email = sorted(c for c in selecionados['cliente'].unique() if not emails.get(c))
+            if sem_email:
+                st.warning(f"Sem email cadastrado (serão ignorados): {', '.join(sem_email)}")
+            selecionados = selecionados[~selecionados['cliente'].isin(sem_email)]
+
+            st.metric("Boletos a enviar", f"{len(selecionados)} boleto(s) para {selecionados['cliente'].nunique()} cliente(s)")
+
+            if st.button("✉️ Enfileirar Todos os Emails", type="primary", use_container_width=True, disabled=selecionados.empty):
+                arquivos_por_id = {f.file_id: f for f in arquivos_lote}
+                envios = []
+                # Um email por cliente, com todos os boletos dele
+                for cliente, grupo in selecionados.groupby('cliente', sort=True):
+                    envios.append({
+                        'destinatario': emails[cliente],
+                        'assunto': f"Boleto Bancário - {cliente} - Ref. {mes_referencia_lote}",
+                        'corpo': montar_corpo_boleto(cliente, mes_referencia_lote),
+                        'anexos': [
+                            {'nome': nome, 'dados': arquivos_por_id[id_arquivo].getvalue()}
+                            for id_arquivo, nome in zip(grupo['id_arquivo'], grupo['arquivo'])
+                        ],
+                        'cliente': cliente,
+                        'referencia': mes_referencia_lote,
+                    })
+                try:
+                    resultados = enfileirar_envios(engine, st.secrets["email_credentials"], envios, usuario=st.session_state.get("username"))
+                    for envio, resultado in zip(envios, resultados):
+                        registrar_envio(resultado, envio['destinatario'], avisar=False)
+                    novos = sum(r['novo'] for r in resultados)
+                    st.success(f"{novos} email(s) colocados na fila de envio.")
+                    if novos < len(resultados):
+                        st.info(f"{len(resultados) - novos} email(s) com os mesmos boletos já estavam na fila ou enviados e não foram duplicados.")
+                except Exception as e:
+                    st.error(f"Erro ao colocar os emails na fila de envio: {e}")
@@ -1,10 +1,8 @@
 import streamlit as st
 import pandas as pd
 from sqlalchemy import create_engine
-from email.message import EmailMessage
 import re
 from urllib.parse import quote
-import smtplib
 from datetime import datetime, timedelta
 
 # --- CONFIGURAÇÃO DA PÁGINA E CONEXÃO COM DB ---
@@ -25,6 +23,9 @@ elif st.session_state["authentication_status"] is None:
 import os, sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from menu import exibir_menu
+from correio import enfileirar_envio, enfileirar_envios, registrar_envio, exibir_status_envios
+from documentos_fiscais import IndiceClientes, analisar_notas_fiscais, periodo_referencia
+from relatorio_fechamento import totais_fechamento_periodo
 exibir_menu()
 
 st.title("🧾 Enviar Nota Fiscal (NF)")
@@ -33,6 +34,7 @@ st.markdown("Envie faturas e notas fiscais para seus clientes via E-mail e Whats
 # Conexão com o banco de dados
 connection_url = st.secrets["database"]["connection_url"]
 engine = create_engine(connection_url)
+exibir_status_envios(engine)
 
 # --- FUNÇÕES AUXILIARES ---
 
@@ -40,68 +42,58 @@ engine = create_engine(connection_url)
 def carregar_clientes():
     """Carrega os clientes do banco de dados para o selectbox."""
     try:
-        clientes_df = pd.read_sql_query(            "SELECT nome, email, telefone FROM clientes ORDER BY nome",
+        clientes_df = pd.read_sql_query(            "SELECT nome, email, telefone, cnpj FROM clientes ORDER BY nome",
             engine
         )
         return clientes_df
     except Exception as e:
         st.error(f"Erro ao carregar clientes: {e}")
-        return pd.DataFrame(columns=['nome', 'email'])
+        return pd.DataFrame(columns=['nome', 'email', 'telefone', 'cnpj'])
 
-def enviar_email_com_anexo(destinatario, assunto, corpo, dados_anexo, nome_anexo):
-    """Envia um email com um anexo em PDF."""
+def enviar_email_com_anexo(destinatario, assunto, corpo, dados_anexo, nome_anexo, cliente=None, referencia=None):
+    """Coloca na fila um email com um anexo em PDF."""
     try:
-        remetente = st.secrets["email_credentials"]["username"]
-        senha = st.secrets["email_credentials"]["password"]
-        
-        msg = EmailMessage()
-        msg['Subject'] = assunto
-        msg['From'] = remetente
-        msg['To'] = destinatario
-        msg.set_content(corpo)
-        
-        corpo_html = corpo.replace('\n', '<br>')
-        html_content = f"""\
-        <html>
-            <body style="font-family: Arial, sans-serif; color: #333333; line-height: 1.6;">
-                <p>{corpo_html}</p>
-                <br>
-                <table border="0" cellpadding="0" cellspacing="0" style="font-family: Arial, sans-serif; color: #333333; line-height: 1.4;">
-                    <tr>
-                        <td style="padding-right: 15px; border-right: 2px solid #cccccc;">
-                            <a href='https://postimg.cc/fVNyZqpf' target='_blank'>
-                                <img src='https://i.postimg.cc/fVNyZqpf/Whats-App-Image-2025-01-06-at-16-03-50.jpg' border='0' alt='Elite CNC Service' style='max-width: 140px; height: auto;'>
-                            </a>
-                        </td>
-                        <td style="padding-left: 15px;">
-                            <strong style="font-size: 16px;">Filipe Guimarães</strong><br>
-                            <span style="font-size: 14px; color: #666666;">Sócio Proprietário</span><br>
-                            <span style="font-size: 13px;">
-                            📞 WhatsApp: (11) 97761-7009<br>
-                            ✉️ elitecncservice@gmail.com<br>
-                            🌐 <a href="http://www.elitecncservice.com.br" style="color: #0056b3; text-decoration: none;">www.elitecncservice.com.br</a>
-                            </span>
-                        </td>
-                    </tr>
-                </table>
-            </body>
-        </html>
-        """
-        msg.add_alternative(html_content, subtype='html')
-        
-        # Adiciona o anexo
-        msg.add_attachment(dados_anexo, maintype='application', subtype='pdf', filename=nome_anexo)
-        
-        with smtplib.SMTP_SSL('smtp.gmail.com', 465) as smtp:
-            smtp.login(remetente, senha)
-            smtp.send_message(msg)
-            
-        st.success(f"Email com a Nota Fiscal enviado para {destinatario} com sucesso!")
-        return True
+        envio = enfileirar_envio(
+            engine, st.secrets["email_credentials"], destinatario, assunto, corpo, [{'nome': nome_anexo, 'dados': dados_anexo}],
+            cliente=cliente, referencia=referencia, usuario=st.session_state.get("username")
+        )
     except Exception as e:
-        st.error(f"Erro ao enviar email: {e}")
-        st.error("Verifique as credenciais em secrets.toml e sua Senha de App.")
+        st.error(f"Erro ao colocar o email na fila de envio: {e}")
         return False
+    registrar_envio(envio, destinatario)
+    return True
+
+def montar_corpo_nf(cliente, mes_referencia):
+    return f"""Prezado(a) {cliente},
+
+Esperamos que esta mensagem o encontre bem.
+
+Segue em anexo a Nota Fiscal referente aos serviços prestados no período de {mes_referencia}.
+
+Agradecemos a parceria e confiança em nosso trabalho. Caso tenha qualquer dúvida ou necessite de informações adicionais sobre o faturamento, permanecemos à inteira disposição.
+
+Atenciosamente,
+"""
+
+def conferir_notas(notas, totais_fechamento):
+    """Confere o lote por cliente: a soma das NFs de cada cliente é comparada com o total do
+    fechamento dele no mês, e o resultado vale para todas as notas do cliente.
+    `notas` tem as colunas 'cliente' e 'valor'; retorna (soma do cliente, situação), alinhados às notas."""
+    valores = pd.to_numeric(notas['valor'], errors='coerce')
+    soma_cliente = valores.groupby(notas['cliente']).transform('sum')
+    sem_valor = valores.isna().groupby(notas['cliente']).transform('any').fillna(True).astype(bool)
+    situacoes = []
+    for cliente, soma, faltando in zip(notas['cliente'], soma_cliente, sem_valor):
+        if pd.isna(cliente) or not cliente:
+            situacoes.append("❌ Cliente não identificado")
+        elif totais_fechamento.get(cliente) is None:
+            situacoes.append("❔ Sem fechamento no mês")
+        elif faltando:
+            situacoes.append("⚠️ Valor não lido")
+        else:
+            total = totais_fechamento[cliente]
+            situacoes.append("✅ Confere" if abs(float(soma) - float(total)) < 0.01 else "⚠️ Divergente")
+    return soma_cliente.where(~sem_valor), situacoes
 
 def get_sugestao_mes_anterior():
     """Retorna uma string com o Mês/Ano anterior ao atual (ex: Janeiro/2024)."""
@@ -153,16 +145,7 @@ else:
                 
                 # Configuração do Email
                 assunto_padrao = f"Nota Fiscal de Serviços - {cliente_selecionado} - Ref. {mes_referencia}"
-                corpo_padrao = f"""Prezado(a) {cliente_selecionado},
-
-Esperamos que esta mensagem o encontre bem.
-
-Segue em anexo a Nota Fiscal referente aos serviços prestados no período de {mes_referencia}.
-
-Agradecemos a parceria e confiança em nosso trabalho. Caso tenha qualquer dúvida ou necessite de informações adicionais sobre o faturamento, permanecemos à inteira disposição.
-
-Atenciosamente,
-"""
+                corpo_padrao = montar_corpo_nf(cliente_selecionado, mes_referencia)
                 st.markdown("##### 📧 Configuração do Email")
                 assunto = st.text_input("Assunto:", value=assunto_padrao)
                 corpo_email = st.text_area("Mensagem:", value=corpo_padrao, height=180)
@@ -194,6 +177,135 @@ Atenciosamente,
                     # --- Botão Email ---
                     if st.button(f"✉️ Enviar Email", type="primary", use_container_width=True):
                         pdf_bytes = uploaded_file.getvalue()
-                        enviar_email_com_anexo(email_cliente, assunto, corpo_email, pdf_bytes, uploaded_file.name)
+                        enviar_email_com_anexo(email_cliente, assunto, corpo_email, pdf_bytes, uploaded_file.name, cliente=cliente_selecionado, referencia=mes_referencia)
         elif not uploaded_file:
-            st.info("👈 Selecione um cliente e anexe o PDF da Nota Fiscal para habilitar o envio.")
\ No newline at end of file
+            st.info("👈 Selecione um cliente e anexe o PDF da Nota Fiscal para habilitar o envio.")
+
+# --- ENVIO EM LOTE ---
+if lista_clientes_nomes:
+    st.markdown("---")
+    with st.container(border=True):
+        st.subheader("📚 Envio em Lote")
+        st.caption("Anexe as Notas Fiscais (PDF ou XML) de vários clientes. O número, o CNPJ do tomador e o valor são lidos de cada arquivo e conferidos com o total do fechamento do cliente no mês de referência.")
+
+        col_lote1, col_lote2 = st.columns([1, 2])
+        with col_lote1:
+            mes_referencia_lote = st.text_input("Mês/Ano de Referência", value=get_sugestao_mes_anterior(), key="lote_mes_referencia_nf")
+            periodo_lote = periodo_referencia(mes_referencia_lote)
+            if periodo_lote:
+                st.caption(f"Fechamento de {periodo_lote[0].strftime('%d/%m/%Y')} a {periodo_lote[1].strftime('%d/%m/%Y')}")
+            else:
+                st.error("Informe o mês como 'Janeiro/2024' ou '01/2024'.")
+        with col_lote2:
+            arquivos_lote = st.file_uploader("Notas Fiscais (PDF ou XML)", type=["pdf", "xml"], accept_multiple_files=True, key="lote_notas")
+
+        # Cada upload é identificado pelo file_id: dois arquivos com o mesmo nome continuam distintos
+        assinatura_lote = (mes_referencia_lote,) + tuple(f.file_id for f in arquivos_lote or [])
+        if st.button("🔍 Ler Notas e Conferir com o Fechamento", use_container_width=True, disabled=not (arquivos_lote and periodo_lote)):
+            with st.spinner(f"Lendo {len(arquivos_lote)} nota(s)..."):
+                leituras = analisar_notas_fiscais([(f.name, f.getvalue()) for f in arquivos_lote])
+                totais = totais_fechamento_periodo(engine, *periodo_lote)
+
+            indice = IndiceClientes(df_clientes)
+            emails = df_clientes.set_index('nome')['email'].dropna()
+            st.session_state.nf_totais_fechamento = dict(zip(totais['cliente'], totais['total'].astype(float)))
+            linhas = []
+            for arquivo, leitura in zip(arquivos_lote, leituras):
+                cliente, criterio = indice.encontrar(leitura['cnpj'], leitura['tomador'])
+                nome_cliente = cliente['nome'] if cliente else None
+                linhas.append({
+                    'enviar': False,
+                    'id_arquivo': arquivo.file_id,
+                    'arquivo': leitura['arquivo'],
+                    'numero': leitura['numero'],
+                    'cliente': nome_cliente,
+                    'criterio': criterio or (leitura['erro'] or 'Não identificado'),
+                    'cnpj_lido': leitura['cnpj'],
+                    'valor': leitura['valor'],
+                })
+            notas_lote = pd.DataFrame(linhas)
+            _, situacoes = conferir_notas(notas_lote, st.session_state.nf_totais_fechamento)
+            notas_lote['enviar'] = [
+                situacao.startswith("✅") and bool(emails.get(cliente))
+                for situacao, cliente in zip(situacoes, notas_lote['cliente'])
+            ]
+            st.session_state.notas_lote = notas_lote
+            st.session_state.notas_lote_arquivos = assinatura_lote
+
+        # A revisão só vale para o mesmo conjunto de arquivos (e mês) que foi lido
+        if arquivos_lote and st.session_state.get('notas_lote_arquivos') == assinatura_lote:
+            revisao = st.data_editor(
+                st.session_state.notas_lote,
+                column_config={
+                    "enviar": st.column_config.CheckboxColumn("Enviar"),
+                    "id_arquivo": None,
+                    "arquivo": st.column_config.TextColumn("Arquivo", disabled=True),
+                    "numero": st.column_config.TextColumn("Nº NF", disabled=True),
+                    "cliente": st.column_config.SelectboxColumn("Cliente", options=df_clientes['nome'].tolist()),
+                    "criterio": st.column_config.TextColumn("Identificado por", disabled=True),
+                    "cnpj_lido": st.column_config.TextColumn("CNPJ (NF)", disabled=True),
+                    "valor": st.column_config.NumberColumn("Valor NF", format="R$ %.2f", disabled=True),
+                },
+                use_container_width=True, hide_index=True, key="editor_notas_lote"
+            )
+
+            # Conferência refeita com o cliente revisado (o usuário pode ter corrigido a identificação)
+            totais_fechamento = st.session_state.nf_totais_fechamento
+            soma_cliente, situacoes = conferir_notas(revisao, totais_fechamento)
+            conferencia = revisao.assign(
+                soma_cliente=soma_cliente,
+                fechamento=revisao['cliente'].map(totais_fechamento),
+                situacao=situacoes,
+            )
+            conferencia['diferenca'] = conferencia['soma_cliente'] - conferencia['fechamento']
+            st.dataframe(
+                conferencia[['arquivo', 'numero', 'cliente', 'valor', 'soma_cliente', 'fechamento', 'diferenca', 'situacao']],
+                column_config={
+                    "arquivo": "Arquivo", "numero": "Nº NF", "cliente": "Cliente", "situacao": "Conferência",
+                    "valor": st.column_config.NumberColumn("Valor NF", format="R$ %.2f"),
+                    "soma_cliente": st.column_config.NumberColumn("NFs do Cliente", format="R$ %.2f"),
+                    "fechamento": st.column_config.NumberColumn("Fechamento do Mês", format="R$ %.2f"),
+                    "diferenca": st.column_config.NumberColumn("Diferença", format="R$ %.2f"),
+                },
+                use_container_width=True, hide_index=True
+            )
+
+            selecionados = conferencia[conferencia['enviar'] & conferencia['cliente'].notna()]
+            divergentes = selecionados[~selecionados['situacao'].str.startswith("✅")]
+            if not divergentes.empty:
+                st.warning(f"{len(divergentes)} nota(s) marcada(s) para envio não conferem com o fechamento: {', '.join(divergentes['arquivo'])}")
+
+            emails = df_clientes.set_index('nome')['email'].dropna()
+            sem_email = sorted(c for c in selecionados['cliente'].unique() if not emails.get(c))
+            if sem_email:
+                st.warning(f"Sem email cadastrado (serão ignorados): {', '.join(sem_email)}")
+            selecionados = selecionados[~selecionados['cliente'].isin(sem_email)]
+
+            st.metric("Notas a enviar", f"{len(selecionados)} nota(s) para {selecionados['cliente'].nunique()} cliente(s)")
+
+            if st.button("✉️ Enfileirar Todos os Emails", type="primary", use_container_width=True, disabled=selecionados.empty, key="enviar_notas_lote"):
+                arquivos_por_id = {f.file_id: f for f in arquivos_lote}
+                envios = []
+                # Um email por cliente, com todas as notas dele
+                for cliente, grupo in selecionados.groupby('cliente', sort=True):
+                    envios.append({
+                        'destinatario': emails[cliente],
+                        'assunto': f"Nota Fiscal de Serviços - {cliente} - Ref. {mes_referencia_lote}",
+                        'corpo': montar_corpo_nf(cliente, mes_referencia_lote),
+                        'anexos': [
+                            {'nome': nome, 'dados': arquivos_por_id[id_arquivo].getvalue()}
+                            for id_arquivo, nome in zip(grupo['id_arquivo'], grupo['arquivo'])
+                        ],
+                        'cliente': cliente,
+                        'referencia': mes_referencia_lote,
+                    })
+                try:
+                    resultados = enfileirar_envios(engine, st.secrets["email_credentials"], envios, usuario=st.session_state.get("username"))
+                    for envio, resultado in zip(envios, resultados):
+                        registrar_envio(resultado, envio['destinatario'], avisar=False)
+                    novos = sum(r['novo'] for r in resultados)
+                    st.success(f"{novos} email(s) colocados na fila de envio.")
+                    if novos < len(resultados):
+                        st.info(f"{len(resultados) - novos} email(s) com as mesmas notas já estavam na fila ou enviados e não foram duplicados.")
+                except Exception as e:
+                    st.error(f"Erro ao colocar os emails na fila de envio: {e}")
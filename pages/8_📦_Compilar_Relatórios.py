@@ -3,8 +3,6 @@ import pandas as pd
 from sqlalchemy import create_engine
 from fpdf import FPDF
 from datetime import datetime, date
-import smtplib
-from email.message import EmailMessage
 from urllib.parse import quote, re
 from pypdf import PdfWriter
 import io
@@ -27,6 +25,8 @@ elif st.session_state["authentication_status"] is None:
 import os, sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from menu import exibir_menu
+from correio import enfileirar_envio, registrar_envio, exibir_status_envios, config_smtp, tamanho_anexo, tamanho_codificado
+from pacote_zip import ArquivoSpool, PacoteZip
 exibir_menu()
 
 st.title("📦 Compilar Relatórios de O.S.")
@@ -34,6 +34,7 @@ st.write("Selecione um cliente e um período para juntar múltiplos relatórios
 
 connection_url = st.secrets["database"]["connection_url"]
 engine = create_engine(connection_url)
+exibir_status_envios(engine)
 
 # --- CLASSE PARA GERAR O PDF INDIVIDUAL (Reutilizada de Gerar_Relatório_PDF.py) ---
 class PDF(FPDF):
@@ -147,54 +148,18 @@ def gerar_pdf_os(os_details):
 
     return pdf.output()
 
-def enviar_email_com_anexos(destinatario, assunto, corpo, anexos):
-    """Envia um email com um ou mais anexos em PDF."""
+def enviar_email_com_anexos(destinatario, assunto, corpo, anexos, cliente=None, referencia=None):
+    """Coloca na fila um email com um ou mais anexos em PDF."""
     try:
-        remetente = st.secrets["email_credentials"]["username"]
-        senha = st.secrets["email_credentials"]["password"]
-        msg = EmailMessage()
-        msg['Subject'], msg['From'], msg['To'] = assunto, remetente, destinatario
-        msg.set_content(corpo)
-
-        corpo_html = corpo.replace('\n', '<br>')
-        html_content = f"""\
-        <html>
-            <body style="font-family: Arial, sans-serif; color: #333333; line-height: 1.6;">
-                <p>{corpo_html}</p>
-                <br>
-                <table border="0" cellpadding="0" cellspacing="0" style="font-family: Arial, sans-serif; color: #333333; line-height: 1.4;">
-                    <tr>
-                        <td style="padding-right: 15px; border-right: 2px solid #cccccc;">
-                            <a href='https://postimg.cc/fVNyZqpf' target='_blank'>
-                                <img src='https://i.postimg.cc/fVNyZqpf/Whats-App-Image-2025-01-06-at-16-03-50.jpg' border='0' alt='Elite CNC Service' style='max-width: 140px; height: auto;'>
-                            </a>
-                        </td>
-                        <td style="padding-left: 15px;">
-                            <strong style="font-size: 16px;">Filipe Guimarães</strong><br>
-                            <span style="font-size: 14px; color: #666666;">Sócio Proprietário</span><br>
-                            <span style="font-size: 13px;">
-                            📞 WhatsApp: (11) 97761-7009<br>
-                            ✉️ elitecncservice@gmail.com<br>
-                            🌐 <a href="http://www.elitecncservice.com.br" style="color: #0056b3; text-decoration: none;">www.elitecncservice.com.br</a>
-                            </span>
-                        </td>
-                    </tr>
-                </table>
-            </body>
-        </html>
-        """
-        msg.add_alternative(html_content, subtype='html')
-
-        # Adiciona múltiplos anexos
-        for anexo in anexos:
-            msg.add_attachment(anexo['data'], maintype='application', subtype='pdf', filename=anexo['name'])
-
-        with smtplib.SMTP_SSL('smtp.gmail.com', 465) as smtp:
-            smtp.login(remetente, senha)
-            smtp.send_message(msg)
-        st.success(f"Email com relatórios compilados enviado para {destinatario} com sucesso!")
+        envio = enfileirar_envio(
+            engine, st.secrets["email_credentials"], destinatario, assunto, corpo, anexos,
+            cliente=cliente, referencia=referencia, usuario=st.session_state.get("username")
+        )
     except Exception as e:
-        st.error(f"Erro ao enviar email: {e}")
+        st.error(f"Erro ao colocar o email na fila de envio: {e}")
+        return False
+    registrar_envio(envio, destinatario)
+    return True
 
 # --- INTERFACE PRINCIPAL ---
 
@@ -228,30 +193,37 @@ else:
 
             if st.button(f"📦 Gerar PDF Compilado com {len(servicos_df)} Relatório(s)", type="primary", use_container_width=True):
                 with st.spinner("Gerando e unindo os relatórios em PDF... Por favor, aguarde."):
+                    # Descarta os arquivos temporários da compilação anterior
+                    for chave in ('pdf_compilado', 'zip_compilado'):
+                        anterior = st.session_state.pop(chave, None)
+                        if anterior:
+                            anterior.descartar()
+
+                    sufixo = f"{cliente_selecionado.replace(' ', '_')}_{data_inicio.strftime('%Y%m%d')}-{data_fim.strftime('%Y%m%d')}"
                     merger = PdfWriter()
-                    
-                    # Gera um PDF para cada O.S. e adiciona ao 'merger'
+                    pacote = PacoteZip(f"Relatorios_{sufixo}.zip")
+
+                    # Gera um PDF para cada O.S.: vai para o 'merger' e, individualmente, para o ZIP
                     for _, os_details in servicos_df.iterrows():
                         pdf_bytes = gerar_pdf_os(os_details)
-                        pdf_stream = io.BytesIO(pdf_bytes)
-                        merger.append(pdf_stream)
+                        merger.append(io.BytesIO(pdf_bytes))
+                        pacote.adicionar(f"Relatorio_OS_{os_details.get('ordem_servico') or 'N_A'}.pdf", pdf_bytes)
+                    pacote.fechar()
 
-                    # Salva o PDF final mesclado em um stream de bytes
-                    output_stream = io.BytesIO()
-                    merger.write(output_stream)
+                    # Grava o PDF final mesclado direto no arquivo temporário (sem cópia em bytes)
+                    pdf_compilado = ArquivoSpool(f"Relatorios_{sufixo}.pdf")
+                    merger.write(pdf_compilado.arquivo)
                     merger.close()
-                    
-                    pdf_final_bytes = output_stream.getvalue()
 
-                    # Salva no session_state para os botões de ação
-                    st.session_state.pdf_compilado_bytes = pdf_final_bytes
-                    st.session_state.nome_arquivo_compilado = f"Relatorios_{cliente_selecionado.replace(' ', '_')}_{data_inicio.strftime('%Y%m%d')}-{data_fim.strftime('%Y%m%d')}.pdf"
+                    # O session_state guarda apenas os handles dos arquivos
+                    st.session_state.pdf_compilado = pdf_compilado
+                    st.session_state.zip_compilado = pacote
                     st.session_state.email_cliente_compilado = servicos_df.iloc[0]['email_cliente']
                     st.session_state.telefone_cliente_compilado = servicos_df.iloc[0]['telefone']
                     st.session_state.cliente_selecionado_compilado = cliente_selecionado
 
     # Botões de Ação (aparecem após gerar o PDF)
-    if 'pdf_compilado_bytes' in st.session_state:
+    if 'pdf_compilado' in st.session_state:
         st.markdown("---")
         st.subheader("Anexar Arquivos Adicionais")
         uploaded_files = st.file_uploader(
@@ -260,17 +232,49 @@ else:
             accept_multiple_files=True
         )
 
+        # Prepara a lista de anexos: o PDF compilado vai direto do arquivo temporário,
+        # sem ser copiado para a memória antes da montagem da mensagem
+        anexos_para_envio = [{
+            'arquivo': st.session_state.pdf_compilado,
+            'nome': st.session_state.pdf_compilado.nome_arquivo
+        }]
+
+        # Adiciona os arquivos extras que o usuário subiu
+        if uploaded_files:
+            for uploaded_file in uploaded_files:
+                anexos_para_envio.append({
+                    'dados': uploaded_file.getvalue(),
+                    'nome': uploaded_file.name
+                })
+
+        tamanho_email = sum(tamanho_codificado(tamanho_anexo(a)) for a in anexos_para_envio)
+        limite_email = config_smtp(st.secrets["email_credentials"])['limite_anexos']
+        if tamanho_email > limite_email:
+            st.warning(
+                f"Os anexos somam {tamanho_email / 1024 / 1024:.1f} MB no email (limite de {limite_email / 1024 / 1024:.0f} MB). "
+                "Os PDFs serão recomprimidos e, se ainda assim não couberem, o envio será dividido em emails numerados (parte 1/N)."
+            )
+        else:
+            st.caption(f"Tamanho dos anexos no email: {tamanho_email / 1024 / 1024:.1f} MB")
+
         st.subheader("Ações do PDF Compilado")
         col_acao1, col_acao2, col_acao3 = st.columns(3)
 
         with col_acao1:
             st.download_button(
                 label="📥 Baixar PDF Compilado",
-                data=st.session_state.pdf_compilado_bytes,
-                file_name=st.session_state.nome_arquivo_compilado,
+                data=st.session_state.pdf_compilado.ler,
+                file_name=st.session_state.pdf_compilado.nome_arquivo,
                 mime="application/pdf",
                 use_container_width=True
             )
+            st.download_button(
+                label="🗂️ Baixar O.S. Individuais (ZIP)",
+                data=st.session_state.zip_compilado.ler,
+                file_name=st.session_state.zip_compilado.nome_arquivo,
+                mime="application/zip",
+                use_container_width=True
+            )
 
         with col_acao2:
             telefone_cliente = st.session_state.get('telefone_cliente_compilado')
@@ -304,21 +308,12 @@ else:
                     "Atenciosamente,"
                     )
 
-                    # Prepara a lista de anexos
-                    anexos_para_envio = [{
-                        'data': st.session_state.pdf_compilado_bytes,
-                        'name': st.session_state.nome_arquivo_compilado
-                    }]
-
-                    # Adiciona os arquivos extras que o usuário subiu
-                    if uploaded_files:
-                        for uploaded_file in uploaded_files:
-                            anexos_para_envio.append({
-                                'data': uploaded_file.getvalue(),
-                                'name': uploaded_file.name
-                            })
-
-                    enviar_email_com_anexos(email_cliente, assunto, corpo, anexos_para_envio)
+
+                    enviar_email_com_anexos(
+                        email_cliente, assunto, corpo, anexos_para_envio,
+                        cliente=st.session_state.cliente_selecionado_compilado,
+                        referencia=f"{data_inicio:%Y-%m-%d}/{data_fim:%Y-%m-%d}"
+                    )
 
             else:
                 st.button("✉️ Enviar por Email", disabled=True, use_container_width=True, type="primary")
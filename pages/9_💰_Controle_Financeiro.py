@@ -1,9 +1,5 @@
 import streamlit as st
 import pandas as pd
-import io
-import re
-from urllib.parse import quote
-import plotly.express as px
 from datetime import date, datetime, timedelta
 from sqlalchemy import create_engine, text
 from dateutil.relativedelta import relativedelta
@@ -19,6 +15,15 @@ if "authentication_status" not in st.session_state or not st.session_state["auth
 import os, sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from menu import exibir_menu
+from grade_paginada import ORDEM_DATA, buscar_pagina, estado_paginas, navegacao_paginas
+from exportacao import MIME_EXCEL, coluna_excel, exportar_consultas
+from graficos import grafico_pizza
+from ordem_servico import proxima_os
+from negociacoes import carregar_itens_negociacao, carregar_negociacoes, registrar_negociacao, reverter_negociacao
+from cobrancas import carregar_devedores, intervalo_cobranca, link_whatsapp, mensagem_cobranca, registrar_cobrancas
+from correio import enfileirar_envios, exibir_status_envios, registrar_envio
+from schema import exigir_esquema
+from vencimentos import FAIXAS, carregar_aging, carregar_itens, colunas_excel_aging, consulta_aging, consulta_itens
 exibir_menu()
 
 st.title("💰 Controle Financeiro")
@@ -26,34 +31,142 @@ st.markdown("Gerencie suas contas a pagar e receber, realize baixas e negociaç
 
 connection_url = st.secrets["database"]["connection_url"]
 engine = create_engine(connection_url)
+# Esquema conferido uma vez por processo; as colunas são criadas pelo setup_nuvem.py
+exigir_esquema(connection_url)
+exibir_status_envios(engine)
 
 # --- FILTROS DE VISUALIZAÇÃO ---
 # (Movido para dentro das abas ou topo para ficar mais limpo, veja abaixo)
 
-# --- CORREÇÃO AUTOMÁTICA DE SCHEMA ---
-try:
-    with engine.connect() as conn:
-        conn.execute(text("ALTER TABLE entradas ADD COLUMN IF NOT EXISTS data_pagamento TIMESTAMP"))
-        conn.execute(text("ALTER TABLE saidas ADD COLUMN IF NOT EXISTS data_pagamento TIMESTAMP"))
-        conn.commit()
-except Exception as e:
-    print(f"Erro ao tentar corrigir schema: {e}")
-
 # --- FUNÇÕES DE DADOS ---
 
+TAMANHO_PAGINA = 100
+COLUNA_VALOR = {'entradas': 'valor_atendimento', 'saidas': 'valor'}
+
+def filtros_lancamentos(status_list, cliente=None, periodo=None):
+    """Cláusula WHERE (sobre o alias `t`) e parâmetros dos filtros da tela: status, cliente e período de vencimento."""
+    filtros = ["t.status = ANY(:status)"]
+    params = {"status": list(status_list)}
+    if cliente:
+        filtros.append("t.cliente = :cliente")
+        params["cliente"] = cliente
+    if periodo:
+        # Intervalo semiaberto sobre a própria coluna, para o filtro usar o índice de data
+        filtros.append("t.data >= :inicio AND t.data < :fim")
+        params.update(inicio=periodo[0], fim=periodo[1] + timedelta(days=1))
+    return " AND ".join(filtros), params
+
 @st.cache_data(ttl=300)
-def carregar_dados(tabela, status_list):
-    """Carrega dados de uma tabela com um status específico."""
+def totais_por_status(tabela, status_list, cliente=None, periodo=None):
+    """Quantidade, total e vencidos (pendentes com vencimento antes de hoje) por status, somados no banco.
+    Retorna um DataFrame com uma linha por status encontrado e as colunas 'status', 'quantidade', 'total',
+    'qtd_vencidos', 'total_vencidos', 'primeiro_vencimento' e 'ultimo_vencimento'."""
+    colunas = ['status', 'quantidade', 'total', 'qtd_vencidos', 'total_vencidos', 'primeiro_vencimento', 'ultimo_vencimento']
     if not status_list:
-        return pd.DataFrame()
+        return pd.DataFrame(columns=colunas)
+    where, params = filtros_lancamentos(status_list, cliente, periodo)
+    coluna_valor = COLUNA_VALOR[tabela]
+    vencido = "t.status = 'Pendente' AND t.data < CURRENT_DATE"
+    query = f"""
+        SELECT
+            t.status,
+            COUNT(*) AS quantidade,
+            COALESCE(SUM(t.{coluna_valor}), 0) AS total,
+            COUNT(*) FILTER (WHERE {vencido}) AS qtd_vencidos,
+            COALESCE(SUM(t.{coluna_valor}) FILTER (WHERE {vencido}), 0) AS total_vencidos,
+            MIN(t.data) AS primeiro_vencimento,
+            MAX(t.data) AS ultimo_vencimento
+        FROM {tabela} t
+        WHERE {where}
+        GROUP BY t.status
+    """
     try:
-        status_str = ",".join([f"'{s}'" for s in status_list])
-        query = f"SELECT * FROM {tabela} WHERE status IN ({status_str}) ORDER BY data ASC"
-        df = pd.read_sql_query(query, engine, parse_dates=['data'])
+        df = pd.read_sql_query(text(query), engine, params=params, parse_dates=['primeiro_vencimento', 'ultimo_vencimento'])
+        df[['total', 'total_vencidos']] = df[['total', 'total_vencidos']].astype(float)
         return df
+    except Exception as e:
+        st.error(f"Erro ao totalizar a tabela {tabela}: {e}")
+        return pd.DataFrame(columns=colunas)
+
+def resumir_totais(totais):
+    """Soma as linhas de `totais_por_status` em um único dict (quantidade, total, qtd_vencidos, total_vencidos)."""
+    campos = ['quantidade', 'total', 'qtd_vencidos', 'total_vencidos']
+    if totais.empty:
+        return dict.fromkeys(campos, 0)
+    return {campo: totais[campo].sum() for campo in campos}
+
+# Colunas de cada editor; o telefone (entradas) vem do cadastro e é usado na cobrança por WhatsApp
+COLUNAS_EDITOR = {
+    'entradas': ['id', 'data', 'ordem_servico', 'cliente', 'valor_atendimento', 'status', 'telefone'],
+    'saidas': ['id', 'data', 'descricao', 'valor', 'status'],
+}
+
+@st.cache_data(ttl=300)
+def carregar_pagina(tabela, status_list, cursor=None, cliente=None, periodo=None):
+    """Carrega só uma página do editor, em ordem de vencimento, com a paginação por cursor da
+    grade_paginada (`cursor`: fim da página anterior; None na primeira).
+    Retorna (página, cursor da próxima página ou None se for a última)."""
+    where, params = filtros_lancamentos(status_list, cliente, periodo)
+    campos = ", ".join(f"c.{c}" if c == 'telefone' else f"t.{c}" for c in COLUNAS_EDITOR[tabela])
+    juncao = "LEFT JOIN clientes c ON c.nome = t.cliente" if tabela == 'entradas' else ""
+    consulta = f"SELECT {campos} FROM {tabela} t {juncao} WHERE {where}"
+    try:
+        pagina, proximo = buscar_pagina(
+            engine, consulta, ORDEM_DATA, descendente=False, cursor=cursor, tamanho_pagina=TAMANHO_PAGINA, params=params
+        )
     except Exception as e:
         st.error(f"Erro ao carregar dados da tabela {tabela}: {e}")
-        return pd.DataFrame()
+        return pd.DataFrame(columns=COLUNAS_EDITOR[tabela]), None
+    pagina['data'] = pd.to_datetime(pagina['data'])
+    return pagina, proximo
+
+@st.cache_data(ttl=300)
+def somar_por_cliente(status_list, cliente=None, periodo=None):
+    """Total a receber por cliente com os filtros da tela (base do gráfico de distribuição)."""
+    where, params = filtros_lancamentos(status_list, cliente, periodo)
+    query = f"""
+        SELECT t.cliente, SUM(t.valor_atendimento) AS valor_atendimento
+        FROM entradas t WHERE {where}
+        GROUP BY t.cliente
+    """
+    return pd.read_sql_query(text(query), engine, params=params)
+
+def pagina_editor(chave, tabela, status_list, quantidade, cliente=None, periodo=None):
+    """Página atual de um editor com a navegação da grade_paginada: os cursores ficam no
+    session_state e recomeçam quando os filtros mudam. Retorna o DataFrame da página."""
+    estado = estado_paginas(chave, (tabela, tuple(status_list), cliente, periodo))
+    pagina, proximo = carregar_pagina(tabela, tuple(status_list), estado['cursores'][-1], cliente, periodo)
+    if quantidade > TAMANHO_PAGINA:
+        navegacao_paginas(chave, estado, proximo, quantidade, TAMANHO_PAGINA)
+    return pagina
+
+# --- EXPORTAÇÃO (exportacao.py) ---
+COLUNAS_EXCEL_RECEBER = [
+    coluna_excel('data', 'Vencimento', 'data'),
+    coluna_excel('ordem_servico', 'Nº O.S.', largura=12),
+    coluna_excel('cliente', 'Cliente'),
+    coluna_excel('telefone', 'Telefone', largura=16),
+    coluna_excel('descricao_servico', 'Descrição', largura=45),
+    coluna_excel('valor_atendimento', 'Valor', 'moeda'),
+    coluna_excel('status', 'Status', largura=12),
+    coluna_excel('data_pagamento', 'Pagamento', 'data'),
+]
+COLUNAS_EXCEL_PAGAR = [
+    coluna_excel('data', 'Vencimento', 'data'),
+    coluna_excel('tipo_conta', 'Tipo de Conta'),
+    coluna_excel('descricao', 'Descrição', largura=45),
+    coluna_excel('valor', 'Valor', 'moeda'),
+    coluna_excel('status', 'Status', largura=12),
+    coluna_excel('data_pagamento', 'Pagamento', 'data'),
+]
+
+def consulta_exportacao(nome, tabela, colunas, status_list, cliente=None, periodo=None):
+    """Aba da exportação com os filtros da tela aplicados no SQL (ver exportacao.exportar_consultas)."""
+    where, params = filtros_lancamentos(status_list, cliente, periodo)
+    juncao = "LEFT JOIN clientes c ON c.nome = t.cliente" if tabela == 'entradas' else ""
+    campos = ", ".join("c.telefone" if col['campo'] == 'telefone' else f"t.{col['campo']}" for col in colunas)
+    query = f"SELECT {campos} FROM {tabela} t {juncao} WHERE {where} ORDER BY t.data ASC"
+    return {'nome': nome, 'colunas': colunas, 'query': query, 'params': params}
 
 @st.cache_data(ttl=600)
 def carregar_clientes_com_pendencias():
@@ -67,40 +180,64 @@ def carregar_clientes_com_pendencias():
     except:
         return []
 
-@st.cache_data(ttl=600)
-def carregar_telefones_clientes():
-    """Carrega nome e telefone dos clientes para contato."""
-    try:
-        df = pd.read_sql("SELECT nome, telefone FROM clientes", engine)
-        return df
-    except:
-        return pd.DataFrame(columns=['nome', 'telefone'])
+
+def ratear_valor(valores, total_pago):
+    """Distribui `total_pago` proporcionalmente a `valores`, em centavos.
+    A sobra do arredondamento fica no último item, para a soma fechar exatamente."""
+    total = sum(valores)
+    novos = [round(valor * total_pago / total, 2) for valor in valores]
+    novos[-1] = round(total_pago - sum(novos[:-1]), 2)
+    return novos
 
 def marcar_como_pago(tabela, pagamentos):
-    """Atualiza o status e a data de pagamento de uma lista de IDs."""
+    """Baixa os lançamentos com uma única instrução (UPDATE ... FROM VALUES), em uma transação.
+    `pagamentos`: dicts com 'id', 'data_pagamento' e, se houve desconto/acréscimo, 'valor' (o novo valor).
+    Retorna {'quantidade', 'total'} dos registros baixados, ou None se nada foi baixado."""
     if not pagamentos:
-        return False
+        return None
+    coluna_valor = COLUNA_VALOR[tabela]
+    ajustar_valor = all('valor' in pagamento for pagamento in pagamentos)
+
+    linhas, params = [], {}
+    for i, pagamento in enumerate(pagamentos):
+        params[f"id_{i}"] = int(pagamento['id'])
+        params[f"data_{i}"] = pagamento['data_pagamento']
+        if ajustar_valor:
+            params[f"valor_{i}"] = float(pagamento['valor'])
+            linhas.append(f"(:id_{i}, :data_{i}, :valor_{i})")
+        else:
+            linhas.append(f"(:id_{i}, :data_{i})")
+    colunas_valores = "id, data_pagamento, valor" if ajustar_valor else "id, data_pagamento"
+    novo_valor = f", {coluna_valor} = CAST(v.valor AS NUMERIC)" if ajustar_valor else ""
+
+    query = text(f"""
+        WITH baixados AS (
+            UPDATE {tabela} AS t
+            SET status = 'Pago', data_pagamento = v.data_pagamento{novo_valor}
+            FROM (VALUES {", ".join(linhas)}) AS v({colunas_valores})
+            WHERE t.id = v.id
+            RETURNING t.{coluna_valor} AS valor
+        )
+        SELECT COUNT(*) AS quantidade, COALESCE(SUM(valor), 0) AS total FROM baixados
+    """)
     try:
         with engine.connect() as con:
-            trans = con.begin()
-            try:
-                for pagamento in pagamentos:
-                    query = text(f"UPDATE {tabela} SET status = 'Pago', data_pagamento = :data_pagamento WHERE id = :id")
-                    con.execute(query, {"data_pagamento": pagamento['data_pagamento'], "id": int(pagamento['id'])})
-                trans.commit()
-                st.toast(f"{len(pagamentos)} lançamento(s) baixado(s) com sucesso!", icon="✅")
-                st.cache_data.clear() # Limpa o cache para recarregar os dados
-                return True
-            except Exception as e:
-                trans.rollback()
-                raise e
+            totais = con.execute(query, params).mappings().one()
+            con.commit()
     except Exception as e:
         st.error(f"Erro ao atualizar status: {e}")
-        return False
+        return None
 
-def processar_negociacao(tabela, ids_originais, novos_lancamentos):
+    resultado = {'quantidade': totais['quantidade'], 'total': float(totais['total'])}
+    st.toast(f"{resultado['quantidade']} lançamento(s) baixado(s) com sucesso! Total: R$ {resultado['total']:,.2f}", icon="✅")
+    st.cache_data.clear() # Limpa o cache para recarregar os dados
+    return resultado if resultado['quantidade'] else None
+
+def processar_negociacao(tipo, ids_originais, novos_lancamentos):
     """
-    Marca os IDs originais como 'Negociado' e insere os novos lançamentos.
+    Marca as entradas originais como 'Negociado', insere os novos lançamentos e registra a
+    negociação (originais x parcelas, ver negociacoes.py), tudo na mesma transação.
+    `tipo`: 'Desconto' ou 'Parcelamento'.
     """
     if not ids_originais or not novos_lancamentos:
         st.error("Dados insuficientes para processar a negociação.")
@@ -111,18 +248,24 @@ def processar_negociacao(tabela, ids_originais, novos_lancamentos):
             trans = con.begin()
             try:
                 # 1. Atualiza o status dos lançamentos originais para 'Negociado'
-                ids_tuple = tuple(ids_originais)
-                query_update = text(f"UPDATE {tabela} SET status = 'Negociado' WHERE id IN :ids")
-                con.execute(query_update, {"ids": ids_tuple})
+                ids_originais = [int(i) for i in ids_originais]
+                con.execute(text("UPDATE entradas SET status = 'Negociado' WHERE id = ANY(:ids)"), {"ids": ids_originais})
 
-                # 2. Insere os novos lançamentos (parcelas ou valor com desconto)
-                df_novos = pd.DataFrame(novos_lancamentos)
-                
+                # 2. Insere os novos lançamentos (parcelas ou valor com desconto), guardando os ids
                 # Garante que apenas colunas existentes na tabela sejam inseridas
-                colunas_tabela = pd.read_sql(f"SELECT * FROM {tabela} LIMIT 0", con).columns
-                df_novos_filtrado = df_novos[[col for col in df_novos.columns if col in colunas_tabela]]
-
-                df_novos_filtrado.to_sql(tabela, con, if_exists='append', index=False)
+                colunas_tabela = pd.read_sql("SELECT * FROM entradas LIMIT 0", con).columns
+                ids_novos = []
+                for lancamento in novos_lancamentos:
+                    dados = {k: v for k, v in lancamento.items() if k in colunas_tabela}
+                    colunas = ", ".join(dados)
+                    valores = ", ".join(f":{key}" for key in dados)
+                    ids_novos.append(con.execute(text(f"INSERT INTO entradas ({colunas}) VALUES ({valores}) RETURNING id"), dados).scalar())
+
+                # 3. Registra o vínculo entre originais e parcelas
+                registrar_negociacao(
+                    con, tipo, novos_lancamentos[0].get('cliente'), ids_originais, ids_novos,
+                    st.session_state.get("username", "n/a")
+                )
 
                 trans.commit()
                 st.toast("Negociação realizada com sucesso!", icon="🤝")
@@ -136,15 +279,70 @@ def processar_negociacao(tabela, ids_originais, novos_lancamentos):
         st.error(f"Erro de conexão ao processar negociação: {e_outer}")
         return False
 
+def desfazer_negociacao(negociacao_id):
+    """Reverte a negociação (ver negociacoes.reverter_negociacao) e informa o resultado."""
+    try:
+        with engine.connect() as con:
+            resultado = reverter_negociacao(con, negociacao_id)
+            con.commit()
+    except Exception as e:
+        st.error(f"Erro ao reverter negociação: {e}")
+        return False
+    if not resultado:
+        st.warning("A negociação não pôde ser revertida: ela já foi revertida ou tem parcelas pagas ou renegociadas.")
+        return False
+    st.toast(f"Negociação revertida: {resultado['restaurados']} lançamento(s) restaurado(s) e {resultado['canceladas']} parcela(s) cancelada(s).", icon="↩️")
+    st.cache_data.clear()
+    return True
+
+
+def executar_regua(devedores, canais):
+    """Cobra de uma vez todos os clientes de `devedores` ainda não contatados no intervalo:
+    enfileira os e-mails em lote (correio.py), monta os links de WhatsApp e registra cada
+    contato na tabela cobrancas. Retorna a lista de links ({'cliente', 'total', 'link'})."""
+    usuario = st.session_state.get("username", "n/a")
+    cobrancas, links = [], []
+    if "WhatsApp" in canais:
+        for _, devedor in devedores[~devedores['whatsapp_recente']].iterrows():
+            link = link_whatsapp(devedor['telefone'], mensagem_cobranca(devedor['cliente'], devedor['ordens'], devedor['total']))
+            if link:
+                links.append({'cliente': devedor['cliente'], 'total': devedor['total'], 'link': link})
+                cobrancas.append({'canal': 'WhatsApp', **devedor[['cliente', 'titulos', 'ordens']].to_dict(), 'valor': devedor['total']})
+
+    if "Email" in canais:
+        por_email = devedores[~devedores['email_recente'] & devedores['email'].fillna('').str.contains('@')]
+        envios = [{
+            'destinatario': devedor['email'],
+            'assunto': f"Lembrete de pagamento - {devedor['cliente']}",
+            'corpo': mensagem_cobranca(devedor['cliente'], devedor['ordens'], devedor['total']) + "\n\nAtenciosamente,",
+            'cliente': devedor['cliente'],
+            'referencia': f"Cobrança {date.today()}",
+        } for _, devedor in por_email.iterrows()]
+        if envios:
+            try:
+                resultados = enfileirar_envios(engine, st.secrets["email_credentials"], envios, usuario=usuario)
+            except Exception as e:
+                st.error(f"Erro ao colocar os emails de cobrança na fila de envio: {e}")
+                resultados = []
+            for (_, devedor), envio, resultado in zip(por_email.iterrows(), envios, resultados):
+                registrar_envio(resultado, envio['destinatario'], avisar=False)
+                cobrancas.append({'canal': 'Email', **devedor[['cliente', 'titulos', 'ordens']].to_dict(), 'valor': devedor['total'], 'email_id': resultado['id']})
+
+    try:
+        with engine.connect() as con:
+            registrar_cobrancas(con, cobrancas, usuario)
+            con.commit()
+    except Exception as e:
+        st.error(f"Erro ao registrar as cobranças: {e}")
+    st.cache_data.clear()
+    qtd_emails = sum(c['canal'] == 'Email' for c in cobrancas)
+    st.toast(f"Régua executada: {len(links)} link(s) de WhatsApp e {qtd_emails} email(s) na fila.", icon="📣")
+    return links
 
 def get_next_os_number():
-    """Busca o próximo número de O.S. disponível."""
-    try:
-        query = "SELECT MAX(CAST(ordem_servico AS INTEGER)) FROM entradas WHERE ordem_servico ~ '^[0-9]+$';"
-        next_os = pd.read_sql(query, engine).iloc[0,0]
-        return int(next_os) + 1 if next_os else 1
-    except:
-        return 1 # Fallback
+    """Aloca o próximo número de O.S. da sequence (ver ordem_servico.py)."""
+    with engine.connect() as con:
+        return proxima_os(con)
 
 # --- LAYOUT DE TOPO (Métricas e Filtro Global) ---
 with st.container(border=True):
@@ -155,29 +353,31 @@ with st.container(border=True):
         status_opcoes = ["Pendente", "Pago", "Negociado", "Cancelado"]
         status_selecionados = st.multiselect("Status dos Lançamentos:", options=status_opcoes, default=["Pendente"])
     
-    # Carrega dados e calcula métricas APÓS definir o filtro
-    df_receber = carregar_dados("entradas", tuple(status_selecionados))
-    df_pagar = carregar_dados("saidas", tuple(status_selecionados))
-    
-    total_receber = df_receber['valor_atendimento'].sum() if not df_receber.empty else 0.0
-    total_pagar = df_pagar['valor'].sum() if not df_pagar.empty else 0.0
+    # Totais somados no banco APÓS definir o filtro (as linhas só são lidas para a página visível do editor)
+    totais_receber = totais_por_status("entradas", tuple(status_selecionados))
+    totais_pagar = totais_por_status("saidas", tuple(status_selecionados))
+    resumo_receber = resumir_totais(totais_receber)
+    resumo_pagar = resumir_totais(totais_pagar)
+
+    total_receber = resumo_receber['total']
+    total_pagar = resumo_pagar['total']
     saldo_previsto = total_receber - total_pagar
 
-    col_m1.metric("📥 A Receber", f"R$ {total_receber:,.2f}", delta="Entradas", delta_color="normal")
-    col_m2.metric("📤 A Pagar", f"R$ {total_pagar:,.2f}", delta="Saídas", delta_color="inverse")
+    col_m1.metric("📥 A Receber", f"R$ {total_receber:,.2f}", delta="Entradas", delta_color="normal",
+                  help=f"{resumo_receber['quantidade']} lançamento(s); vencidos: {resumo_receber['qtd_vencidos']} (R$ {resumo_receber['total_vencidos']:,.2f})")
+    col_m2.metric("📤 A Pagar", f"R$ {total_pagar:,.2f}", delta="Saídas", delta_color="inverse",
+                  help=f"{resumo_pagar['quantidade']} lançamento(s); vencidos: {resumo_pagar['qtd_vencidos']} (R$ {resumo_pagar['total_vencidos']:,.2f})")
     col_m3.metric("💰 Saldo Previsto", f"R$ {saldo_previsto:,.2f}", delta="Líquido", delta_color="normal" if saldo_previsto >= 0 else "inverse")
 
 # --- ABAS ---
-tab_receber, tab_pagar = st.tabs(["📥 Contas a Receber (Entradas)", "📤 Contas a Pagar (Saídas)"])
+tab_receber, tab_pagar, tab_aging, tab_negociacoes, tab_cobranca = st.tabs(["📥 Contas a Receber (Entradas)", "📤 Contas a Pagar (Saídas)", "⏳ Aging de Vencidos", "🤝 Negociações", "📣 Régua de Cobrança"])
+
+STATUS_VISUAL = {'Pago': "✅ Pago", 'Negociado': "🤝 Negociado", 'Cancelado': "🚫 Cancelado"}
 
-def get_status_visual(row):
-    s = row.get('status', 'Pendente')
-    if s == 'Pago': return "✅ Pago"
-    if s == 'Negociado': return "🤝 Negociado"
-    if s == 'Cancelado': return "🚫 Cancelado"
-    if pd.notnull(row['data']) and row['data'].date() < date.today():
-        return "🔴 Atrasado"
-    return "🟢 No Prazo"
+def status_visual(df):
+    """Coluna visual de status, calculada para o DataFrame inteiro de uma vez (sem apply por linha)."""
+    prazo = (df['data'].dt.normalize() < pd.Timestamp(date.today())).map({True: "🔴 Atrasado", False: "🟢 No Prazo"})
+    return df['status'].map(STATUS_VISUAL).fillna(prazo)
 
 # ==============================================================================
 # ABA: CONTAS A RECEBER
@@ -191,64 +391,55 @@ with tab_receber:
         clientes_pendentes = carregar_clientes_com_pendencias()
         filtro_cliente = c_f1.selectbox("🔍 Filtrar por Cliente", ["Todos"] + clientes_pendentes)
 
-        min_date = df_receber['data'].min().date() if not df_receber.empty else date.today()
-        max_date = df_receber['data'].max().date() if not df_receber.empty else date.today()
+        min_date = totais_receber['primeiro_vencimento'].min().date() if not totais_receber.empty else date.today()
+        max_date = totais_receber['ultimo_vencimento'].max().date() if not totais_receber.empty else date.today()
         filtro_data = c_f2.date_input("Período de Vencimento", [min_date, max_date])
 
-    # --- Aplicação dos Filtros ---
-    df_r_view = df_receber.copy()
-    if filtro_cliente != "Todos" and 'cliente' in df_r_view.columns:
-        df_r_view = df_r_view[df_r_view['cliente'] == filtro_cliente]
-    
-    if len(filtro_data) == 2 and 'data' in df_r_view.columns:
-        df_r_view = df_r_view[(df_r_view['data'].dt.date >= filtro_data[0]) & (df_r_view['data'].dt.date <= filtro_data[1])]
-
-    # --- Cruzamento com Telefones ---
-    df_telefones = carregar_telefones_clientes()
-    if not df_telefones.empty and not df_r_view.empty and 'cliente' in df_r_view.columns:
-        df_r_view = pd.merge(df_r_view, df_telefones, left_on='cliente', right_on='nome', how='left')
+    # --- Aplicação dos Filtros (no SQL) ---
+    filtros_r = {
+        'cliente': None if filtro_cliente == "Todos" else filtro_cliente,
+        'periodo': tuple(filtro_data) if len(filtro_data) == 2 else None,
+    }
+    resumo_r_view = resumir_totais(totais_por_status("entradas", tuple(status_selecionados), **filtros_r))
 
-    if df_r_view.empty:
+    if not resumo_r_view['quantidade']:
         st.info("Nenhuma conta a receber encontrada com os filtros atuais.")
     else:
-        # Coluna visual de status
-        df_r_view['status_venc'] = df_r_view.apply(get_status_visual, axis=1)
-        df_r_view['selecionar'] = False
-
         # --- Destaque de Vencidos ---
-        vencidos_r = df_r_view[(df_r_view['data'].dt.date < date.today()) & (df_r_view['status'] == 'Pendente')]
-        if not vencidos_r.empty:
-            st.error(f"🚨 Atenção: Existem {len(vencidos_r)} conta(s) vencida(s) nesta lista, totalizando R$ {vencidos_r['valor_atendimento'].sum():,.2f}!", icon="⚠️")
+        if resumo_r_view['qtd_vencidos']:
+            st.error(f"🚨 Atenção: Existem {resumo_r_view['qtd_vencidos']} conta(s) vencida(s) nesta lista, totalizando R$ {resumo_r_view['total_vencidos']:,.2f}!", icon="⚠️")
 
         col_chart, col_table = st.columns([1, 3])
         
         with col_chart:
             with st.container(border=True):
                 st.markdown("##### Distribuição")
-                fig_receber = px.pie(
-                    df_r_view,
-                    values='valor_atendimento',
-                    names='cliente',
-                    hole=0.5,
-                    height=300
+                # Maiores clientes + "Outros", em cache pelos filtros da tela
+                fig_receber = grafico_pizza(
+                    "receber_clientes", (tuple(status_selecionados), filtro_cliente, tuple(filtro_data)),
+                    somar_por_cliente(tuple(status_selecionados), **filtros_r), 'cliente', 'valor_atendimento', buraco=0.5, altura=300,
+                    layout={'showlegend': False, 'margin': dict(t=0, b=0, l=0, r=0)}
                 )
-                fig_receber.update_layout(showlegend=False, margin=dict(t=0, b=0, l=0, r=0))
                 st.plotly_chart(fig_receber, use_container_width=True)
                 
                 # Botão de Exportação (Movido para cá para economizar espaço)
-                buffer = io.BytesIO()
-                with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-                    df_r_view.drop(columns=['selecionar'], errors='ignore').to_excel(writer, index=False, sheet_name='Receber')
+                # Os mesmos filtros da tela, aplicados na consulta; a planilha só é gerada no clique
                 st.download_button(
                     label="📥 Baixar Excel",
-                    data=buffer.getvalue(),
+                    data=lambda: exportar_consultas(engine, [consulta_exportacao(
+                        'Receber', 'entradas', COLUNAS_EXCEL_RECEBER, status_selecionados, **filtros_r
+                    )]),
                     file_name=f"Contas_Receber_{date.today()}.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                    mime=MIME_EXCEL,
                     use_container_width=True
             )
 
         with col_table:
             st.write("Selecione os itens na tabela abaixo para realizar ações:")
+            df_r_view = pagina_editor("pagina_receber", "entradas", status_selecionados, resumo_r_view['quantidade'], **filtros_r)
+            # Coluna visual de status
+            df_r_view['status_venc'] = status_visual(df_r_view)
+            df_r_view['selecionar'] = False
             edited_r = st.data_editor(
                 df_r_view[['selecionar', 'status_venc', 'data', 'ordem_servico', 'cliente', 'valor_atendimento', 'id', 'telefone']],
                 column_config={
@@ -267,7 +458,7 @@ with tab_receber:
                 height=400
             )
             # Totalizador discreto abaixo da tabela
-            st.caption(f"🧾 Total Listado na Tabela: **R$ {df_r_view['valor_atendimento'].sum():,.2f}**")
+            st.caption(f"🧾 Total Listado: **R$ {resumo_r_view['total']:,.2f}** em {resumo_r_view['quantidade']} lançamento(s)")
 
         selecionados = edited_r[edited_r['selecionar']]
         
@@ -300,24 +491,13 @@ with tab_receber:
                             st.warning(f"📈 Acréscimo de **R$ {abs(desconto):,.2f}** será aplicado proporcionalmente.")
 
                     if st.button(f"✅ Confirmar Baixa", type="primary", use_container_width=True):
-                        # Se houver diferença de valor (desconto ou acréscimo), atualiza os registros antes de baixar
-                        if abs(desconto) > 0.01 and total_sel > 0:
-                            ratio = val_recebido / total_sel
-                            try:
-                                with engine.connect() as con:
-                                    for _, row in selecionados.iterrows():
-                                        novo_valor = float(row['valor_atendimento'] * ratio)
-                                        con.execute(
-                                            text("UPDATE entradas SET valor_atendimento = :val WHERE id = :id"),
-                                            {"val": novo_valor, "id": int(row['id'])}
-                                        )
-                                    con.commit()
-                            except Exception as e:
-                                st.error(f"Erro ao atualizar valores com desconto: {e}")
-                                st.stop()
-
                         dt_baixa_full = datetime.combine(dt_baixa, datetime.min.time())
-                        itens = [{'id': int(row['id']), 'data_pagamento': dt_baixa_full} for _, row in selecionados.iterrows()]
+                        itens = [{'id': int(lancamento_id), 'data_pagamento': dt_baixa_full} for lancamento_id in selecionados['id']]
+                        # Desconto ou acréscimo: o novo valor de cada item vai na mesma instrução da baixa
+                        if abs(desconto) > 0.01 and total_sel > 0:
+                            valores = selecionados['valor_atendimento'].fillna(0).astype(float).tolist()
+                            for item, novo_valor in zip(itens, ratear_valor(valores, val_recebido)):
+                                item['valor'] = novo_valor
                         if marcar_como_pago("entradas", itens):
                             st.rerun()
                 
@@ -342,7 +522,7 @@ with tab_receber:
                                 'status': 'Pendente',
                                 'usuario_lancamento': st.session_state.get("username", "n/a")
                             }
-                            if processar_negociacao("entradas", ids, [novo_lanc]):
+                            if processar_negociacao("Desconto", ids, [novo_lanc]):
                                 st.rerun()
                             
                     elif tipo_neg == "Parcelar Valor":
@@ -366,7 +546,7 @@ with tab_receber:
                                     'status': 'Pendente',
                                     'usuario_lancamento': st.session_state.get("username", "n/a")
                                 })
-                            if processar_negociacao("entradas", ids, novos):
+                            if processar_negociacao("Parcelamento", ids, novos):
                                 st.rerun()
 
                 elif acao == "📞 Enviar Cobrança (WhatsApp)":
@@ -381,19 +561,10 @@ with tab_receber:
                         lista_os = ", ".join(grupo['ordem_servico'].astype(str).tolist())
                         qtd_itens = len(grupo)
                         
-                        if pd.isna(telefone) or not telefone:
+                        link_zap = None if pd.isna(telefone) else link_whatsapp(telefone, mensagem_cobranca(cliente_nome, lista_os, total_cliente))
+                        if not link_zap:
                             st.warning(f"⚠️ {cliente_nome}: Cliente sem telefone cadastrado.")
                         else:
-                            # Limpa e formata o telefone
-                            numero_limpo = re.sub(r'\D', '', str(telefone))
-                            if not numero_limpo.startswith('55'):
-                                numero_limpo = '55' + numero_limpo
-                            
-                            # Cria a mensagem
-                            msg_texto = f"Olá {cliente_nome}, tudo bem? \nConsta em nosso sistema pendência(s) referente(s) à(s) O.S. {lista_os}, totalizando R$ {total_cliente:,.2f}. \nPoderia nos dar uma previsão de pagamento?"
-                            msg_encoded = quote(msg_texto)
-                            link_zap = f"https://wa.me/{numero_limpo}?text={msg_encoded}"
-                            
                             st.markdown(
                                 f"""<a href="{link_zap}" target="_blank" style="text-decoration: none;">
                                 <button style="background-color:#25D366; color:white; border:none; padding:8px 16px; border-radius:5px; cursor:pointer; font-weight:bold;">
@@ -402,7 +573,7 @@ with tab_receber:
                             )
 
                 elif acao == "Restaurar Status (Pendente)":
-                    st.warning("⚠️ Esta ação reverterá o status dos itens selecionados para 'Pendente'. Utilize caso tenha excluído uma negociação e queira recuperar os lançamentos originais.")
+                    st.warning("⚠️ Esta ação reverterá o status dos itens selecionados para 'Pendente'. Para desfazer uma negociação registrada, use a aba 🤝 Negociações.")
                     if st.button("🔄 Confirmar Restauração", use_container_width=True):
                         ids = tuple(selecionados['id'].tolist())
                         if ids:
@@ -423,32 +594,28 @@ with tab_receber:
 with tab_pagar:
     st.subheader("Gerenciar Pagamentos (Despesas)")
     
-    if df_pagar.empty:
+    if not resumo_pagar['quantidade']:
         st.info("Nenhuma conta a pagar pendente.")
     else:
-        df_p_view = df_pagar.copy()
-        df_p_view['status_venc'] = df_p_view.apply(get_status_visual, axis=1)
-        df_p_view['selecionar'] = False
-
         # --- Destaque de Vencidos ---
-        vencidos_p = df_p_view[(df_p_view['data'].dt.date < date.today()) & (df_p_view['status'] == 'Pendente')]
-        if not vencidos_p.empty:
-            st.error(f"🚨 Atenção: Existem {len(vencidos_p)} conta(s) vencida(s) nesta lista, totalizando R$ {vencidos_p['valor'].sum():,.2f}!", icon="⚠️")
+        if resumo_pagar['qtd_vencidos']:
+            st.error(f"🚨 Atenção: Existem {resumo_pagar['qtd_vencidos']} conta(s) vencida(s) nesta lista, totalizando R$ {resumo_pagar['total_vencidos']:,.2f}!", icon="⚠️")
 
         col_top_p1, col_top_p2 = st.columns([4, 1])
         with col_top_p2:
             # --- Botão de Exportação ---
-            buffer_p = io.BytesIO()
-            with pd.ExcelWriter(buffer_p, engine='openpyxl') as writer:
-                df_p_view.drop(columns=['selecionar'], errors='ignore').to_excel(writer, index=False, sheet_name='Pagar')
             st.download_button(
                 label="📥 Baixar Excel",
-                data=buffer_p.getvalue(),
+                data=lambda: exportar_consultas(engine, [consulta_exportacao('Pagar', 'saidas', COLUNAS_EXCEL_PAGAR, status_selecionados)]),
                 file_name=f"Contas_Pagar_{date.today()}.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                mime=MIME_EXCEL,
                 use_container_width=True
             )
 
+        df_p_view = pagina_editor("pagina_pagar", "saidas", status_selecionados, resumo_pagar['quantidade'])
+        df_p_view['status_venc'] = status_visual(df_p_view)
+        df_p_view['selecionar'] = False
+
         edited_p = st.data_editor(
             df_p_view[['selecionar', 'status_venc', 'data', 'descricao', 'valor', 'id']],
             column_config={
@@ -465,7 +632,7 @@ with tab_pagar:
         )
 
         # --- Totalizador ---
-        st.caption(f"🧾 Total Listado: **R$ {df_p_view['valor'].sum():,.2f}**")
+        st.caption(f"🧾 Total Listado: **R$ {resumo_pagar['total']:,.2f}** em {resumo_pagar['quantidade']} lançamento(s)")
 
         selecionados_p = edited_p[edited_p['selecionar']]
 
@@ -484,6 +651,210 @@ with tab_pagar:
                 c_pag3.write("")
                 if c_pag3.button(f"✅ Confirmar Baixa", type="primary", use_container_width=True):
                     dt_pag_full = datetime.combine(dt_pag, datetime.min.time())
-                    itens = [{'id': int(row['id']), 'data_pagamento': dt_pag_full} for _, row in selecionados_p.iterrows()]
+                    itens = [{'id': int(lancamento_id), 'data_pagamento': dt_pag_full} for lancamento_id in selecionados_p['id']]
                     if marcar_como_pago("saidas", itens):
-                        st.rerun()
\ No newline at end of file
+                        st.rerun()
+
+# ==============================================================================
+# ABA: AGING DE VENCIDOS
+# ==============================================================================
+with tab_aging:
+    st.subheader("Aging de Vencidos")
+    st.caption("Lançamentos pendentes por dias de atraso, somados no banco. Atualizado uma vez por dia (ou após baixas e negociações).")
+
+    relatorio = st.radio("Relatório:", ["Contas a Receber", "Contas a Pagar"], horizontal=True, key="aging_relatorio")
+    tabela_aging = "entradas" if relatorio == "Contas a Receber" else "saidas"
+    hoje = date.today()
+    df_aging = carregar_aging(engine, tabela_aging, hoje)
+
+    if df_aging.empty:
+        st.success("Nenhum lançamento pendente vencido. 🎉")
+    else:
+        colunas_faixas = [coluna for coluna, _, _, _ in FAIXAS]
+        cols_m = st.columns(len(FAIXAS) + 1)
+        for col, (coluna, rotulo, _, _) in zip(cols_m, FAIXAS):
+            col.metric(f"{rotulo} dias", f"R$ {df_aging[coluna].sum():,.2f}")
+        cols_m[-1].metric("Total Vencido", f"R$ {df_aging['total'].sum():,.2f}", delta=f"{df_aging['quantidade'].sum()} lançamento(s)", delta_color="off")
+
+        colunas_resumo, colunas_itens = colunas_excel_aging(tabela_aging)
+        st.dataframe(
+            df_aging,
+            column_config={
+                "grupo": colunas_resumo[0]['titulo'],
+                "quantidade": st.column_config.NumberColumn("Qtd.", format="%d"),
+                **{coluna: st.column_config.NumberColumn(f"{rotulo} dias", format="R$ %.2f") for coluna, rotulo, _, _ in FAIXAS},
+                "total": st.column_config.NumberColumn("Total", format="R$ %.2f"),
+                "maior_atraso": st.column_config.NumberColumn("Maior Atraso (dias)", format="%d"),
+            },
+            hide_index=True,
+            use_container_width=True
+        )
+
+        # --- Detalhamento (grupo x faixa) ---
+        st.markdown("##### 🔎 Detalhar")
+        c_d1, c_d2, c_d3 = st.columns([2, 1, 1])
+        grupo_sel = c_d1.selectbox(colunas_resumo[0]['titulo'], ["Todos"] + df_aging['grupo'].tolist(), key="aging_grupo")
+        faixa_sel = c_d2.selectbox("Faixa (dias)", ["Todas"] + [rotulo for _, rotulo, _, _ in FAIXAS], key="aging_faixa")
+        grupo_filtro = None if grupo_sel == "Todos" else grupo_sel
+        faixa_filtro = None if faixa_sel == "Todas" else faixa_sel
+
+        with c_d3:
+            st.write("")
+            st.download_button(
+                label="📥 Baixar Excel",
+                data=lambda: exportar_consultas(engine, [
+                    {'nome': 'Aging', 'colunas': colunas_resumo, **consulta_aging(tabela_aging, hoje)},
+                    {'nome': 'Itens', 'colunas': colunas_itens, **consulta_itens(tabela_aging, hoje, grupo_filtro, faixa_filtro)},
+                ]),
+                file_name=f"Aging_{'Receber' if tabela_aging == 'entradas' else 'Pagar'}_{hoje}.xlsx",
+                mime=MIME_EXCEL,
+                use_container_width=True
+            )
+
+        df_itens = carregar_itens(engine, tabela_aging, hoje, grupo_filtro, faixa_filtro)
+        if df_itens.empty:
+            st.info("Nenhum lançamento nesta combinação.")
+        else:
+            st.dataframe(
+                df_itens[['data', 'dias', 'grupo', 'ordem_servico', 'descricao', 'valor']],
+                column_config={
+                    "data": st.column_config.DateColumn("Vencimento", format="DD/MM/YYYY"),
+                    "dias": st.column_config.NumberColumn("Dias em Atraso", format="%d"),
+                    "grupo": colunas_resumo[0]['titulo'],
+                    "ordem_servico": "O.S." if tabela_aging == "entradas" else None,
+                    "descricao": "Descrição",
+                    "valor": st.column_config.NumberColumn("Valor (R$)", format="R$ %.2f"),
+                },
+                hide_index=True,
+                use_container_width=True
+            )
+            st.caption(f"🧾 {len(df_itens)} lançamento(s), totalizando **R$ {df_itens['valor'].sum():,.2f}**")
+
+# ==============================================================================
+# ABA: NEGOCIAÇÕES
+# ==============================================================================
+with tab_negociacoes:
+    st.subheader("Negociações Ativas")
+    st.caption("Descontos e parcelamentos com o saldo de cada acordo. Reverter devolve os lançamentos originais para 'Pendente' e cancela as parcelas.")
+
+    c_n1, c_n2 = st.columns([1, 1])
+    filtro_cliente_neg = c_n1.selectbox("🔍 Filtrar por Cliente", ["Todos"] + carregar_clientes_com_pendencias(), key="neg_cliente")
+    filtro_id_neg = c_n2.number_input("Localizar pelo ID de um lançamento (original ou parcela)", min_value=0, step=1, value=0, key="neg_entrada_id")
+    df_neg = carregar_negociacoes(
+        engine,
+        cliente=None if filtro_cliente_neg == "Todos" else filtro_cliente_neg,
+        entrada_id=int(filtro_id_neg) or None
+    )
+
+    if df_neg.empty:
+        st.info("Nenhuma negociação ativa encontrada.")
+    else:
+        c_t1, c_t2, c_t3 = st.columns(3)
+        c_t1.metric("Negociações", len(df_neg))
+        c_t2.metric("Recebido", f"R$ {df_neg['recebido'].sum():,.2f}")
+        c_t3.metric("A Receber", f"R$ {df_neg['a_receber'].sum():,.2f}")
+
+        st.dataframe(
+            df_neg[['id', 'criada_em', 'cliente', 'tipo', 'valor_original', 'valor_negociado', 'parcelas', 'parcelas_pagas', 'recebido', 'a_receber', 'proximo_vencimento']],
+            column_config={
+                "id": st.column_config.NumberColumn("Nº", format="%d"),
+                "criada_em": st.column_config.DateColumn("Data", format="DD/MM/YYYY"),
+                "cliente": "Cliente",
+                "tipo": "Tipo",
+                "valor_original": st.column_config.NumberColumn("Valor Original", format="R$ %.2f"),
+                "valor_negociado": st.column_config.NumberColumn("Valor Negociado", format="R$ %.2f"),
+                "parcelas": st.column_config.NumberColumn("Parcelas", format="%d"),
+                "parcelas_pagas": st.column_config.NumberColumn("Pagas", format="%d"),
+                "recebido": st.column_config.NumberColumn("Recebido", format="R$ %.2f"),
+                "a_receber": st.column_config.NumberColumn("A Receber", format="R$ %.2f"),
+                "proximo_vencimento": st.column_config.DateColumn("Próximo Vencimento", format="DD/MM/YYYY"),
+            },
+            hide_index=True,
+            use_container_width=True
+        )
+
+        rotulos_neg = {
+            linha['id']: f"Nº {linha['id']} - {linha['cliente']} - {linha['tipo']} - A receber: R$ {linha['a_receber']:,.2f}"
+            for _, linha in df_neg.iterrows()
+        }
+        negociacao_sel = st.selectbox("Detalhar negociação:", list(rotulos_neg), format_func=rotulos_neg.get, key="neg_selecionada")
+        linha_neg = df_neg.set_index('id').loc[negociacao_sel]
+        df_itens_neg = carregar_itens_negociacao(engine, negociacao_sel)
+        st.dataframe(
+            df_itens_neg,
+            column_config={
+                "papel": "Papel",
+                "id": st.column_config.NumberColumn("ID", format="%d"),
+                "data": st.column_config.DateColumn("Vencimento", format="DD/MM/YYYY"),
+                "ordem_servico": "O.S.",
+                "descricao_servico": "Descrição",
+                "valor_atendimento": st.column_config.NumberColumn("Valor (R$)", format="R$ %.2f"),
+                "status": "Status",
+            },
+            hide_index=True,
+            use_container_width=True
+        )
+
+        if linha_neg['parcelas_pagas']:
+            st.info("Esta negociação já tem parcelas pagas e não pode ser revertida.")
+        elif linha_neg['parcelas_renegociadas']:
+            st.info("Parcelas desta negociação foram renegociadas. Reverta primeiro a negociação mais recente.")
+        elif st.button("↩️ Reverter Negociação", key=f"reverter_{negociacao_sel}", use_container_width=True):
+            if desfazer_negociacao(negociacao_sel):
+                st.rerun()
+
+# ==============================================================================
+# ABA: RÉGUA DE COBRANÇA
+# ==============================================================================
+with tab_cobranca:
+    st.subheader("Régua de Cobrança")
+    st.caption("Todos os clientes com contas vencidas, de uma vez: links de WhatsApp, lembretes por email e registro de cada contato.")
+
+    c_r1, c_r2 = st.columns([1, 2])
+    dias_intervalo = c_r1.number_input(
+        "Não repetir cobrança por (dias)", min_value=0, max_value=90, value=intervalo_cobranca(engine), step=1,
+        key="cobranca_intervalo", help="Clientes já cobrados por um canal dentro deste intervalo ficam de fora nesse canal."
+    )
+    canais_regua = c_r2.multiselect("Canais", ["WhatsApp", "Email"], default=["WhatsApp", "Email"], key="cobranca_canais")
+    df_devedores = carregar_devedores(engine, dias_intervalo)
+
+    if df_devedores.empty:
+        st.success("Nenhum cliente com contas vencidas. 🎉")
+    else:
+        pendentes_zap = int((~df_devedores['whatsapp_recente'] & df_devedores['telefone'].notna()).sum())
+        pendentes_email = int((~df_devedores['email_recente'] & df_devedores['email'].fillna('').str.contains('@')).sum())
+        c_k1, c_k2, c_k3, c_k4 = st.columns(4)
+        c_k1.metric("Clientes em Atraso", len(df_devedores))
+        c_k2.metric("Total Vencido", f"R$ {df_devedores['total'].sum():,.2f}")
+        c_k3.metric("A cobrar por WhatsApp", pendentes_zap)
+        c_k4.metric("A cobrar por Email", pendentes_email)
+
+        st.dataframe(
+            df_devedores[['cliente', 'titulos', 'total', 'vencimento_mais_antigo', 'telefone', 'email', 'ultimo_whatsapp', 'ultimo_email']],
+            column_config={
+                "cliente": "Cliente",
+                "titulos": st.column_config.NumberColumn("Títulos", format="%d"),
+                "total": st.column_config.NumberColumn("Total Vencido", format="R$ %.2f"),
+                "vencimento_mais_antigo": st.column_config.DateColumn("Vencido Desde", format="DD/MM/YYYY"),
+                "telefone": "Telefone",
+                "email": "Email",
+                "ultimo_whatsapp": st.column_config.DatetimeColumn("Último WhatsApp", format="DD/MM/YYYY HH:mm"),
+                "ultimo_email": st.column_config.DatetimeColumn("Último Email", format="DD/MM/YYYY HH:mm"),
+            },
+            hide_index=True,
+            use_container_width=True
+        )
+
+        if st.button("📣 Executar Régua de Cobrança", type="primary", use_container_width=True, disabled=not canais_regua):
+            st.session_state.cobranca_links = executar_regua(df_devedores, canais_regua)
+
+    # Os links ficam na sessão: depois da execução os clientes já aparecem como cobrados
+    if st.session_state.get("cobranca_links"):
+        st.markdown("##### Links de Cobrança Gerados:")
+        for item in st.session_state.cobranca_links:
+            st.markdown(
+                f"""<a href="{item['link']}" target="_blank" style="text-decoration: none;">
+                <button style="background-color:#25D366; color:white; border:none; padding:8px 16px; border-radius:5px; cursor:pointer; font-weight:bold;">
+                📲 Enviar para {item['cliente']} (R$ {item['total']:,.2f})
+                </button></a>""", unsafe_allow_html=True
+            )
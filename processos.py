@@ -0,0 +1,33 @@
+# processos.py
+# Pool de processos único do aplicativo, para o trabalho em Python puro (geração e leitura de PDFs).
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+_pool = None
+_trava = threading.Lock()
+
+def pool_processos():
+    """Pool compartilhado por todas as sessões, criado na primeira chamada e reaproveitado.
+    Usa 'forkserver': os processos não são cópias (fork) do servidor do Streamlit, que tem
+    várias threads e travas em uso e poderia deixar os filhos travados."""
+    global _pool
+    with _trava:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(mp_context=multiprocessing.get_context('forkserver'))
+        return _pool
+
+def mapear(funcao, itens):
+    """`funcao` (uma função de módulo) aplicada a cada item no pool, com os resultados na ordem
+    dos itens, à medida que ficam prontos. Se um processo morrer, o pool é recriado na próxima chamada."""
+    global _pool
+    pool = pool_processos()
+    try:
+        yield from pool.map(funcao, itens)
+    except BrokenProcessPool:
+        with _trava:
+            if _pool is pool:
+                _pool = None
+        pool.shutdown(wait=False)
+        raise
@@ -0,0 +1,206 @@
+# relatorio_fechamento.py
+# Geração do PDF de fechamento por cliente, individual ou em lote.
+import io
+
+import pandas as pd
+from fpdf import FPDF
+from sqlalchemy import text
+
+from processos import mapear
+from tabela_pdf import coluna, desenhar_tabela
+
+# --- CONSULTAS ---
+QUERY_SERVICOS_PERIODO = """
+    SELECT cliente, data, ordem_servico, maquina, patrimonio, valor_atendimento
+    FROM entradas
+    WHERE date(data) BETWEEN :inicio AND :fim
+      AND status NOT IN ('Negociado', 'Cancelado')
+      {filtro_cliente}
+    ORDER BY cliente ASC, data ASC
+"""
+
+def buscar_servicos_periodo(engine, data_inicio, data_fim, cliente=None):
+    """Busca os serviços faturáveis do período em uma única consulta.
+    Sem `cliente`, traz todos os clientes (ordenados por cliente e data)."""
+    filtro = "AND cliente = :cliente" if cliente else "AND cliente IS NOT NULL AND cliente <> ''"
+    params = {"inicio": data_inicio, "fim": data_fim}
+    if cliente:
+        params["cliente"] = cliente
+    query = text(QUERY_SERVICOS_PERIODO.format(filtro_cliente=filtro))
+    return pd.read_sql_query(query, engine, params=params, parse_dates=['data'])
+
+QUERY_TOTAIS_PERIODO = """
+    SELECT cliente, SUM(valor_atendimento) AS total, COUNT(*) AS qtd_servicos
+    FROM entradas
+    WHERE date(data) BETWEEN :inicio AND :fim
+      AND status NOT IN ('Negociado', 'Cancelado')
+      AND cliente IS NOT NULL AND cliente <> ''
+    GROUP BY cliente
+"""
+
+def totais_fechamento_periodo(engine, data_inicio, data_fim):
+    """Total do fechamento de cada cliente no período (mesmos critérios do PDF), agregado no banco."""
+    return pd.read_sql_query(text(QUERY_TOTAIS_PERIODO), engine, params={"inicio": data_inicio, "fim": data_fim})
+
+COLUNAS_SERVICOS = [
+    coluna('Data', 25, 'C'),
+    coluna('Nº O.S.', 30, 'C'),
+    coluna('Máquina', 65, 'L', quebra=True),
+    coluna('Patrimônio', 30, 'C'),
+    coluna('Valor Total', 40, 'R'),
+]
+
+# --- CLASSE PDF ---
+class FechamentoPDF(FPDF):
+    def header(self):
+        empresa_razao_social = "Elite CNC Service"
+        empresa_cnpj = "CNPJ: 61.159.425/0001-32"
+        empresa_endereco = "Rua da Paz, 230 - Santa Rita - Monte Alto SP"
+        empresa_contato = "Tel: (11) 97761-7009 | Email: elitecncservice@gmail.com"
+        empresa_site = "www.elitecncservice.com.br"
+        try:
+            self.image('logo.png', 10, 1, 50)
+        except FileNotFoundError:
+            self.set_xy(10, 8)
+            self.set_font('Arial', 'B', 12)
+            self.cell(50, 10, 'Logo N/A', 0, 1, 'L')
+        self.set_font('DejaVu', '', 9)
+        self.set_y(8); self.set_x(-105)
+        self.cell(100, 5, empresa_razao_social, 0, 1, 'R'); self.set_x(-105)
+        self.cell(100, 5, empresa_cnpj, 0, 1, 'R'); self.set_x(-105)
+        self.cell(100, 5, empresa_endereco, 0, 1, 'R'); self.set_x(-105)
+        self.cell(100, 5, empresa_contato, 0, 1, 'R'); self.set_x(-105)
+        self.cell(100, 5, empresa_site, 0, 1, 'R')
+        self.set_y(35)
+        self.set_line_width(0.5)
+        self.line(10, self.get_y(), 200, self.get_y())
+        self.ln(3)
+        self.set_font('DejaVu', 'B', 16)
+        self.cell(0, 10, 'RELATÓRIO DE FECHAMENTO', 0, 1, 'C')
+        self.ln(5)
+
+    def footer(self):
+        self.set_y(-15)
+        self.set_font('DejaVu', 'I', 8)
+        self.cell(0, 10, f'Página {self.page_no()}', 0, 0, 'C')
+
+def _texto_ou_na(valor):
+    return valor if valor is not None and pd.notnull(valor) else 'N/A'
+
+def nome_arquivo_fechamento(cliente, data_inicio, data_fim):
+    return f"Fechamento_{cliente.replace(' ', '_')}_{data_inicio.strftime('%Y%m%d')}-{data_fim.strftime('%Y%m%d')}.pdf"
+
+def gerar_pdf_fechamento(cliente, dados_cliente, servicos_df, data_inicio, data_fim):
+    """Monta o PDF de fechamento de um cliente e retorna os bytes.
+    `dados_cliente` é um dict com telefone, email e cnpj (podem faltar)."""
+    pdf = FechamentoPDF()
+    try:
+        pdf.add_font('DejaVu', '', 'DejaVuSans.ttf')
+        pdf.add_font('DejaVu', 'B', 'DejaVuSans-Bold.ttf')
+        pdf.add_font('DejaVu', 'I', 'DejaVuSans-Oblique.ttf')
+    except:
+        pass
+
+    total_a_pagar = servicos_df['valor_atendimento'].sum()
+
+    pdf.add_page()
+    pdf.set_auto_page_break(auto=True, margin=15)
+
+    # Cliente (coluna esquerda)
+    pdf.set_xy(10, 50)
+    pdf.set_font('DejaVu', 'B', 12)
+    pdf.cell(95, 8, 'DADOS DO CLIENTE', 'B', 1, 'L')
+    pdf.set_font('DejaVu', '', 10)
+    pdf.set_x(10)
+    pdf.multi_cell(
+        95, 6,
+        f"Nome: {cliente}\n"
+        f"CNPJ: {_texto_ou_na(dados_cliente.get('cnpj'))}\n"
+        f"Telefone: {_texto_ou_na(dados_cliente.get('telefone'))}\n"
+        f"Email: {_texto_ou_na(dados_cliente.get('email'))}"
+    )
+
+    # Período (coluna direita)
+    pdf.set_xy(110, 50)
+    pdf.set_font('DejaVu', 'B', 12)
+    pdf.cell(95, 8, 'PERÍODO REFERENTE', 'B', 1, 'L')
+    pdf.set_font('DejaVu', '', 10)
+    pdf.set_x(110)
+    pdf.multi_cell(
+        95, 6,
+        f"Data Inicial: {data_inicio.strftime('%d/%m/%Y')}\n"
+        f"Data Final: {data_fim.strftime('%d/%m/%Y')}"
+    )
+
+    # Tabela
+    pdf.ln(40)
+    pdf.set_font('DejaVu', 'B', 12)
+    pdf.cell(0, 8, 'SERVIÇOS REALIZADOS NO PERÍODO', 'B', 1, 'L')
+    pdf.ln(2)
+
+    valores = [
+        servicos_df['data'].dt.strftime('%d/%m/%Y').fillna('').tolist(),
+        servicos_df['ordem_servico'].astype(str).tolist(),
+        servicos_df['maquina'].astype(str).tolist(),
+        (servicos_df['patrimonio'].astype(str) if 'patrimonio' in servicos_df.columns else pd.Series('', index=servicos_df.index)).tolist(),
+        [f"R$ {v:.2f}".replace('.', ',') for v in servicos_df['valor_atendimento'].tolist()],
+    ]
+    desenhar_tabela(pdf, COLUNAS_SERVICOS, valores, altura_linha=7, tamanho_fonte=10)
+
+    pdf.set_font('DejaVu', 'B', 11)
+    pdf.cell(150, 8, 'VALOR TOTAL A PAGAR', 1, 0, 'R') # Ajustado para 150 (25+30+65+30)
+    pdf.cell(40, 8, f"R$ {total_a_pagar:.2f}".replace('.',','), 1, 1, 'R')
+
+    return bytes(pdf.output())
+
+# --- FECHAMENTO EM LOTE ---
+def _gerar_pdf_tarefa(tarefa):
+    """Ponto de entrada dos processos do pool (precisa ser uma função de módulo)."""
+    cliente, dados_cliente, servicos_df, data_inicio, data_fim = tarefa
+    return gerar_pdf_fechamento(cliente, dados_cliente, servicos_df, data_inicio, data_fim)
+
+def gerar_fechamentos_em_lote(servicos_df, df_clientes, data_inicio, data_fim, pacote):
+    """Gera o PDF de fechamento de cada cliente presente em `servicos_df`, em paralelo,
+    gravando cada um no `pacote` (PacoteZip) assim que fica pronto.
+    Retorna a lista de resumos (cliente, arquivo, qtd_servicos, total, email),
+    na ordem alfabética dos clientes."""
+    contatos = {}
+    if not df_clientes.empty:
+        contatos = df_clientes.set_index('nome').to_dict('index')
+
+    tarefas = []
+    for cliente, grupo in servicos_df.groupby('cliente', sort=True):
+        servicos_cliente = grupo.drop(columns=['cliente']).reset_index(drop=True)
+        tarefas.append((cliente, contatos.get(cliente, {}), servicos_cliente, data_inicio, data_fim))
+
+    if not tarefas:
+        return []
+
+    resultados = []
+    # O fpdf é Python puro; processos separados (pool compartilhado, processos.py) evitam a disputa pelo GIL.
+    for (cliente, dados_cliente, servicos_cliente, _, _), pdf_bytes in zip(tarefas, mapear(_gerar_pdf_tarefa, tarefas)):
+        # O pacote pode renomear um arquivo repetido (_2, _3...): o resumo aponta para o nome gravado
+        arquivo = pacote.adicionar(nome_arquivo_fechamento(cliente, data_inicio, data_fim), pdf_bytes)
+        resultados.append({
+            'cliente': cliente,
+            'arquivo': arquivo,
+            'qtd_servicos': len(servicos_cliente),
+            'total': float(servicos_cliente['valor_atendimento'].sum()),
+            'email': dados_cliente.get('email'),
+        })
+    return resultados
+
+def montar_resumo_lote(resultados):
+    """Planilha-resumo com os totais por cliente do fechamento em lote."""
+    colunas = ['cliente', 'qtd_servicos', 'total', 'email', 'arquivo']
+    return pd.DataFrame(resultados, columns=colunas)
+
+def adicionar_resumo_lote(pacote, resumo_df, data_inicio, data_fim):
+    """Grava a planilha-resumo no pacote do lote."""
+    buffer_resumo = io.BytesIO()
+    with pd.ExcelWriter(buffer_resumo, engine='openpyxl') as writer:
+        resumo_df.to_excel(writer, index=False, sheet_name='Resumo')
+    pacote.adicionar(
+        f"Resumo_Fechamento_{data_inicio.strftime('%Y%m%d')}-{data_fim.strftime('%Y%m%d')}.xlsx",
+        buffer_resumo.getvalue()
+    )
@@ -0,0 +1,85 @@
+# schema.py
+# Verificação do esquema do banco uma vez por processo; as alterações ficam a cargo do setup_nuvem.py.
+import logging
+
+import streamlit as st
+from sqlalchemy import create_engine, text
+
+logger = logging.getLogger(__name__)
+
+# Colunas e tabelas que o aplicativo usa e que foram criadas depois da primeira versão do banco
+COLUNAS_ESPERADAS = {
+    'entradas': (
+        'status', 'data_pagamento', 'nome_tecnicos', 'valor_deslocamento', 'qtd_tecnicos', 'valor_laboratorio',
+        'valor_repasse_laboratorio', 'horas_normais', 'horas_extra_50', 'horas_extra_100',
+    ),
+    'saidas': ('data_pagamento',),
+    'clientes': ('cnpj',),
+    'email_outbox': ('chave_idempotencia',),
+    'tecnicos': ('id', 'nome'),
+    'entrada_tecnicos': ('entrada_id', 'tecnico_id'),
+    'negociacoes': ('id', 'status'),
+    'negociacao_itens': ('negociacao_id', 'entrada_id', 'papel'),
+    'cobrancas': ('cliente', 'canal', 'criada_em'),
+}
+SEQUENCIAS_ESPERADAS = ('ordem_servico_seq',)
+
+QUERY_CATALOGO = """
+    SELECT table_name AS objeto, column_name AS coluna
+    FROM information_schema.columns
+    WHERE table_schema = current_schema() AND table_name = ANY(:tabelas)
+    UNION ALL
+    SELECT sequence_name, NULL
+    FROM information_schema.sequences
+    WHERE sequence_schema = current_schema() AND sequence_name = ANY(:sequencias)
+"""
+
+def pendencias_esquema(con):
+    """O que falta no banco em relação ao esperado, em uma única consulta ao catálogo
+    (só leitura, sem DDL). Retorna uma lista de textos; vazia se o esquema está em dia."""
+    linhas = con.execute(text(QUERY_CATALOGO), {
+        "tabelas": list(COLUNAS_ESPERADAS), "sequencias": list(SEQUENCIAS_ESPERADAS),
+    }).all()
+    existentes = {(objeto, coluna) for objeto, coluna in linhas}
+    tabelas = {objeto for objeto, coluna in linhas if coluna is not None}
+
+    pendencias = []
+    for tabela, colunas in COLUNAS_ESPERADAS.items():
+        if tabela not in tabelas:
+            pendencias.append(f"tabela {tabela}")
+            continue
+        pendencias += [f"coluna {tabela}.{coluna}" for coluna in colunas if (tabela, coluna) not in existentes]
+    pendencias += [f"sequence {sequencia}" for sequencia in SEQUENCIAS_ESPERADAS if (sequencia, None) not in existentes]
+    return pendencias
+
+@st.cache_resource
+def verificar_esquema(url_conexao):
+    """Resultado de `pendencias_esquema`, guardado para o processo inteiro: as páginas
+    consultam o catálogo só na primeira vez. Uma falha de conexão não fica em cache."""
+    engine = create_engine(url_conexao)
+    try:
+        with engine.connect() as con:
+            pendencias = pendencias_esquema(con)
+    finally:
+        engine.dispose()
+    if pendencias:
+        logger.warning("Esquema do banco desatualizado: %s", ", ".join(pendencias))
+    return pendencias
+
+def exigir_esquema(url_conexao):
+    """Interrompe a página com instruções se o banco não tiver o esquema esperado."""
+    try:
+        pendencias = verificar_esquema(url_conexao)
+    except Exception as e:
+        logger.warning("Não foi possível verificar o esquema do banco: %s", e)
+        return
+    if not pendencias:
+        return
+    st.error(
+        "O banco de dados está desatualizado. Execute `python setup_nuvem.py` para aplicar as alterações.\n\n"
+        "Faltando: " + ", ".join(pendencias)
+    )
+    if st.button("🔄 Verificar novamente"):
+        verificar_esquema.clear()
+        st.rerun()
+    st.stop()
@@ -87,6 +87,25 @@ try:
                 usuario_lancamento VARCHAR(255)
             );"""))
 
+            # --- Fila de e-mails (correio.py) ---
+            connection.execute(text("""
+            CREATE TABLE IF NOT EXISTS email_outbox (
+                id SERIAL PRIMARY KEY,
+                criado_em TIMESTAMP NOT NULL DEFAULT NOW(),
+                destinatario TEXT,
+                assunto TEXT,
+                mensagem BYTEA NOT NULL,
+                status VARCHAR(20) NOT NULL DEFAULT 'Pendente', -- 'Pendente', 'Enviando', 'Enviado' ou 'Falhou'
+                tentativas INTEGER NOT NULL DEFAULT 0,
+                proxima_tentativa TIMESTAMP NOT NULL DEFAULT NOW(),
+                ultimo_erro TEXT,
+                enviado_em TIMESTAMP,
+                usuario_lancamento VARCHAR(255)
+            );"""))
+            connection.execute(text("CREATE INDEX IF NOT EXISTS idx_email_outbox_fila ON email_outbox (status, proxima_tentativa);"))
+            # Chave de idempotência (cliente + hash dos documentos + referência): impede envio duplicado
+            connection.execute(text("ALTER TABLE email_outbox ADD COLUMN IF NOT EXISTS chave_idempotencia VARCHAR(64) UNIQUE;"))
+
             # --- Garantir colunas adicionais em entradas ---
             connection.execute(text("ALTER TABLE entradas ADD COLUMN IF NOT EXISTS valor_deslocamento NUMERIC(10, 2);"))
             connection.execute(text("ALTER TABLE entradas ADD COLUMN IF NOT EXISTS qtd_tecnicos INTEGER;"))
@@ -97,12 +116,133 @@ try:
             connection.execute(text("ALTER TABLE entradas ADD COLUMN IF NOT EXISTS status VARCHAR(50) DEFAULT 'Pendente';"))
             connection.execute(text("ALTER TABLE entradas ADD COLUMN IF NOT EXISTS nome_tecnicos VARCHAR(255);"))
             connection.execute(text("ALTER TABLE clientes ADD COLUMN IF NOT EXISTS cnpj VARCHAR(255);"))
+            # Horas por faixa calculadas no formulário de entradas (usadas na produtividade por técnico)
+            connection.execute(text("ALTER TABLE entradas ADD COLUMN IF NOT EXISTS horas_normais NUMERIC(10, 2);"))
+            connection.execute(text("ALTER TABLE entradas ADD COLUMN IF NOT EXISTS horas_extra_50 NUMERIC(10, 2);"))
+            connection.execute(text("ALTER TABLE entradas ADD COLUMN IF NOT EXISTS horas_extra_100 NUMERIC(10, 2);"))
+
+            # --- Técnicos e vínculo com as entradas (tecnicos.py) ---
+            # entradas.nome_tecnicos continua guardando o texto digitado; os vínculos são mantidos pelos formulários
+            connection.execute(text("""
+            CREATE TABLE IF NOT EXISTS tecnicos (
+                id SERIAL PRIMARY KEY,
+                nome VARCHAR(255) NOT NULL
+            );"""))
+            connection.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS idx_tecnicos_nome ON tecnicos (lower(nome));"))
+            connection.execute(text("""
+            CREATE TABLE IF NOT EXISTS entrada_tecnicos (
+                entrada_id INTEGER NOT NULL REFERENCES entradas(id) ON DELETE CASCADE,
+                tecnico_id INTEGER NOT NULL REFERENCES tecnicos(id) ON DELETE CASCADE,
+                PRIMARY KEY (entrada_id, tecnico_id)
+            );"""))
+            connection.execute(text("CREATE INDEX IF NOT EXISTS idx_entrada_tecnicos_tecnico ON entrada_tecnicos (tecnico_id, entrada_id);"))
+            # Carga inicial a partir do texto ("João, Maria"), só das entradas ainda sem vínculo
+            connection.execute(text(r"""
+            INSERT INTO tecnicos (nome)
+            SELECT DISTINCT ON (lower(btrim(n.nome))) btrim(n.nome)
+            FROM entradas e
+            CROSS JOIN LATERAL regexp_split_to_table(e.nome_tecnicos, '\s*[,;/]\s*') AS n(nome)
+            WHERE btrim(n.nome) <> ''
+            ON CONFLICT ((lower(nome))) DO NOTHING;"""))
+            connection.execute(text(r"""
+            INSERT INTO entrada_tecnicos (entrada_id, tecnico_id)
+            SELECT DISTINCT e.id, t.id
+            FROM entradas e
+            CROSS JOIN LATERAL regexp_split_to_table(e.nome_tecnicos, '\s*[,;/]\s*') AS n(nome)
+            JOIN tecnicos t ON lower(t.nome) = lower(btrim(n.nome))
+            WHERE NOT EXISTS (SELECT 1 FROM entrada_tecnicos et WHERE et.entrada_id = e.id)
+            ON CONFLICT DO NOTHING;"""))
+
+            # --- Negociações: lançamentos originais e parcelas geradas (negociacoes.py) ---
+            connection.execute(text("""
+            CREATE TABLE IF NOT EXISTS negociacoes (
+                id SERIAL PRIMARY KEY,
+                cliente VARCHAR(255),
+                tipo VARCHAR(20) NOT NULL, -- 'Desconto' ou 'Parcelamento'
+                valor_original NUMERIC(12, 2) NOT NULL DEFAULT 0,
+                status VARCHAR(20) NOT NULL DEFAULT 'Ativa', -- 'Ativa' ou 'Revertida'
+                criada_em TIMESTAMP NOT NULL DEFAULT NOW(),
+                revertida_em TIMESTAMP,
+                usuario_lancamento VARCHAR(255)
+            );"""))
+            connection.execute(text("CREATE INDEX IF NOT EXISTS idx_negociacoes_status_cliente ON negociacoes (status, cliente);"))
+            connection.execute(text("""
+            CREATE TABLE IF NOT EXISTS negociacao_itens (
+                negociacao_id INTEGER NOT NULL REFERENCES negociacoes(id) ON DELETE CASCADE,
+                entrada_id INTEGER NOT NULL REFERENCES entradas(id) ON DELETE CASCADE,
+                papel VARCHAR(10) NOT NULL CHECK (papel IN ('original', 'parcela')),
+                PRIMARY KEY (negociacao_id, entrada_id)
+            );"""))
+            # Caminho inverso: de um lançamento para a negociação de que ele faz parte
+            connection.execute(text("CREATE INDEX IF NOT EXISTS idx_negociacao_itens_entrada ON negociacao_itens (entrada_id);"))
+
+            # --- Registro das cobranças da régua (cobrancas.py) ---
+            connection.execute(text("""
+            CREATE TABLE IF NOT EXISTS cobrancas (
+                id SERIAL PRIMARY KEY,
+                cliente VARCHAR(255) NOT NULL,
+                canal VARCHAR(20) NOT NULL, -- 'WhatsApp' ou 'Email'
+                valor NUMERIC(12, 2),
+                titulos INTEGER,
+                ordens TEXT,
+                email_id INTEGER REFERENCES email_outbox(id) ON DELETE SET NULL,
+                criada_em TIMESTAMP NOT NULL DEFAULT NOW(),
+                usuario_lancamento VARCHAR(255)
+            );"""))
+            # Última cobrança de cada cliente por canal (janela sem repetir contato)
+            connection.execute(text("CREATE INDEX IF NOT EXISTS idx_cobrancas_cliente_canal ON cobrancas (cliente, canal, criada_em DESC);"))
+
+            # --- Índices para a paginação por (data, id) das grades (grade_paginada.py) ---
+            connection.execute(text("CREATE INDEX IF NOT EXISTS idx_entradas_data_id ON entradas (data, id);"))
+            connection.execute(text("CREATE INDEX IF NOT EXISTS idx_saidas_data_id ON saidas (data, id);"))
+            connection.execute(text("CREATE INDEX IF NOT EXISTS idx_estoque_movimentacao_data_id ON estoque_movimentacao (data, id);"))
+            # A ordenação 'Data' das grades é grade_paginada.ORDEM_DATA (data sem nulos): índice na mesma expressão
+            for tabela in ("entradas", "saidas", "estoque_movimentacao"):
+                connection.execute(text(f"CREATE INDEX IF NOT EXISTS idx_{tabela}_ordem_data_id ON {tabela} ((COALESCE(data, TIMESTAMP '0001-01-01')), id);"))
+
+            # --- Índices do aging de vencidos (vencimentos.py): pendentes por data de vencimento ---
+            connection.execute(text("CREATE INDEX IF NOT EXISTS idx_entradas_status_data ON entradas (status, data);"))
+            connection.execute(text("CREATE INDEX IF NOT EXISTS idx_saidas_status_data ON saidas (status, data);"))
+            # --- Índices do fluxo de caixa (fluxo_caixa.py): realizado pela data de pagamento ---
+            connection.execute(text("CREATE INDEX IF NOT EXISTS idx_entradas_status_pagamento ON entradas (status, data_pagamento);"))
+            connection.execute(text("CREATE INDEX IF NOT EXISTS idx_saidas_status_pagamento ON saidas (status, data_pagamento);"))
+
+            # --- Índices da busca de lançamentos (busca_lancamentos.py) ---
+            # pg_trgm permite usar índice em ILIKE 'texto%' e ILIKE '%trecho%'
+            connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm;"))
+            connection.execute(text("CREATE INDEX IF NOT EXISTS idx_entradas_ordem_servico ON entradas (ordem_servico);"))
+            connection.execute(text("CREATE INDEX IF NOT EXISTS idx_entradas_cliente_trgm ON entradas USING gin (cliente gin_trgm_ops);"))
+            connection.execute(text("CREATE INDEX IF NOT EXISTS idx_entradas_descricao_trgm ON entradas USING gin (descricao_servico gin_trgm_ops);"))
+            connection.execute(text("CREATE INDEX IF NOT EXISTS idx_saidas_tipo_conta_trgm ON saidas USING gin (tipo_conta gin_trgm_ops);"))
+            connection.execute(text("CREATE INDEX IF NOT EXISTS idx_saidas_descricao_trgm ON saidas USING gin (descricao gin_trgm_ops);"))
+
+            # --- Numeração das O.S. (ordem_servico.py) ---
+            # A sequence começa depois do maior número já usado; rodar de novo nunca a faz voltar atrás
+            connection.execute(text("CREATE SEQUENCE IF NOT EXISTS ordem_servico_seq AS BIGINT;"))
+            connection.execute(text("""
+            SELECT setval('ordem_servico_seq', GREATEST(m.maior, s.last_value, 1), m.maior > 0 OR s.is_called)
+            FROM (
+                SELECT COALESCE(MAX(CAST(ordem_servico AS BIGINT)), 0) AS maior
+                FROM entradas WHERE ordem_servico ~ '^[0-9]{1,18}$'
+            ) m, ordem_servico_seq s;"""))
+            # Nenhuma O.S. numérica repetida (vazias e parcelas como '123-1' ficam de fora).
+            # Só é criado se os dados atuais permitirem; as repetidas são listadas para correção.
+            repetidas = connection.execute(text("""
+            SELECT ordem_servico FROM entradas WHERE ordem_servico ~ '^[0-9]{1,18}$'
+            GROUP BY ordem_servico HAVING COUNT(*) > 1 ORDER BY ordem_servico;""")).scalars().all()
+            if repetidas:
+                print(f"⚠️ O.S. repetidas, índice único não criado: {', '.join(repetidas)}")
+            else:
+                connection.execute(text("""
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_entradas_ordem_servico_unica
+                ON entradas (ordem_servico) WHERE ordem_servico ~ '^[0-9]{1,18}$';"""))
 
             # --- Inserir valores padrão na tabela de configurações se não existirem ---
             connection.execute(text("INSERT INTO configuracoes (chave, valor, descricao) VALUES ('valor_por_km', '2.45', 'Valor cobrado por KM rodado.') ON CONFLICT (chave) DO NOTHING;"))
             connection.execute(text("INSERT INTO configuracoes (chave, valor, descricao) VALUES ('valor_hora_tecnica', '100.00', 'Valor padrão da hora técnica.') ON CONFLICT (chave) DO NOTHING;"))
             connection.execute(text("INSERT INTO configuracoes (chave, valor, descricao) VALUES ('empresa_razao_social', 'Elite CNC Service', 'Razão Social ou Nome da Empresa para PDFs.') ON CONFLICT (chave) DO NOTHING;"))
             connection.execute(text("INSERT INTO configuracoes (chave, valor, descricao) VALUES ('empresa_cnpj', 'CNPJ: 61.159.425/0001-32', 'CNPJ da empresa para PDFs.') ON CONFLICT (chave) DO NOTHING;"))
+            connection.execute(text("INSERT INTO configuracoes (chave, valor, descricao) VALUES ('cobranca_intervalo_dias', '7', 'Dias sem repetir a cobrança de um cliente pelo mesmo canal.') ON CONFLICT (chave) DO NOTHING;"))
 
             # --- Ativar RLS e criar políticas ---
             tabelas = ["clientes", "saidas", "entradas", "estoque_componentes", "estoque_movimentacao"]
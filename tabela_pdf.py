@@ -0,0 +1,94 @@
+# tabela_pdf.py
+# Renderização de tabelas longas em PDF (fpdf2) a partir de colunas já formatadas.
+
+def coluna(titulo, largura, alinhamento='L', quebra=False):
+    """Define uma coluna da tabela. Com `quebra=True` o texto é quebrado em várias
+    linhas (e a linha da tabela cresce); sem ela, o texto deve caber na largura."""
+    return {'titulo': titulo, 'largura': largura, 'alinhamento': alinhamento, 'quebra': quebra}
+
+def _quebrar_coluna(pdf, textos, largura):
+    """Linhas de cada texto de uma coluna com quebra (lista de linhas por célula).
+    Textos que cabem em uma linha são resolvidos só pela largura (caminho rápido);
+    os demais passam uma única vez pelo multi_cell em modo dry_run.
+    Valores repetidos são quebrados uma vez só."""
+    largura_util = largura - 2 * pdf.c_margin
+    quebrados = {}
+    resultado = []
+    for texto in textos:
+        linhas = quebrados.get(texto)
+        if linhas is None:
+            if '\n' not in texto and pdf.get_string_width(texto) <= largura_util:
+                linhas = [texto]
+            else:
+                linhas = pdf.multi_cell(largura, 1, texto, dry_run=True, output="LINES") or [""]
+            quebrados[texto] = linhas
+        resultado.append(linhas)
+    return resultado
+
+def _desenhar_cabecalho(pdf, colunas, altura, cor_cabecalho):
+    preencher = cor_cabecalho is not None
+    if preencher:
+        pdf.set_fill_color(*cor_cabecalho)
+    for col in colunas:
+        pdf.cell(col['largura'], altura, col['titulo'], 1, 0, 'C', preencher)
+    pdf.ln(altura)
+
+def desenhar_tabela(pdf, colunas, valores, altura_linha=6, tamanho_fonte=8, cor_cabecalho=None):
+    """Desenha uma tabela a partir da posição atual do `pdf`.
+
+    `colunas`: lista criada com `coluna(...)`.
+    `valores`: uma lista de textos por coluna (mesma ordem de `colunas`), todas do mesmo tamanho.
+
+    As linhas das colunas com quebra e as alturas são calculadas em uma única passada
+    antes do desenho, e as quebras de página são feitas aqui (repetindo o cabeçalho),
+    sem depender do auto page break no meio de uma linha."""
+    familia = pdf.font_family
+    quebra_automatica, margem_inferior = pdf.auto_page_break, pdf.b_margin
+
+    # 1) Alturas das linhas (só as colunas com quebra podem ter mais de uma linha)
+    pdf.set_font(familia, '', tamanho_fonte)
+    qtd_linhas = len(valores[0]) if valores else 0
+    linhas_celulas = [
+        _quebrar_coluna(pdf, textos, col['largura']) if col['quebra'] else None
+        for col, textos in zip(colunas, valores)
+    ]
+    multiplicadores = [1] * qtd_linhas
+    for linhas_coluna in linhas_celulas:
+        if linhas_coluna is not None:
+            multiplicadores = [max(m, len(linhas)) for m, linhas in zip(multiplicadores, linhas_coluna)]
+
+    # 2) Desenho
+    pdf.set_auto_page_break(False, margem_inferior)
+    pdf.set_font(familia, 'B', tamanho_fonte)
+    if pdf.get_y() + 2 * altura_linha > pdf.page_break_trigger:
+        pdf.add_page()
+    _desenhar_cabecalho(pdf, colunas, altura_linha, cor_cabecalho)
+    pdf.set_font(familia, '', tamanho_fonte)
+
+    x_inicial = pdf.l_margin
+    linhas = zip(*valores)
+    for indice, (linha, multiplicador) in enumerate(zip(linhas, multiplicadores)):
+        altura = altura_linha * multiplicador
+        if pdf.get_y() + altura > pdf.page_break_trigger:
+            pdf.add_page()
+            pdf.set_font(familia, 'B', tamanho_fonte)
+            _desenhar_cabecalho(pdf, colunas, altura_linha, cor_cabecalho)
+            pdf.set_font(familia, '', tamanho_fonte)
+
+        y = pdf.get_y()
+        x = x_inicial
+        for col, texto, linhas_coluna in zip(colunas, linha, linhas_celulas):
+            largura = col['largura']
+            pdf.set_xy(x, y)
+            if linhas_coluna is not None and len(linhas_coluna[indice]) > 1:
+                # Linhas já quebradas na primeira passada: só desenha
+                pdf.rect(x, y, largura, altura)
+                for i, trecho in enumerate(linhas_coluna[indice]):
+                    pdf.set_xy(x, y + i * altura_linha)
+                    pdf.cell(largura, altura_linha, trecho, 0, 0, col['alinhamento'])
+            else:
+                pdf.cell(largura, altura, texto, 1, 0, col['alinhamento'])
+            x += largura
+        pdf.set_xy(x_inicial, y + altura)
+
+    pdf.set_auto_page_break(quebra_automatica, margem_inferior)
@@ -0,0 +1,128 @@
+# tecnicos.py
+# Técnicos de cada entrada (tabelas tecnicos e entrada_tecnicos): vínculo, filtro por técnico e produtividade.
+import re
+
+import pandas as pd
+import streamlit as st
+from sqlalchemy import text
+
+# Separadores aceitos no campo texto "Nome do(s) Técnico(s)" (o mesmo padrão da carga em setup_nuvem.py)
+RE_SEPARADORES = re.compile(r'\s*[,;/]\s*')
+
+def separar_nomes(nome_tecnicos):
+    """'João, maria; JOÃO' -> ['João', 'maria']: nomes sem espaços nas pontas, sem repetir (ignorando maiúsculas)."""
+    nomes = {}
+    for nome in RE_SEPARADORES.split(str(nome_tecnicos or '')):
+        nome = nome.strip()
+        if nome and nome.lower() not in nomes:
+            nomes[nome.lower()] = nome
+    return list(nomes.values())
+
+def sincronizar_tecnicos(con, entrada_id, nome_tecnicos):
+    """Faz os vínculos da entrada refletirem o texto `nome_tecnicos`, cadastrando técnicos novos.
+    Roda na conexão `con` da gravação da entrada, para ficar na mesma transação (o commit é de quem chama)."""
+    nomes = separar_nomes(nome_tecnicos)
+    ids = []
+    if nomes:
+        # O DO UPDATE sem efeito faz o RETURNING devolver também o id dos técnicos já cadastrados
+        ids = con.execute(text("""
+            INSERT INTO tecnicos (nome) SELECT unnest(CAST(:nomes AS TEXT[]))
+            ON CONFLICT ((lower(nome))) DO UPDATE SET nome = tecnicos.nome
+            RETURNING id
+        """), {"nomes": nomes}).scalars().all()
+    con.execute(
+        text("DELETE FROM entrada_tecnicos WHERE entrada_id = :entrada_id AND NOT (tecnico_id = ANY(CAST(:ids AS INTEGER[])))"),
+        {"entrada_id": entrada_id, "ids": ids}
+    )
+    if ids:
+        con.execute(text("""
+            INSERT INTO entrada_tecnicos (entrada_id, tecnico_id)
+            SELECT :entrada_id, unnest(CAST(:ids AS INTEGER[]))
+            ON CONFLICT DO NOTHING
+        """), {"entrada_id": entrada_id, "ids": ids})
+
+def vincular_entradas_sem_tecnicos(con):
+    """Cria os vínculos das entradas que têm técnicos no texto mas nenhum vínculo (ex.: importadas por CSV)."""
+    con.execute(text(r"""
+        INSERT INTO tecnicos (nome)
+        SELECT DISTINCT ON (lower(btrim(n.nome))) btrim(n.nome)
+        FROM entradas e
+        CROSS JOIN LATERAL regexp_split_to_table(e.nome_tecnicos, '\s*[,;/]\s*') AS n(nome)
+        WHERE btrim(n.nome) <> ''
+          AND NOT EXISTS (SELECT 1 FROM entrada_tecnicos et WHERE et.entrada_id = e.id)
+        ON CONFLICT ((lower(nome))) DO NOTHING
+    """))
+    con.execute(text(r"""
+        INSERT INTO entrada_tecnicos (entrada_id, tecnico_id)
+        SELECT DISTINCT e.id, t.id
+        FROM entradas e
+        CROSS JOIN LATERAL regexp_split_to_table(e.nome_tecnicos, '\s*[,;/]\s*') AS n(nome)
+        JOIN tecnicos t ON lower(t.nome) = lower(btrim(n.nome))
+        WHERE NOT EXISTS (SELECT 1 FROM entrada_tecnicos et WHERE et.entrada_id = e.id)
+        ON CONFLICT DO NOTHING
+    """))
+
+# --- CONSULTAS ---
+@st.cache_data(ttl=300)
+def carregar_tecnicos(_engine):
+    """Nomes dos técnicos que têm ao menos uma entrada, em ordem alfabética."""
+    query = """
+        SELECT t.nome FROM tecnicos t
+        WHERE EXISTS (SELECT 1 FROM entrada_tecnicos et WHERE et.tecnico_id = t.id)
+        ORDER BY t.nome
+    """
+    return pd.read_sql_query(query, _engine)['nome'].tolist()
+
+@st.cache_data(ttl=300)
+def entradas_dos_tecnicos(_engine, nomes):
+    """Ids das entradas em que trabalhou qualquer um dos técnicos `nomes` (junção pelo índice de tecnico_id)."""
+    query = """
+        SELECT DISTINCT et.entrada_id
+        FROM tecnicos t
+        JOIN entrada_tecnicos et ON et.tecnico_id = t.id
+        WHERE t.nome = ANY(:nomes)
+    """
+    return set(pd.read_sql_query(text(query), _engine, params={"nomes": list(nomes)})['entrada_id'])
+
+QUERY_PRODUTIVIDADE = """
+    WITH periodo AS (
+        SELECT id, valor_atendimento, horas_normais, horas_extra_50, horas_extra_100
+        FROM entradas
+        WHERE data >= :inicio AND data < :fim {filtros}
+    ), vinculos AS (
+        SELECT et.entrada_id, et.tecnico_id, COUNT(*) OVER (PARTITION BY et.entrada_id) AS qtd_tecnicos
+        FROM entrada_tecnicos et
+        JOIN periodo p ON p.id = et.entrada_id
+    )
+    SELECT
+        t.nome AS tecnico,
+        COUNT(*) AS ordens,
+        SUM(COALESCE(p.horas_normais, 0)) AS horas_normais,
+        SUM(COALESCE(p.horas_extra_50, 0)) AS horas_extra_50,
+        SUM(COALESCE(p.horas_extra_100, 0)) AS horas_extra_100,
+        SUM(COALESCE(p.horas_normais, 0) + COALESCE(p.horas_extra_50, 0) + COALESCE(p.horas_extra_100, 0)) AS horas_total,
+        SUM(COALESCE(p.valor_atendimento, 0) / v.qtd_tecnicos) AS faturamento
+    FROM vinculos v
+    JOIN periodo p ON p.id = v.entrada_id
+    JOIN tecnicos t ON t.id = v.tecnico_id
+    GROUP BY t.nome
+    ORDER BY faturamento DESC, t.nome
+"""
+
+@st.cache_data(ttl=300)
+def produtividade_tecnicos(_engine, inicio, fim, status=None, cliente=None, tecnicos=None):
+    """Produtividade por técnico entre as datas `inicio` e `fim` (inclusive): O.S. atendidas,
+    horas por faixa (normais, 50%, 100%) e faturamento. O valor de cada O.S. é dividido
+    igualmente entre os técnicos vinculados; as horas contam inteiras para cada um."""
+    filtros = ""
+    params = {"inicio": pd.Timestamp(inicio), "fim": pd.Timestamp(fim) + pd.Timedelta(days=1)}
+    if status:
+        filtros += " AND status = ANY(:status)"
+        params["status"] = list(status)
+    if cliente:
+        filtros += " AND cliente = :cliente"
+        params["cliente"] = cliente
+    df = pd.read_sql_query(text(QUERY_PRODUTIVIDADE.format(filtros=filtros)), _engine, params=params)
+    if tecnicos:
+        df = df[df['tecnico'].isin(tecnicos)]
+    return df
@@ -0,0 +1,96 @@
+# test_correio.py
+# Fila de e-mails (email_outbox) de ponta a ponta contra um servidor SMTP local (aiosmtpd).
+# Precisa de um Postgres com as tabelas do setup_nuvem.py: defina DATABASE_URL para rodar.
+import os
+import socket
+import sys
+import uuid
+
+import pytest
+from sqlalchemy import create_engine, text
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import correio
+
+Controller = pytest.importorskip("aiosmtpd.controller").Controller
+
+URL_BANCO = os.environ.get("DATABASE_URL")
+
+
+def porta_livre():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class ServidorTeste:
+    """Guarda as mensagens recebidas; com `recusar`, responde 451 (erro temporário) no DATA."""
+
+    def __init__(self):
+        self.recebidas = []
+        self.recusar = False
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.recusar:
+            return '451 Tente novamente mais tarde'
+        self.recebidas.append(envelope)
+        return '250 OK'
+
+
+@pytest.mark.skipif(not URL_BANCO, reason="defina DATABASE_URL (Postgres com o setup_nuvem aplicado)")
+def test_fila_entrega_idempotencia_e_reagendamento(monkeypatch):
+    # O trabalhador em segundo plano disputaria a fila com o processar_fila do teste
+    monkeypatch.setattr(correio, "trabalhador_correio", lambda url, config: type("Parado", (), {"acordar": lambda self: None})())
+
+    servidor = ServidorTeste()
+    controlador = Controller(servidor, hostname="127.0.0.1", port=porta_livre())
+    controlador.start()
+    engine = create_engine(URL_BANCO)
+    credenciais = {
+        'host': '127.0.0.1', 'port': controlador.port, 'ssl': False,
+        'username': 'financeiro@exemplo.com', 'password': '', 'intervalo_envio': 0,
+    }
+    config = correio.config_smtp(credenciais)
+    referencia = uuid.uuid4().hex  # chaves de idempotência novas a cada execução
+    envio = {
+        'destinatario': 'cliente@exemplo.com', 'assunto': 'Fechamento', 'corpo': 'Segue o fechamento.',
+        'anexos': [{'nome': 'fechamento.pdf', 'dados': b'%PDF-1.4 conteudo'}],
+        'cliente': 'Cliente Teste', 'referencia': referencia,
+    }
+    ids = []
+    try:
+        # Entrega
+        primeiro = correio.enfileirar_envio(engine, credenciais, **envio)
+        ids.append(primeiro['id'])
+        assert primeiro['novo'] and primeiro['status'] == 'Pendente'
+        assert correio.processar_fila(engine, config, ids=[primeiro['id']]) == {'enviados': 1, 'reagendados': 0, 'falhas': 0}
+        assert len(servidor.recebidas) == 1
+        assert servidor.recebidas[0].rcpt_tos == ['cliente@exemplo.com']
+        assert b'fechamento.pdf' in servidor.recebidas[0].content
+
+        # A mesma chave de idempotência não volta para a fila nem é enviada de novo
+        repetido = correio.enfileirar_envio(engine, credenciais, **envio)
+        assert repetido['id'] == primeiro['id'] and not repetido['novo'] and repetido['status'] == 'Enviado'
+        assert correio.processar_fila(engine, config, ids=[primeiro['id']]) == {'enviados': 0, 'reagendados': 0, 'falhas': 0}
+        assert len(servidor.recebidas) == 1
+
+        # Erro temporário do SMTP: a mensagem volta para 'Pendente' com nova tentativa no futuro
+        servidor.recusar = True
+        outro = correio.enfileirar_envio(engine, credenciais, **dict(envio, referencia=referencia + '-2'))
+        ids.append(outro['id'])
+        assert outro['novo']
+        assert correio.processar_fila(engine, config, ids=[outro['id']]) == {'enviados': 0, 'reagendados': 1, 'falhas': 0}
+        with engine.connect() as con:
+            situacao = con.execute(text("""
+                SELECT status, tentativas, ultimo_erro, proxima_tentativa > NOW() AS no_futuro
+                FROM email_outbox WHERE id = :id
+            """), {"id": outro['id']}).mappings().one()
+        assert situacao['status'] == 'Pendente' and situacao['tentativas'] == 1
+        assert '451' in situacao['ultimo_erro'] and situacao['no_futuro']
+        assert len(servidor.recebidas) == 1
+    finally:
+        controlador.stop()
+        with engine.connect() as con:
+            con.execute(text("DELETE FROM email_outbox WHERE id = ANY(:ids)"), {"ids": ids})
+            con.commit()
+        engine.dispose()
@@ -0,0 +1,118 @@
+# vencimentos.py
+# Aging dos lançamentos pendentes (1–30, 31–60, 61–90 e 90+ dias de atraso) por cliente ou tipo de conta, calculado no SQL.
+import pandas as pd
+import streamlit as st
+from sqlalchemy import text
+
+from exportacao import coluna_excel
+
+# (coluna, rótulo, dias mínimos, dias máximos); dias = hoje - vencimento. Vencido é o que venceu
+# antes de hoje (data < hoje), como em totais_por_status e na régua de cobrança: o que vence hoje não entra.
+FAIXAS = [
+    ('faixa_1_30', '1–30', 1, 30),
+    ('faixa_31_60', '31–60', 31, 60),
+    ('faixa_61_90', '61–90', 61, 90),
+    ('faixa_90_mais', '90+', 91, None),
+]
+
+# Por tabela: agrupamento do relatório e colunas do detalhamento
+RELATORIOS = {
+    'entradas': {
+        'grupo': "COALESCE(NULLIF(btrim(t.cliente), ''), 'Sem cliente')",
+        'rotulo_grupo': 'Cliente',
+        'valor': 'valor_atendimento',
+        'campos': "t.id, t.data, t.ordem_servico, t.cliente, t.descricao_servico AS descricao, t.valor_atendimento AS valor",
+    },
+    'saidas': {
+        'grupo': "COALESCE(NULLIF(btrim(t.tipo_conta), ''), 'Sem tipo')",
+        'rotulo_grupo': 'Tipo de Conta',
+        'valor': 'valor',
+        'campos': "t.id, t.data, NULL AS ordem_servico, t.tipo_conta AS cliente, t.descricao, t.valor",
+    },
+}
+
+def _filtro_dias(faixa):
+    """Condição SQL (sobre `dias`) de uma faixa do aging pelo rótulo."""
+    _, _, minimo, maximo = next(f for f in FAIXAS if f[1] == faixa)
+    return f"dias >= {minimo}" + (f" AND dias <= {maximo}" if maximo is not None else "")
+
+def consulta_aging(tabela, hoje):
+    """Consulta do resumo: uma linha por grupo com o total de cada faixa.
+    Lê só os pendentes já vencidos (status = 'Pendente' AND data < hoje), pelo índice (status, data)."""
+    relatorio = RELATORIOS[tabela]
+    somas = ",\n            ".join(
+        f"COALESCE(SUM(valor) FILTER (WHERE {_filtro_dias(rotulo)}), 0) AS {coluna}"
+        for coluna, rotulo, _, _ in FAIXAS
+    )
+    query = f"""
+        WITH vencidos AS (
+            SELECT {relatorio['grupo']} AS grupo, t.{relatorio['valor']} AS valor, CAST(:hoje AS DATE) - CAST(t.data AS DATE) AS dias
+            FROM {tabela} t
+            WHERE t.status = 'Pendente' AND t.data < CAST(:hoje AS DATE)
+        )
+        SELECT
+            grupo,
+            COUNT(*) AS quantidade,
+            {somas},
+            COALESCE(SUM(valor), 0) AS total,
+            MAX(dias) AS maior_atraso
+        FROM vencidos
+        GROUP BY grupo
+        ORDER BY total DESC, grupo
+    """
+    return {'query': query, 'params': {'hoje': hoje}}
+
+def consulta_itens(tabela, hoje, grupo=None, faixa=None):
+    """Consulta do detalhamento: os lançamentos vencidos de um grupo e/ou faixa, do mais atrasado ao mais recente."""
+    relatorio = RELATORIOS[tabela]
+    filtros = []
+    params = {'hoje': hoje}
+    if grupo:
+        filtros.append("grupo = :grupo")
+        params['grupo'] = grupo
+    if faixa:
+        filtros.append(_filtro_dias(faixa))
+    query = f"""
+        SELECT * FROM (
+            SELECT {relatorio['campos']}, {relatorio['grupo']} AS grupo, CAST(:hoje AS DATE) - CAST(t.data AS DATE) AS dias
+            FROM {tabela} t
+            WHERE t.status = 'Pendente' AND t.data < CAST(:hoje AS DATE)
+        ) AS vencidos
+        {'WHERE ' + ' AND '.join(filtros) if filtros else ''}
+        ORDER BY dias DESC, id
+    """
+    return {'query': query, 'params': params}
+
+# O cache é por dia (`hoje` faz parte da chave): os dias de atraso mudam na virada do dia
+@st.cache_data(ttl=3600)
+def carregar_aging(_engine, tabela, hoje):
+    """Resumo do aging de `tabela` ('entradas' ou 'saidas') na data `hoje`."""
+    consulta = consulta_aging(tabela, hoje)
+    df = pd.read_sql_query(text(consulta['query']), _engine, params=consulta['params'])
+    colunas_valor = [coluna for coluna, _, _, _ in FAIXAS] + ['total']
+    df[colunas_valor] = df[colunas_valor].astype(float)
+    return df
+
+@st.cache_data(ttl=3600)
+def carregar_itens(_engine, tabela, hoje, grupo=None, faixa=None):
+    """Lançamentos por trás de uma célula do aging (grupo x faixa)."""
+    consulta = consulta_itens(tabela, hoje, grupo, faixa)
+    df = pd.read_sql_query(text(consulta['query']), _engine, params=consulta['params'], parse_dates=['data'])
+    df['valor'] = df['valor'].astype(float)
+    return df
+
+def colunas_excel_aging(tabela):
+    """Colunas das abas 'Aging' e 'Itens' da exportação."""
+    rotulo_grupo = RELATORIOS[tabela]['rotulo_grupo']
+    resumo = [coluna_excel('grupo', rotulo_grupo), coluna_excel('quantidade', 'Qtd.', 'inteiro')]
+    resumo += [coluna_excel(coluna, f"{rotulo} dias", 'moeda') for coluna, rotulo, _, _ in FAIXAS]
+    resumo += [coluna_excel('total', 'Total', 'moeda'), coluna_excel('maior_atraso', 'Maior Atraso (dias)', 'inteiro', largura=18)]
+    itens = [
+        coluna_excel('data', 'Vencimento', 'data'),
+        coluna_excel('dias', 'Dias em Atraso', 'inteiro', largura=14),
+        coluna_excel('grupo', rotulo_grupo),
+        coluna_excel('ordem_servico', 'Nº O.S.', largura=12),
+        coluna_excel('descricao', 'Descrição', largura=45),
+        coluna_excel('valor', 'Valor', 'moeda'),
+    ]
+    return resumo, itens